@@ -0,0 +1,70 @@
+"""Ingest-time embedding throughput: one request per text vs `EmbeddingBatcher`.
+
+Embeds the discord_json threads (one text per thread) against the local
+fake embeddings server, with per-request latency and injected 429/500s,
+and checks the batched vectors come back in input order.
+
+Run from api/:
+$ python -m benchmarks.bench_embedding_batcher --latency-ms 50 --error-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from benchmarks.corpus import hashing_embeddings, load_threads
+from benchmarks.fake_embeddings_server import FakeEmbeddingsServer
+from retrieval.embedding_batcher import EmbeddingBatcher
+
+MODEL = "text-embedding-ada-002"
+
+
+async def one_per_request(client: AsyncOpenAI, texts):
+    for text in texts:
+        await client.embeddings.create(input=[text], model=MODEL)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--serial-sample", type=int, default=50)
+    args = parser.parse_args()
+
+    texts = [json.dumps(thread["messages"]) for thread in load_threads()]
+    server = FakeEmbeddingsServer(latency_ms=args.latency_ms, error_rate=args.error_rate).start()
+
+    serial_server = FakeEmbeddingsServer(latency_ms=args.latency_ms).start()
+    client = AsyncOpenAI(base_url=serial_server.base_url, api_key="fake")
+    sample = texts[: args.serial_sample]
+    start = time.perf_counter()
+    asyncio.run(one_per_request(client, sample))
+    rate = len(sample) / (time.perf_counter() - start)
+    print(f"one request per text (no errors): {rate:.1f} texts/s")
+
+    for concurrency in (1, 4, 8):
+        batcher = EmbeddingBatcher(
+            MODEL,
+            client=AsyncOpenAI(base_url=server.base_url, api_key="fake", max_retries=0),
+            batch_items=64,
+            batch_tokens=20_000,
+            concurrency=concurrency,
+            base_delay=0.05,
+        )
+        vectors = batcher.embed(texts)
+        # the texts as sent: newlines flattened, over-long threads truncated
+        sent = [text for batch in EmbeddingBatcher(MODEL).pack(texts) for _, text in batch]
+        expected = hashing_embeddings(sent)
+        assert np.allclose(np.array(vectors, dtype=np.float32), expected, atol=1e-6), "order mismatch"
+        print(f"batched, concurrency {concurrency}: {batcher.stats.summary()}")
+    print(f"fake server: {server.requests} requests, {server.errors} errors, max {server.max_in_flight} in flight")
+    server.shutdown()
+    serial_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""fix_markdown throughput (pages/s) by worker count.
+
+Imports the crawled docs (crawled_docs/ if a crawl exists, otherwise
+variants of test.html; see corpus.write_docs_pages) into a page store and
+converts every page with 1, 2, 4, ... worker processes, then reruns once
+to show pages unchanged since the last run being skipped.
+
+Run from api/:
+$ python -m benchmarks.bench_fix_markdown --pages 400 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import write_docs_pages
+from crawling.page_store import PageStore
+from fix_markdown import DEFAULT_CHUNKSIZE, process_crawled_docs
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200, help="synthetic pages, when there is no crawl")
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    )
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_fix_markdown_"))
+    try:
+        crawled = root / "crawled_docs"
+        pages = len(write_docs_pages(crawled, args.pages))
+        store = root / "pages"
+        PageStore(store).import_json_dir(crawled)
+        print(f"{pages} pages, {cpus} CPUs, chunksize {args.chunksize}")
+        print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            stats = process_crawled_docs(store, workers, args.chunksize, force=True, progress=False)
+            seconds = time.perf_counter() - start
+            assert stats.converted + stats.unchanged == pages, stats.summary()
+            baseline = baseline or seconds
+            print(f"{workers:>8} {seconds:>9.2f} {pages / seconds:>9.1f} {baseline / seconds:>7.2f}x")
+
+        start = time.perf_counter()
+        stats = process_crawled_docs(store, args.workers[-1], args.chunksize, progress=False)
+        print(f"rerun: {stats.summary()} in {time.perf_counter() - start:.2f}s")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
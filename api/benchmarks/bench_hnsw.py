@@ -0,0 +1,81 @@
+"""Recall@5 and query latency of the HNSW graph versus exact search.
+
+For each corpus size, adds every vector to an HNSWIndex (as ingestion
+would; faiss builds the graph in one batch), then reports recall@5 against
+brute-force cosine search and p50/p99 latency for both. Vectors are synthetic and clustered; pass --dim 1536 to
+match ada-002, at the cost of a slower build.
+
+Run from api/:
+$ python -m benchmarks.bench_hnsw --sizes 1000 5000 20000 --dim 256
+$ python -m benchmarks.bench_hnsw --sizes 5000 --M 32 --ef-search 32 64 128
+"""
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from benchmarks.common import (
+    clustered_vectors,
+    exact_topk,
+    percentiles,
+    perturbed_queries,
+    recall_at_k,
+    timed,
+)
+from retrieval.hnsw import HNSWConfig, HNSWIndex
+from retrieval.local_index import normalize_rows, topk_rows
+
+K = 5
+
+
+def exact_search(matrix: np.ndarray, query: np.ndarray, k: int) -> List[int]:
+    """Brute-force cosine top-k over the normalized `matrix`, as an unquantized segment scans it."""
+    rows, _ = topk_rows(matrix @ normalize_rows(query)[:, None], k)
+    return rows[:, 0].tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[64])
+    args = parser.parse_args()
+
+    print(f"{'n':>7} {'ef':>4} {'build s':>8} {'recall@5':>9} {'hnsw p50':>9} {'hnsw p99':>9} {'exact p50':>10} {'exact p99':>10}")
+    for n in args.sizes:
+        vectors = clustered_vectors(n, args.dim)
+        queries = perturbed_queries(vectors, args.queries)
+        truth = exact_topk(vectors, queries, K)
+
+        matrix = normalize_rows(vectors)
+        exact_ms = [timed(exact_search, matrix, q, K)[0] for q in queries]
+
+        config = HNSWConfig(M=args.M, ef_construction=args.ef_construction)
+        graph = HNSWIndex(args.dim, config)
+        start = time.perf_counter()
+        for i, vector in enumerate(vectors):
+            graph.add(str(i), vector)
+        graph.flush()
+        build_s = time.perf_counter() - start
+
+        for ef in args.ef_search:
+            timings, found = [], []
+            for q in queries:
+                ms, hits = timed(graph.search, q, K, ef)
+                timings.append(ms)
+                found.append([int(id) for id, _ in hits])
+            p50, p99 = percentiles(timings)
+            e50, e99 = percentiles(exact_ms)
+            print(
+                f"{n:>7} {ef:>4} {build_s:>8.1f} {recall_at_k(truth, found, K):>9.3f} "
+                f"{p50:>8.3f}ms {p99:>8.3f}ms {e50:>9.3f}ms {e99:>9.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Single-parse `crawling.markdown.html_to_markdown` vs `test_script.html_to_markdown`.
+
+Converts every page of the crawled docs (crawled_docs/ if a crawl exists,
+otherwise variants of test.html; see corpus.write_docs_pages) with both
+functions, checks the markdown is identical, and reports time per page and
+peak traced memory per page.
+
+Run from api/:
+$ python -m benchmarks.bench_html_to_markdown --pages 100
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.corpus import write_docs_pages
+from crawling.markdown import html_to_markdown
+from test_script import html_to_markdown as reference_html_to_markdown
+
+
+def measure(convert, pages):
+    start = time.perf_counter()
+    outputs = [convert(html) for html in pages]
+    seconds = time.perf_counter() - start
+    peak = 0
+    # peak memory on its own pass, since tracing slows conversion down
+    for html in pages[: min(len(pages), 20)]:
+        tracemalloc.start()
+        convert(html)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return outputs, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100, help="synthetic pages, when there is no crawl")
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_html_to_markdown_"))
+    try:
+        pages = []
+        for path in write_docs_pages(root, args.pages):
+            with open(path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            if doc.get("html") and doc["metadata"].get("statusCode") != 404:
+                pages.append(doc["html"])
+    finally:
+        shutil.rmtree(root)
+    size = sum(len(html) for html in pages) / len(pages)
+    print(f"{len(pages)} pages, {size / 1024:.1f} KiB of html on average")
+
+    expected, reference_seconds, reference_peak = measure(reference_html_to_markdown, pages)
+    actual, seconds, peak = measure(html_to_markdown, pages)
+    mismatches = sum(a != b for a, b in zip(actual, expected))
+
+    print(f"{'converter':<14} {'ms/page':>8} {'peak KiB/page':>14}")
+    for name, s, p in (("bs4+markdownify", reference_seconds, reference_peak), ("single parse", seconds, peak)):
+        print(f"{name:<14} {s * 1000 / len(pages):>8.2f} {p / 1024:>14.0f}")
+    print(f"speedup {reference_seconds / seconds:.2f}x, peak memory {peak / reference_peak:.0%} of the old converter's")
+    print(f"identical output: {len(pages) - mismatches}/{len(pages)} pages")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Cost of the lexical half of RETRIEVAL_MODE=hybrid: ingestion and per RAGQuery.
+
+Indexes the discord_json threads the way ingest_threads.py does (one
+document per thread, text = the thread JSON) in sync_index's 100-item
+upserts, then times a reader's first query (loading the postings) and the
+full `HybridRetriever` path per query: partitions for the filter, BM25
+search, reciprocal rank fusion with a fixed vector ranking, and node
+construction for lexical-only hits.
+
+Run from api/:
+$ python -m benchmarks.bench_hybrid
+"""
+
+import json
+import tempfile
+import time
+from typing import List
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from benchmarks.common import percentiles, timed
+from benchmarks.corpus import load_threads
+from retrieval.bm25 import BM25Index
+from retrieval.hybrid import DEFAULT_CANDIDATES, HybridRetriever
+
+UPSERT_BATCH = 100
+QUERIES = [
+    "ClientRegistry",
+    "baml-cli generate",
+    "error parsing FormulateAnswer output",
+    "how do I use python async with baml-py",
+    "vertex ai credentials",
+    "retry policy exponential backoff",
+    "streaming partial types in typescript",
+    "dynamic types TypeBuilder enum values",
+]
+
+
+class FixedRetriever(BaseRetriever):
+    """Stands in for the vector side with the same ranking for every query."""
+
+    def __init__(self, hits: List[NodeWithScore]):
+        super().__init__()
+        self._hits = hits
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._hits
+
+
+def main():
+    threads = load_threads()
+    items = [
+        {
+            "id": str(thread["thread_id"]),
+            "metadata": {"type": "discord_thread", "text": json.dumps(thread)},
+        }
+        for thread in threads
+    ]
+    with tempfile.TemporaryDirectory() as root:
+        writer = BM25Index(f"{root}/bm25.sqlite3")
+        start = time.perf_counter()
+        for batch in range(0, len(items), UPSERT_BATCH):
+            writer.upsert(items[batch : batch + UPSERT_BATCH])
+        print(
+            f"ingest {len(items)} threads in {UPSERT_BATCH}-item upserts: "
+            f"{(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+
+        index = BM25Index(f"{root}/bm25.sqlite3", readonly=True)
+        load_ms, _ = timed(index.search, "", 1)
+        print(f"reader's first query (load postings for {len(index)} threads): {load_ms:.1f}ms")
+
+        vector_hits = [
+            NodeWithScore(node=TextNode(id_=item["id"], text="", metadata={"type": "discord_thread"}), score=1.0)
+            for item in items[:DEFAULT_CANDIDATES]
+        ]
+        retriever = HybridRetriever(
+            FixedRetriever(vector_hits), index, ("in", ("discord_thread",)), top_k=5
+        )
+        timings = [timed(retriever.retrieve, QueryBundle(query))[0] for _ in range(50) for query in QUERIES]
+        p50, p99 = percentiles(timings)
+        print(f"HybridRetriever per query: p50 {p50:.3f}ms  p99 {p99:.3f}ms")
+
+        writer.upsert(items[:1])
+        reload_ms, _ = timed(retriever.retrieve, QueryBundle(QUERIES[0]))
+        print(f"first query after another process's upsert (reload postings): {reload_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Disk use and full-corpus load time: per-page JSON files vs `PageStore`.
+
+Lays the crawled docs (crawled_docs/ if a crawl exists, otherwise variants
+of test.html; see corpus.write_docs_pages) out the old way, one `indent=4`
+JSON file per page in crawled_docs/ plus an `indent=2` copy in
+fixed_docs/, and imports them into a page store. Reports bytes on disk,
+the time to load every page (and, from the store, every page without its
+html, as ingest_docs.py does), and the time to load the pages changed by
+a later run that touched a few of them.
+
+Run from api/:
+$ python -m benchmarks.bench_page_store --pages 500
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import write_docs_pages
+from crawling.page_store import PageStore
+
+
+def disk_usage(directory: Path) -> int:
+    return sum(path.stat().st_size for path in directory.rglob("*") if path.is_file())
+
+
+def load_json_dir(directory: Path) -> int:
+    loaded = 0
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json"):
+            with open(directory / filename, "r", encoding="utf-8") as f:
+                json.load(f)
+            loaded += 1
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500, help="synthetic pages, when there is no crawl")
+    parser.add_argument("--changed", type=int, default=10, help="pages changed by the later run")
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_page_store_"))
+    try:
+        crawled, fixed = root / "crawled_docs", root / "fixed_docs"
+        fixed.mkdir()
+        for path in write_docs_pages(crawled, args.pages):
+            with open(path, "r", encoding="utf-8") as f:
+                page = json.load(f)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(page, f, ensure_ascii=False, indent=4)
+            with open(fixed / path.name, "w", encoding="utf-8") as f:
+                json.dump(page, f, ensure_ascii=False, indent=2)
+
+        store = PageStore(root / "pages")
+        store.import_json_dir(crawled)
+        pages = len(store)
+        files_bytes = disk_usage(crawled) + disk_usage(fixed)
+        store_bytes = disk_usage(root / "pages")
+
+        start = time.perf_counter()
+        load_json_dir(fixed)
+        files_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = sum(1 for _ in store.pages())
+        store_seconds = time.perf_counter() - start
+        assert loaded == pages
+        start = time.perf_counter()
+        sum(1 for _ in store.pages(include_html=False))
+        markdown_seconds = time.perf_counter() - start
+
+        run = store.begin_run("bench")
+        for url in store.urls()[: args.changed]:
+            page = store.get(url)
+            store.put(url, {**page, "markdown": page["markdown"] + "\nchanged"}, run)
+        store.finish_run(run)
+        start = time.perf_counter()
+        changed = sum(1 for _ in store.pages(changed_since=run - 1))
+        changed_seconds = time.perf_counter() - start
+        store.close()
+
+        print(f"{pages} pages")
+        print(f"{'layout':<28} {'MiB on disk':>11} {'load all (s)':>13}")
+        print(f"{'crawled_docs + fixed_docs':<28} {files_bytes / 2**20:>11.2f} {files_seconds:>13.3f}")
+        print(f"{'page store':<28} {store_bytes / 2**20:>11.2f} {store_seconds:>13.3f}")
+        print(f"{'page store, without html':<28} {'':>11} {markdown_seconds:>13.3f}")
+        print(
+            f"disk {files_bytes / store_bytes:.1f}x smaller, load {files_seconds / store_seconds:.1f}x faster "
+            f"({files_seconds / markdown_seconds:.1f}x without html); "
+            f"{changed} pages changed since the previous run listed and loaded in {changed_seconds * 1000:.1f} ms"
+        )
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
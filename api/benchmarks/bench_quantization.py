@@ -0,0 +1,77 @@
+"""Memory, latency and recall of int8 and PQ quantized search on discord_json.
+
+Holds `--queries` messages out of the message-level discord_json corpus,
+writes the rest into an unquantized SegmentStore and into an int8 and a
+PQ one (each compacted, which trains the quantizer once over the whole
+store), and compares them: bytes scanned by the first stage, p50/p99 query latency,
+and recall@5 against exact float search. Queries are never in the corpus.
+
+Run from api/:
+$ python -m benchmarks.bench_quantization                 # ada-002 via the embedding cache
+$ python -m benchmarks.bench_quantization --embeddings hashing
+"""
+
+import argparse
+import tempfile
+
+import numpy as np
+
+from benchmarks.common import percentiles, recall_at_k, timed
+from benchmarks.corpus import embed, message_texts
+from retrieval.segment_store import SegmentStore
+
+K = 5
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--embeddings", choices=["openai", "hashing"], default="openai")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rescore-factor", type=int, nargs="+", default=[4, 10])
+    args = parser.parse_args()
+
+    texts = list(dict.fromkeys(message_texts()))
+    vectors = embed(texts, args.embeddings)
+    rng = np.random.default_rng(0)
+    held_out = np.zeros(len(vectors), dtype=bool)
+    held_out[rng.choice(len(vectors), args.queries, replace=False)] = True
+    queries = vectors[held_out]
+    items = [
+        {"id": str(i), "values": v, "metadata": {"type": "discord_thread"}}
+        for i, v in enumerate(vectors)
+        if not held_out[i]
+    ]
+    print(f"corpus: {len(items)} distinct message chunks, {vectors.shape[1]}-d, {args.queries} held-out queries")
+
+    with tempfile.TemporaryDirectory() as root:
+        baseline = SegmentStore(f"{root}/none", dimension=vectors.shape[1])
+        baseline.upsert(items)
+        truth = [[id for id, _ in hits] for hits in baseline.search(queries, K)]
+        timings = [timed(baseline.search, q, K)[0] for q in queries]
+        float_bytes = vectors.shape[0] * vectors.shape[1] * 4
+        p50, p99 = percentiles(timings)
+        print(f"{'mode':>6} {'rescore':>8} {'scan MB':>8} {'recall@5':>9} {'p50':>9} {'p99':>9}")
+        print(f"{'none':>6} {'-':>8} {float_bytes / 2**20:>8.2f} {1.0:>9.3f} {p50:>7.3f}ms {p99:>7.3f}ms")
+
+        for mode in ("int8", "pq"):
+            store = SegmentStore(f"{root}/{mode}", dimension=vectors.shape[1], quantization=mode)
+            store.upsert(items)
+            train_ms, _ = timed(store.compact)
+            code_bytes = sum(seg.codes.nbytes for seg in store._segments)
+            for factor in args.rescore_factor:
+                store.rescore_factor = factor
+                found, timings = [], []
+                for q in queries:
+                    ms, hits = timed(store.search, q, K)
+                    timings.append(ms)
+                    found.append([id for id, _ in hits[0]])
+                p50, p99 = percentiles(timings)
+                print(
+                    f"{mode:>6} {factor * K:>8} {code_bytes / 2**20:>8.2f} "
+                    f"{recall_at_k(truth, found, K):>9.3f} {p50:>7.3f}ms {p99:>7.3f}ms"
+                )
+            print(f"{mode} compaction with training: {train_ms / 1000:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Per-query retriever setup overhead, before and after the retriever registry.
+
+"before" rebuilds the vector store, embedding model, `VectorStoreIndex` and
+retriever on every query, the way `retrieve_llamaindex` used to. "after"
+asks the process-wide `RetrieverRegistry` for a cached retriever. Both use
+an in-memory stub vector store and `MockEmbedding`, so the numbers isolate
+client construction from network and embedding time.
+
+Run from api/:
+$ python -m benchmarks.bench_retriever_registry --queries 200
+$ python -m benchmarks.bench_retriever_registry --list-indexes-ms 80  # simulate the Pinecone round-trip
+"""
+
+import argparse
+import statistics
+import time
+from typing import Any, List
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from retrieval.registry import RetrieverRegistry, filters_from_key
+
+FILTER_KEY = ("ne", ("docs",))
+
+
+class StubVectorStore(BasePydanticVectorStore):
+    """Returns the same handful of nodes for every query."""
+
+    stores_text: bool = True
+
+    def __init__(self, setup_delay_s: float = 0.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        # Stands in for the `list_indexes()` / `describe_index()` calls a
+        # real PineconeVectorStore makes while connecting.
+        if setup_delay_s:
+            time.sleep(setup_delay_s)
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def add(self, nodes, **kwargs) -> List[str]:
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **kwargs) -> None:
+        pass
+
+    def query(self, query: VectorStoreQuery, **kwargs) -> VectorStoreQueryResult:
+        k = query.similarity_top_k
+        nodes = [
+            TextNode(text=f"thread {i}", metadata={"type": "discord_thread"})
+            for i in range(k)
+        ]
+        return VectorStoreQueryResult(
+            nodes=nodes, similarities=[1.0 - i / 10 for i in range(k)], ids=[n.node_id for n in nodes]
+        )
+
+
+def time_queries(run_query, queries: int) -> List[float]:
+    timings = []
+    for i in range(queries):
+        start = time.perf_counter()
+        run_query(f"how do I use images in baml? #{i}")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument(
+        "--list-indexes-ms",
+        type=float,
+        default=0.0,
+        help="simulated connection round-trip paid whenever a vector store is built",
+    )
+    args = parser.parse_args()
+    delay = args.list_indexes_ms / 1000
+
+    def before(query: str):
+        vector_store = StubVectorStore(setup_delay_s=delay)
+        embed_model = MockEmbedding(embed_dim=1536)
+        index = VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
+        retriever = index.as_retriever(similarity_top_k=5, filters=filters_from_key(FILTER_KEY))
+        return retriever.retrieve(query)
+
+    registry = RetrieverRegistry(
+        vector_store_factory=lambda _registry, _name: StubVectorStore(setup_delay_s=delay),
+        embed_model_factory=lambda _model: MockEmbedding(embed_dim=1536),
+        # same top-5 vector retrieval as "before", so only setup cost differs
+        reranker="none",
+    )
+    registry.warm("baml2", [FILTER_KEY])
+
+    def after(query: str):
+        return registry.retriever("baml2", FILTER_KEY).retrieve(query)
+
+    # warm up imports and pydantic model caches
+    before("warmup")
+    after("warmup")
+
+    for name, run_query in [("before (rebuild per query)", before), ("after (registry)", after)]:
+        timings = sorted(time_queries(run_query, args.queries))
+        p50 = statistics.median(timings)
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f"{name:28s} mean={statistics.fmean(timings):8.3f}ms p50={p50:8.3f}ms p99={p99:8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Helpers shared by the benchmark scripts."""
+
+import time
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+
+def clustered_vectors(n: int, dimension: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    L2-normalized vectors drawn around `clusters` random centers, a rough
+    stand-in for real embeddings, which are far from uniformly spread.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dimension))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def perturbed_queries(vectors: np.ndarray, n: int, noise: float = 0.3, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), n)] + noise * rng.normal(
+        size=(n, vectors.shape[1])
+    ).astype(np.float32) / np.sqrt(vectors.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_topk(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[List[int]]:
+    scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k].tolist()
+
+
+def recall_at_k(truth: Sequence[Sequence], found: Sequence[Sequence], k: int) -> float:
+    hits = sum(len(set(t[:k]) & set(f[:k])) for t, f in zip(truth, found))
+    return hits / (k * len(truth)) if truth else 0.0
+
+
+def percentiles(timings_ms: Sequence[float]) -> Tuple[float, float]:
+    """(p50, p99) of the given latencies."""
+    ordered = sorted(timings_ms)
+    p50 = ordered[len(ordered) // 2]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return p50, p99
+
+
+def timed(fn: Callable, *args) -> Tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
@@ -0,0 +1,94 @@
+"""Loads the checked-in `discord_json` dumps as benchmark corpora.
+
+Embeddings come either from OpenAI (through the shared embedding cache, so
+only the first run pays) or, with `--embeddings hashing`, from a local
+feature-hashing embedder that needs no API key. Hashing embeddings keep the
+corpus's real term overlap structure but are not semantically meaningful,
+so use them for latency/memory numbers and relative recall only.
+"""
+
+import glob
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+DISCORD_JSON_DIR = Path(__file__).parent.parent.parent / "discord_json"
+CRAWLED_DOCS_DIR = Path(__file__).parent.parent / "crawled_docs"
+SAMPLE_PAGE = Path(__file__).parent.parent / "test.html"
+_TOKEN = re.compile(r"[a-z0-9_]+")
+
+
+def load_threads() -> List[dict]:
+    threads = []
+    for path in sorted(glob.glob(str(DISCORD_JSON_DIR / "thread_messages_*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            threads.extend(t for t in json.load(f) if t["thread_id"])
+    return threads
+
+
+def thread_texts() -> List[str]:
+    return [
+        "\n".join(f"{m['author']}: {m['content']}" for m in t["messages"] if m["content"])
+        for t in load_threads()
+    ]
+
+
+def message_texts() -> List[str]:
+    """Message-level chunks: every non-empty message in every thread."""
+    return [m["content"] for t in load_threads() for m in t["messages"] if m["content"].strip()]
+
+
+def write_docs_pages(out_dir: Path, n: int = 200) -> List[Path]:
+    """
+    Crawled-docs JSON pages for the conversion benchmarks: copies of
+    crawled_docs/ when a crawl exists, otherwise `n` variants of the
+    checked-in Fern page test.html.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    sources = sorted(CRAWLED_DOCS_DIR.glob("*.json")) if CRAWLED_DOCS_DIR.is_dir() else []
+    paths = []
+    if sources:
+        for source in sources:
+            path = out_dir / source.name
+            path.write_bytes(source.read_bytes())
+            paths.append(path)
+        return paths
+    html = SAMPLE_PAGE.read_text(encoding="utf-8")
+    for i in range(n):
+        path = out_dir / f"page_{i:05d}.json"
+        page = {
+            "markdown": "",
+            "html": html.replace("</article>", f"<p>Variant {i}.</p></article>", 1),
+            "metadata": {"statusCode": 200, "ogUrl": f"https://docs.example.com/page-{i}", "ogTitle": f"Page {i}"},
+        }
+        path.write_text(json.dumps(page, ensure_ascii=False), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def hashing_embeddings(texts: List[str], dimension: int = 1536) -> np.ndarray:
+    """Signed feature hashing of unigrams and bigrams, L2-normalized."""
+    vectors = np.zeros((len(texts), dimension), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = _TOKEN.findall(text.lower())
+        for feature in tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vectors[row, digest % dimension] += 1.0 if digest >> 63 else -1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def embed(texts: List[str], source: str, dimension: int = 1536) -> np.ndarray:
+    if source == "hashing":
+        return hashing_embeddings(texts, dimension)
+    from retrieval.embeddings import embed_texts
+
+    vectors = []
+    for start in range(0, len(texts), 512):
+        vectors.extend(embed_texts([t[:8000] for t in texts[start : start + 512]]))
+    return np.asarray(vectors, dtype=np.float32)
@@ -0,0 +1,152 @@
+"""Local stand-in for the docs site, for crawl_docs.py.
+
+Serves `pages` generated docs pages under `/docs`, each linking to a few
+others, with `ETag` / `Last-Modified` validators and 304 replies to
+matching conditional requests. A configurable fraction of requests fails
+with 429 (with `Retry-After`) or 503, and `bump()` changes a page's
+content so revalidation can be observed.
+
+Run from api/:
+$ python -m benchmarks.fake_docs_server --port 8766 --pages 200
+$ python crawl_docs.py --start-url http://127.0.0.1:8766/docs --out /tmp/crawled_docs --rate 50
+"""
+
+import argparse
+import hashlib
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+
+class FakeDocsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        pages: int = 50,
+        latency_ms: float = 20.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        super().__init__(address, _Handler)
+        self.pages = pages
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.max_in_flight = 0
+        self.request_times = []
+        self._in_flight = 0
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._modified = formatdate(time.time() - 3600, usegmt=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/docs"
+
+    def start(self) -> "FakeDocsServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def bump(self, page: int):
+        """Changes page `page`'s content (and so its validators)."""
+        with self._lock:
+            self._versions[page] = self._versions.get(page, 0) + 1
+
+    def page(self, number: int) -> str:
+        version = self._versions.get(number, 0)
+        links = "".join(
+            f'<li><a href="/docs/page-{(number * 7 + k) % self.pages}#section">page {(number * 7 + k) % self.pages}</a></li>'
+            for k in (1, 2, 3)
+        )
+        return (
+            f"<html><head><title>Page {number}</title>"
+            f'<meta property="og:title" content="Page {number} | Docs">'
+            f"</head><body><main><h1>Page {number}</h1>"
+            f"<p>Version {version} of page {number}. " + "Lorem ipsum dolor sit amet. " * 20 + "</p>"
+            f'<ul>{links}<li><a href="https://example.com/elsewhere">outside</a></li></ul>'
+            "</main></body></html>"
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeDocsServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b"", headers: Tuple[Tuple[str, str], ...] = ()):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.requests += 1
+            server.request_times.append(time.monotonic())
+            server._in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server._in_flight)
+            roll = server._random.random()
+        try:
+            time.sleep(server.latency_ms / 1000)
+            path = self.path.split("?")[0].rstrip("/")
+            if path == "/docs":
+                number = 0
+            elif path.startswith("/docs/page-") and path[len("/docs/page-") :].isdigit():
+                number = int(path[len("/docs/page-") :])
+            else:
+                number = -1
+            if not 0 <= number < server.pages:
+                self._reply(404, b"not found")
+                return
+            if roll < server.error_rate / 2:
+                with server._lock:
+                    server.errors += 1
+                self._reply(429, b"rate limited", (("Retry-After", "0.05"),))
+                return
+            if roll < server.error_rate:
+                with server._lock:
+                    server.errors += 1
+                self._reply(503, b"unavailable")
+                return
+            body = server.page(number).encode()
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            validators = (("ETag", etag), ("Last-Modified", server._modified))
+            if self.headers.get("If-None-Match") == etag:
+                with server._lock:
+                    server.not_modified += 1
+                self._reply(304, b"", validators)
+                return
+            self._reply(200, body, validators)
+        finally:
+            with server._lock:
+                server._in_flight -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeDocsServer(("127.0.0.1", args.port), args.pages, args.latency_ms, args.error_rate)
+    print(f"Serving fake docs at {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Local stand-in for the OpenAI embeddings endpoint.
+
+Serves `POST /v1/embeddings` with hashing embeddings (see corpus.py), after
+an optional per-request latency, and fails a configurable fraction of
+requests with 429 (with `Retry-After`) or 500, so `EmbeddingBatcher`'s
+packing, concurrency and retries can be exercised without an API key.
+
+Run from api/:
+$ python -m benchmarks.fake_embeddings_server --port 8765 --error-rate 0.1
+$ OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python ingest_threads.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+from benchmarks.corpus import hashing_embeddings
+
+
+class FakeEmbeddingsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        latency_ms: float = 50.0,
+        error_rate: float = 0.0,
+        dimension: int = 1536,
+        seed: int = 0,
+    ):
+        super().__init__(address, _Handler)
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.dimension = dimension
+        self.requests = 0
+        self.errors = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeEmbeddingsServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeEmbeddingsServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict, headers: Tuple[Tuple[str, str], ...] = ()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server._lock:
+            server.requests += 1
+            server._in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server._in_flight)
+            roll = server._random.random()
+        try:
+            time.sleep(server.latency_ms / 1000)
+            if self.path.rstrip("/") != "/v1/embeddings":
+                self._reply(404, {"error": {"message": "not found"}})
+            elif roll < server.error_rate / 2:
+                with server._lock:
+                    server.errors += 1
+                self._reply(429, {"error": {"message": "rate limited"}}, (("Retry-After", "0.05"),))
+            elif roll < server.error_rate:
+                with server._lock:
+                    server.errors += 1
+                self._reply(500, {"error": {"message": "server error"}})
+            else:
+                inputs = request["input"]
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                vectors = hashing_embeddings(inputs, server.dimension)
+                self._reply(
+                    200,
+                    {
+                        "object": "list",
+                        "model": request["model"],
+                        # reversed, to check that callers order by `index`
+                        "data": [
+                            {"object": "embedding", "index": i, "embedding": vectors[i].tolist()}
+                            for i in reversed(range(len(inputs)))
+                        ],
+                        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                    },
+                )
+        finally:
+            with server._lock:
+                server._in_flight -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeEmbeddingsServer(("127.0.0.1", args.port), args.latency_ms, args.error_rate)
+    print(f"Serving fake embeddings at {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,80 @@
-from firecrawl import FirecrawlApp
-import json
-
-from dotenv import load_dotenv
+import argparse
+import asyncio
 import os
+from pathlib import Path
 
-load_dotenv()
+from dotenv import load_dotenv
 
-app = FirecrawlApp(api_key=os.getenv("FIRECRAWL_API_KEY"))
+from crawling.crawler import (
+    DEFAULT_BURST,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_AGE,
+    DEFAULT_RATE,
+    Crawler,
+    Frontier,
+)
+from crawling.markdown import html_to_markdown
+from crawling.page_store import PageStore, page_store_dir
 
-# Scrape a website:
-scrape_result = app.scrape_url('https://docs.boundaryml.com/docs', params={'formats': ['markdown', 'html']})
+load_dotenv()
 
-# Save content to txt file
-with open('scrape_result.txt', 'w', encoding='utf-8') as f:
-    json.dump(scrape_result, f, ensure_ascii=False, indent=4)
+START_URL = "https://docs.boundaryml.com/docs"
+DEFAULT_FRONTIER_PATH = Path(__file__).parent / ".cache" / "crawl" / "frontier.sqlite"
 
-print("Scrape result saved to scrape_result.txt")
-print(scrape_result)
 
-map_result = app.map_url('https://docs.boundaryml.com/docs')
-with open('map_resulats.txt', 'w', encoding='utf-8') as f:
-    json.dump(map_result, f, ensure_ascii=False, indent=4)
+def main():
+    parser = argparse.ArgumentParser(description="Crawl the docs site into the page store")
+    parser.add_argument("--start-url", default=START_URL)
+    parser.add_argument("--out", default=str(page_store_dir()), help="page store directory")
+    parser.add_argument(
+        "--import-json",
+        metavar="DIR",
+        help="import a directory of per-page JSON files (the old crawled_docs/) instead of crawling",
+    )
+    parser.add_argument(
+        "--frontier",
+        default=os.environ.get("CRAWL_FRONTIER_PATH") or str(DEFAULT_FRONTIER_PATH),
+        help="SQLite file recording crawled URLs and their validators, for resuming",
+    )
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("CRAWL_CONCURRENCY", DEFAULT_CONCURRENCY)))
+    parser.add_argument("--rate", type=float, default=float(os.environ.get("CRAWL_RATE", DEFAULT_RATE)), help="requests per second")
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST)
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=DEFAULT_MAX_AGE,
+        help="seconds before a crawled page is revalidated (0 revalidates everything)",
+    )
+    parser.add_argument("--max-pages", type=int, default=None)
+    args = parser.parse_args()
 
-links = map_result['links']
+    store = PageStore(args.out)
+    if args.import_json:
+        changed = store.import_json_dir(args.import_json)
+        print(f"Imported {args.import_json}: {changed} pages changed, {len(store)} pages in {args.out}")
+        store.close()
+        return
 
-# print(links[0])
-import os
-from tqdm import tqdm
+    frontier = Frontier(args.frontier)
+    crawler = Crawler(
+        args.start_url,
+        store,
+        frontier,
+        html_to_markdown,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        burst=args.burst,
+        max_age=args.max_age,
+        max_pages=args.max_pages,
+    )
+    try:
+        stats = asyncio.run(crawler.run())
+    finally:
+        frontier.close()
+        store.close()
+    print(f"Crawl: {stats.summary()}")
+    print(f"Results saved in {args.out}")
 
-# Create a directory to store the crawled results
-if not os.path.exists('crawled_results'):
-    os.makedirs('crawled_results')
 
-# Iterate through the links and crawl each one
-for index, link in enumerate(tqdm(links, desc="Crawling links")):
-    try:
-        # Crawl the link
-        crawl_result = app.scrape_url(link, params={'formats': ['markdown', 'html']})
-        
-        # Sleep for 10 seconds after scraping
-        import time
-        time.sleep(8)
-        
-        # Generate a filename based on the link
-        filename = f"crawled_docs/result_{index}.json"
-        
-        # Save the crawl result to a file
-        # Ensure the directory exists before writing the file
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(crawl_result, f, ensure_ascii=False, indent=4)
-        
-        print(f"Saved result for {link} to {filename}")
-    except Exception as e:
-        print(f"Error crawling {link}: {str(e)}")
-
-print("Crawling completed. Results saved in 'crawled_results' directory.")
+if __name__ == "__main__":
+    main()
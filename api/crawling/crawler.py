@@ -0,0 +1,382 @@
+"""Concurrent, rate-limited, resumable crawler for the docs site.
+
+crawl_docs.py used to scrape every mapped link through Firecrawl one at a
+time with a fixed 8 second sleep, wrote `result_{index}.json` files whose
+names depended on link order, and started over on every run. `Crawler`
+fetches pages directly:
+
+- up to `concurrency` requests in flight, paced by a `TokenBucket`
+  (`rate` requests per second, bursts of `burst`) instead of sleeps;
+  429/5xx responses are retried with backoff, honouring `Retry-After`;
+- a SQLite `Frontier` records every discovered URL with its status,
+  ETag / Last-Modified and fetch time, so an interrupted crawl resumes
+  where it stopped and pages fetched within `max_age` are skipped;
+- older pages are revalidated with `If-None-Match` / `If-Modified-Since`
+  and a 304 leaves the saved page untouched;
+- each page is saved to the `PageStore` under its URL, in the
+  Firecrawl-shaped record (`markdown`, `html`, `metadata`) that
+  fix_markdown.py and ingest_docs.py read; a page fetched again unchanged
+  is not rewritten.
+
+Links are discovered from fetched pages (same host, under the start URL's
+path), so a local HTTP server stands in for the real site in tests.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+import httpx
+
+from crawling.page_store import PageStore
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 2.0
+DEFAULT_BURST = 4
+# pages fetched more recently than this are not requested again
+DEFAULT_MAX_AGE = 24 * 3600
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_TIMEOUT = 30.0
+USER_AGENT = "notorious-r-a-g-crawler"
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`; `acquire` waits for one."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        """Spends the next `seconds` of tokens, after a 429 from the server."""
+        self._tokens -= seconds * self.rate
+
+
+def normalize_url(url: str) -> str:
+    url, _ = urldefrag(url)
+    parts = urlsplit(url)
+    path = parts.path.rstrip("/") or "/"
+    return f"{parts.scheme}://{parts.netloc}{path}"
+
+
+class _PageParser(HTMLParser):
+    """Links, <title> and og: metadata of a page, in one pass."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links: List[str] = []
+        self.meta: Dict[str, str] = {}
+        self.title = ""
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == "a" and attributes.get("href"):
+            self.links.append(attributes["href"])
+        elif tag == "meta" and attributes.get("property", "").startswith("og:"):
+            self.meta[attributes["property"]] = attributes.get("content") or ""
+        elif tag == "title":
+            self._in_title = True
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+@dataclass
+class FrontierEntry:
+    url: str
+    status: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: Optional[float]
+
+
+class Frontier:
+    """
+    Every URL the crawl has seen: "pending" until fetched, then "done"
+    (with its validators) or "failed". Persisted in SQLite so a rerun
+    resumes.
+    """
+
+    def __init__(self, path: os.PathLike | str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, status TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "fetched_at REAL, http_status INTEGER)"
+        )
+        self._db.commit()
+
+    def add(self, urls: List[str]) -> List[str]:
+        """Adds `urls` as pending; returns the ones not seen before."""
+        new = []
+        with self._lock:
+            for url in urls:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO pages (url, status) VALUES (?, 'pending')", (url,)
+                )
+                if cursor.rowcount:
+                    new.append(url)
+            self._db.commit()
+        return new
+
+    def get(self, url: str) -> Optional[FrontierEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        return FrontierEntry(*row) if row else None
+
+    def urls(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT url FROM pages ORDER BY url")]
+
+    def done(self, url: str, http_status: int, etag: Optional[str], last_modified: Optional[str]):
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET status = 'done', http_status = ?, etag = ?, last_modified = ?, "
+                "fetched_at = ? WHERE url = ?",
+                (http_status, etag, last_modified, time.time(), url),
+            )
+            self._db.commit()
+
+    def failed(self, url: str, http_status: Optional[int]):
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET status = 'failed', http_status = ?, fetched_at = ? WHERE url = ?",
+                (http_status, time.time(), url),
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+@dataclass
+class CrawlStats:
+    fetched: int = 0
+    changed: int = 0
+    not_modified: int = 0
+    skipped: int = 0
+    failed: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.fetched} fetched ({self.changed} changed), {self.not_modified} not modified, {self.skipped} fresh, "
+            f"{self.failed} failed ({self.retries} retries) in {self.seconds:.1f}s"
+        )
+
+
+class Crawler:
+    def __init__(
+        self,
+        start_url: str,
+        store: PageStore,
+        frontier: Frontier,
+        to_markdown: Callable[[str], str],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_age: float = DEFAULT_MAX_AGE,
+        max_pages: Optional[int] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.start_url = normalize_url(start_url)
+        parts = urlsplit(self.start_url)
+        self._host = parts.netloc
+        self._prefix = parts.path.rstrip("/")
+        self.store = store
+        self._run: Optional[int] = None
+        self.frontier = frontier
+        self.to_markdown = to_markdown
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.max_age = max_age
+        self.max_pages = max_pages
+        self.max_retries = max_retries
+        self.stats = CrawlStats()
+        self._client = client
+
+    def _in_scope(self, url: str) -> bool:
+        parts = urlsplit(url)
+        return (
+            parts.scheme in ("http", "https")
+            and parts.netloc == self._host
+            and (parts.path == self._prefix or parts.path.startswith(self._prefix + "/"))
+        )
+
+    def _links(self, base_url: str, hrefs: List[str]) -> List[str]:
+        links = (normalize_url(urljoin(base_url, href)) for href in hrefs)
+        return list(dict.fromkeys(link for link in links if self._in_scope(link)))
+
+    async def _get(self, client: httpx.AsyncClient, url: str, headers: Dict[str, str]) -> httpx.Response:
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                response = await client.get(url, headers=headers)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                self.stats.retries += 1
+                await asyncio.sleep(2**attempt)
+                continue
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            if attempt == self.max_retries:
+                return response
+            self.stats.retries += 1
+            try:
+                delay = float(response.headers["retry-after"])
+            except (KeyError, ValueError):
+                delay = 2.0**attempt
+            if response.status_code == 429:
+                self.bucket.penalize(delay)
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str) -> List[str]:
+        """Fetches (or revalidates) `url`; returns the in-scope links it contains."""
+        entry = self.frontier.get(url)
+        headers: Dict[str, str] = {}
+        if entry is not None and entry.status == "done":
+            if entry.fetched_at is not None and time.time() - entry.fetched_at < self.max_age:
+                self.stats.skipped += 1
+                return self._saved_links(url)
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = await self._get(client, url, headers)
+        if response.status_code == 304:
+            self.frontier.done(url, 304, entry.etag, entry.last_modified)
+            self.stats.not_modified += 1
+            return self._saved_links(url)
+        if response.status_code >= 400 or "html" not in response.headers.get("content-type", "html"):
+            self.frontier.failed(url, response.status_code)
+            self.stats.failed += 1
+            return []
+
+        html = response.text
+        parser = _PageParser()
+        parser.feed(html)
+        links = self._links(str(response.url), parser.links)
+        # markdown conversion is CPU-bound; keep it off the event loop
+        markdown = await asyncio.get_running_loop().run_in_executor(None, self.to_markdown, html)
+        page = {
+            "markdown": markdown,
+            "html": html,
+            "links": links,
+            "metadata": {
+                "title": parser.title.strip(),
+                "ogTitle": parser.meta.get("og:title") or parser.title.strip(),
+                "ogUrl": parser.meta.get("og:url") or url,
+                "sourceURL": url,
+                "statusCode": response.status_code,
+                "etag": response.headers.get("etag"),
+                "lastModified": response.headers.get("last-modified"),
+            },
+        }
+        self.stats.changed += self.store.put(url, page, self._run)
+        self.frontier.done(url, response.status_code, response.headers.get("etag"), response.headers.get("last-modified"))
+        self.stats.fetched += 1
+        return links
+
+    def _saved_links(self, url: str) -> List[str]:
+        # pages not fetched this run still contribute their links to the frontier
+        page = self.store.get(url)
+        return page.get("links", []) if page else []
+
+    async def run(self) -> CrawlStats:
+        start = time.perf_counter()
+        self._run = self.store.begin_run("crawl")
+        queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self.frontier.add([self.start_url])
+        queued = set()
+        # everything known, including pages of earlier runs, is (re)visited
+        for url in [self.start_url, *self.frontier.urls()]:
+            if url not in queued:
+                queued.add(url)
+                queue.put_nowait(url)
+
+        client = self._client or httpx.AsyncClient(
+            follow_redirects=True, timeout=DEFAULT_TIMEOUT, headers={"User-Agent": USER_AGENT}
+        )
+
+        # unexpected (non-HTTP) errors, raised once the queue is drained
+        errors: List[BaseException] = []
+
+        async def worker():
+            while True:
+                url = await queue.get()
+                try:
+                    try:
+                        links = await self._fetch(client, url)
+                    except httpx.HTTPError as error:
+                        print(f"Error crawling {url}: {error}")
+                        self.frontier.failed(url, None)
+                        self.stats.failed += 1
+                        links = []
+                    for link in links:
+                        if link not in queued and (self.max_pages is None or len(queued) < self.max_pages):
+                            queued.add(link)
+                            self.frontier.add([link])
+                            queue.put_nowait(link)
+                except Exception as error:
+                    # a dead worker would leave queue.join() waiting forever, so keep going
+                    print(f"Unexpected error crawling {url}: {error!r}")
+                    errors.append(error)
+                    self.stats.failed += 1
+                    try:
+                        self.frontier.failed(url, None)
+                    except Exception as frontier_error:
+                        errors.append(frontier_error)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self._client is None:
+                await client.aclose()
+        if errors:
+            # the run stays unfinished, so later stages do not treat this crawl as complete
+            raise RuntimeError(f"{len(errors)} unexpected errors while crawling") from errors[0]
+        self.store.finish_run(self._run)
+        self.stats.seconds = time.perf_counter() - start
+        return self.stats
@@ -0,0 +1,64 @@
+"""HTML -> markdown for Fern docs pages, in a single parse.
+
+`test_script.html_to_markdown` parses a page with BeautifulSoup, rewrites
+the Fern code blocks (tables of `code-block-line` rows, one per line of
+code, next to line-number cells) into `<pre><code>`, serializes the whole
+tree back with `str(soup)` and has markdownify parse that string again.
+The double parse and the intermediate page-sized string were most of the
+time and memory spent converting a crawl.
+
+`html_to_markdown` here parses once and hands the tree to markdownify's
+converter directly. The code blocks are rewritten as the converter walks
+the tree: on entering an element, Fern code blocks among its children are
+swapped for the same `<pre><code>` before markdownify looks at them, so
+whitespace around them is handled exactly as it was after the reparse.
+Tables, links and everything else go through markdownify unchanged, and
+the output matches the old function's under the locked markdownify (1.x);
+see benchmarks/bench_html_to_markdown.py. (Under 0.13 the old function's
+reparse of `str(soup)` adds a leading newline after the doctype, which a
+single parse cannot reproduce.)
+"""
+
+from bs4 import BeautifulSoup, Tag
+from markdownify import MarkdownConverter
+
+CODE_BLOCK_CLASS = "code-block text-sm"
+
+
+def _is_code_block(node) -> bool:
+    return isinstance(node, Tag) and node.name == "code" and " ".join(node.get("class") or ()) == CODE_BLOCK_CLASS
+
+
+def _code_lines(code_block: Tag) -> str:
+    """The code of a Fern code block, skipping its line numbers."""
+    lines = []
+    for row in code_block.find_all("tr", class_="code-block-line"):
+        cell = row.find("td", class_="code-block-line-content")
+        if cell:
+            span = cell.find("span", class_="line")
+            if span:
+                lines.append(span.get_text())
+    return "\n".join(lines)
+
+
+class FernMarkdownConverter(MarkdownConverter):
+    def __init__(self, soup: BeautifulSoup, **options):
+        super().__init__(**options)
+        self._soup = soup
+
+    # markdownify 0.13 passes (convert_as_inline, children_only), 1.x (parent_tags); forward either
+    def process_tag(self, node, *args, **kwargs):
+        code_blocks = [child for child in node.contents if _is_code_block(child)] if isinstance(node, Tag) else []
+        for code_block in code_blocks:
+            pre = self._soup.new_tag("pre")
+            code = self._soup.new_tag("code")
+            code["class"] = "language-json"
+            code.string = _code_lines(code_block)
+            pre.append(code)
+            code_block.replace_with(pre)
+        return super().process_tag(node, *args, **kwargs)
+
+
+def html_to_markdown(html_content: str) -> str:
+    soup = BeautifulSoup(html_content, "html.parser")
+    return FernMarkdownConverter(soup).convert_soup(soup)
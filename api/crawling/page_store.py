@@ -0,0 +1,223 @@
+"""Compact, content-addressed store for crawled pages.
+
+The crawl used to live in one pretty-printed JSON file per page
+(crawled_docs/, full HTML and markdown), fix_markdown.py wrote a second
+full copy of each (fixed_docs/), and ingest_docs.py listed and parsed every
+file on every run. A `PageStore` is a directory of two files:
+
+- `pages.bin`: append-only zlib-compressed blobs addressed by the sha256
+  of their content. A page is two blobs: its html, and the rest of the
+  record as JSON (markdown, metadata, links). A page crawled again
+  unchanged, or under a second URL, adds nothing, and rewriting a page's
+  markdown leaves its html blob alone;
+- `index.sqlite`: url -> hashes -> (offset, length) of its blobs, plus the
+  run (a numbered pass of some stage: a crawl, a markdown fix) in which
+  each URL's content last changed.
+
+Blobs are read through a read-only mmap of `pages.bin`, so readers in
+other processes (fix_markdown's workers) share the page cache instead of
+each reading files. `urls(changed_since=run)` lists only pages changed
+after a given run, which lets a stage pick up where its last finished run
+(`last_run(stage)`) left off. Stages that only need the markdown
+(ingest_docs.py) pass `include_html=False` and never decompress the html.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_PAGE_STORE_DIR = Path(__file__).parent.parent / "crawled_pages"
+BLOBS_FILE = "pages.bin"
+INDEX_FILE = "index.sqlite"
+COMPRESSION_LEVEL = 6
+
+Page = Dict[str, Any]
+
+
+def page_store_dir() -> Path:
+    return Path(os.environ.get("PAGE_STORE_DIR") or DEFAULT_PAGE_STORE_DIR)
+
+
+def _blob(payload: bytes) -> Tuple[str, bytes]:
+    return hashlib.sha256(payload).hexdigest(), zlib.compress(payload, COMPRESSION_LEVEL)
+
+
+def _encode(page: Page) -> Tuple[Tuple[str, bytes], Tuple[str, bytes]]:
+    """The (hash, blob) of `page`'s html and of the rest of it."""
+    record = {key: value for key, value in page.items() if key != "html"}
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return _blob((page.get("html") or "").encode("utf-8")), _blob(payload.encode("utf-8"))
+
+
+class PageStore:
+    def __init__(self, path: os.PathLike | str | None = None):
+        self.path = Path(path) if path is not None else page_store_dir()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path / INDEX_FILE), check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, offset INTEGER NOT NULL, length INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, html_hash TEXT NOT NULL, record_hash TEXT NOT NULL, run INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS pages_run ON pages (run);"
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, stage TEXT NOT NULL, started_at REAL NOT NULL, finished_at REAL);"
+        )
+        self._db.commit()
+        self._blobs_path = self.path / BLOBS_FILE
+        self._blobs_path.touch()
+        self._writer = None
+        self._map: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    # runs
+
+    def begin_run(self, stage: str) -> int:
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO runs (stage, started_at) VALUES (?, ?)", (stage, time.time()))
+            self._db.commit()
+            return cursor.lastrowid
+
+    def finish_run(self, run: int):
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run))
+            self._db.commit()
+
+    def last_run(self, stage: str) -> Optional[int]:
+        """The latest run of `stage` that finished, if any."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(id) FROM runs WHERE stage = ? AND finished_at IS NOT NULL", (stage,)
+            ).fetchone()
+        return row[0]
+
+    # pages
+
+    def put(self, url: str, page: Page, run: int) -> bool:
+        """Stores `page` as `url`'s content; False when it was already that."""
+        (html_hash, html_blob), (record_hash, record_blob) = _encode(page)
+        with self._lock:
+            row = self._db.execute("SELECT html_hash, record_hash FROM pages WHERE url = ?", (url,)).fetchone()
+            if row == (html_hash, record_hash):
+                return False
+            for hash, blob in ((html_hash, html_blob), (record_hash, record_blob)):
+                if self._db.execute("SELECT 1 FROM blobs WHERE hash = ?", (hash,)).fetchone() is None:
+                    if self._writer is None:
+                        self._writer = open(self._blobs_path, "ab")
+                    offset = self._writer.seek(0, os.SEEK_END)
+                    self._writer.write(blob)
+                    self._db.execute(
+                        "INSERT INTO blobs (hash, offset, length) VALUES (?, ?, ?)", (hash, offset, len(blob))
+                    )
+            if self._writer is not None:
+                # the blobs are on disk before the index points at them
+                self._writer.flush()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, html_hash, record_hash, run) VALUES (?, ?, ?, ?)",
+                (url, html_hash, record_hash, run),
+            )
+            self._db.commit()
+        return True
+
+    def _rows(self, columns: str, where: str = "", params: Tuple = ()) -> List[Tuple]:
+        """`columns` of the pages (aliased p), their record blob (r) and html blob (h), in record blob order."""
+        query = (
+            f"SELECT {columns} FROM pages p JOIN blobs r ON r.hash = p.record_hash "
+            f"JOIN blobs h ON h.hash = p.html_hash {where} ORDER BY r.offset"
+        )
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def urls(self, changed_since: Optional[int] = None) -> List[str]:
+        """All urls, or those whose content changed in a run after `changed_since`."""
+        if changed_since is None:
+            return [row[0] for row in self._rows("p.url")]
+        return [row[0] for row in self._rows("p.url", "WHERE p.run > ?", (changed_since,))]
+
+    def get(self, url: str, include_html: bool = True) -> Optional[Page]:
+        rows = self._rows("r.offset, r.length, h.offset, h.length", "WHERE p.url = ?", (url,))
+        return self._page(*rows[0], include_html) if rows else None
+
+    def pages(self, changed_since: Optional[int] = None, include_html: bool = True) -> Iterator[Tuple[str, Page]]:
+        """(url, page) pairs, as `urls`, decompressed one at a time."""
+        columns = "p.url, r.offset, r.length, h.offset, h.length"
+        if changed_since is None:
+            rows = self._rows(columns)
+        else:
+            rows = self._rows(columns, "WHERE p.run > ?", (changed_since,))
+        for url, *offsets in rows:
+            yield url, self._page(*offsets, include_html)
+
+    def _page(self, record_offset: int, record_length: int, html_offset: int, html_length: int, include_html: bool) -> Page:
+        page = json.loads(self._read(record_offset, record_length))
+        if include_html:
+            page["html"] = self._read(html_offset, html_length).decode("utf-8")
+        return page
+
+    def _read(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            if self._map is None or offset + length > len(self._map):
+                # pages.bin grew since it was mapped (this or another process appended)
+                if self._map is not None:
+                    self._map.close()
+                with open(self._blobs_path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            blob = self._map[offset : offset + length]
+        return zlib.decompress(blob)
+
+    def import_json_dir(self, directory: os.PathLike | str) -> int:
+        """Imports a crawled_docs/-style directory of per-page JSON files; returns pages changed."""
+        run = self.begin_run("import")
+        changed = 0
+        for path in sorted(Path(directory).glob("*.json")):
+            with open(path, "r", encoding="utf-8") as f:
+                page = json.load(f)
+            metadata = page.get("metadata") or {}
+            url = metadata.get("sourceURL") or metadata.get("ogUrl") or metadata.get("url") or path.stem
+            changed += self.put(url, page, run)
+        self.finish_run(run)
+        return changed
+
+    def compact(self):
+        """Rewrites pages.bin without blobs no url points at. Run it while no other stage uses the store."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT hash, offset, length FROM blobs WHERE hash IN "
+                "(SELECT html_hash FROM pages UNION SELECT record_hash FROM pages) ORDER BY offset"
+            ).fetchall()
+        compacted = self.path / (BLOBS_FILE + ".compact")
+        offsets = []
+        with open(compacted, "wb") as out, open(self._blobs_path, "rb") as f:
+            for hash, offset, length in rows:
+                f.seek(offset)
+                offsets.append((hash, out.tell(), length))
+                out.write(f.read(length))
+        with self._lock:
+            self._close_files()
+            os.replace(compacted, self._blobs_path)
+            self._db.execute("DELETE FROM blobs")
+            self._db.executemany("INSERT INTO blobs (hash, offset, length) VALUES (?, ?, ?)", offsets)
+            self._db.commit()
+
+    def _close_files(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+            self._db.close()
@@ -1,41 +1,106 @@
+import argparse
 import os
-import json
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Iterable, Optional, Tuple
+
 from tqdm import tqdm
-from test_script import html_to_markdown
-from pathlib import Path
 
-def process_crawled_docs():
-    crawled_docs_dir = Path(__file__).parent / "crawled_docs"
-    fixed_docs_dir = Path(__file__).parent / "fixed_docs"
+from crawling.markdown import html_to_markdown
+from crawling.page_store import PageStore, page_store_dir
+
+STAGE = "fix_markdown"
+# pages handed to a worker at a time; pages take milliseconds, so batching keeps IPC overhead low
+DEFAULT_CHUNKSIZE = 8
+
+# the page store each worker process reads through
+_store: Optional[PageStore] = None
+
+
+@dataclass
+class FixStats:
+    converted: int = 0
+    unchanged: int = 0
+    up_to_date: int = 0
+    skipped: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.converted} converted, {self.unchanged} unchanged, {self.up_to_date} up to date, "
+            f"{self.skipped} without content"
+        )
+
+
+def _open_store(path: str):
+    global _store
+    _store = PageStore(path)
+
+
+def fix_page(url: str) -> Tuple[str, Optional[str]]:
+    """(url, markdown converted from the page's html), or (url, None) for 404s and pages without markdown."""
+    doc = _store.get(url)
+    if doc is None or "markdown" not in doc or doc["metadata"]["statusCode"] == 404:
+        return url, None
+    return url, html_to_markdown(doc["html"])
 
-    # Create the fixed_docs directory if it doesn't exist
-    os.makedirs(fixed_docs_dir, exist_ok=True)
 
-    for filename in tqdm(os.listdir(crawled_docs_dir), desc="Processing files"):
-        if filename.endswith(".json"):
-            file_path = os.path.join(crawled_docs_dir, filename)
-            with open(file_path, "r", encoding="utf-8") as f:
-                doc = json.load(f)
+def process_crawled_docs(
+    store_dir: Optional[os.PathLike | str] = None,
+    workers: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    force: bool = False,
+    progress: bool = True,
+) -> FixStats:
+    """
+    Rewrites the markdown of the pages in the page store from their html,
+    on `workers` processes (default: one per CPU; 1 converts in this
+    process). Only pages changed since the last finished run are converted,
+    unless `force`. Workers read pages through their own mmap of the store
+    and return just the markdown; results are written back in completion
+    order.
+    """
+    store_dir = str(store_dir or page_store_dir())
+    store = PageStore(store_dir)
+    try:
+        since = None if force else store.last_run(STAGE)
+        pending = store.urls(changed_since=since)
+        stats = FixStats(up_to_date=len(store) - len(pending))
+        run = store.begin_run(STAGE)
+        workers = min(workers or os.cpu_count() or 1, max(1, len(pending)))
 
-                if "markdown" in doc and doc["metadata"]["statusCode"] != 404:
-                    doc["markdown"] = doc["markdown"].replace(
-                        "` | | | | --- | --- | ", "`   |     |     | | --- | --- |\n"
-                    )
-                    # Fix the markdown content
-                    fixed_markdown = html_to_markdown(doc["html"])
+        def record(results: Iterable[Tuple[str, Optional[str]]]):
+            for url, markdown in tqdm(results, total=len(pending), desc="Processing files", disable=not progress):
+                if markdown is None:
+                    stats.skipped += 1
+                elif store.put(url, {**store.get(url), "markdown": markdown}, run):
+                    stats.converted += 1
+                else:
+                    stats.unchanged += 1
 
-                    # Update the document with fixed markdown
-                    doc["markdown"] = fixed_markdown
+        if workers == 1:
+            global _store
+            _store = store
+            record(map(fix_page, pending))
+        else:
+            with Pool(workers, initializer=_open_store, initargs=(store_dir,)) as pool:
+                record(pool.imap_unordered(fix_page, pending, chunksize=chunksize))
+        store.finish_run(run)
+    finally:
+        store.close()
+    return stats
 
-                    # Save the fixed document
-                    fixed_file_path = os.path.join(fixed_docs_dir, filename)
-                    with open(fixed_file_path, "w", encoding="utf-8") as f_out:
-                        json.dump(doc, f_out, ensure_ascii=False, indent=2)
 
-    print(
-        f"Processed and fixed markdown for all documents. Results saved in {fixed_docs_dir}"
-    )
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite crawled docs' markdown from their html")
+    parser.add_argument("--store", default=str(page_store_dir()), help="page store directory")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--force", action="store_true", help="also convert pages unchanged since the last run")
+    args = parser.parse_args()
+    stats = process_crawled_docs(args.store, workers=args.workers, chunksize=args.chunksize, force=args.force)
+    print(f"Fixed markdown: {stats.summary()}")
+    print(f"Results saved in {args.store}")
 
 
 if __name__ == "__main__":
-    process_crawled_docs()
+    main()
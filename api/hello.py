@@ -3,7 +3,9 @@ from contextlib import asynccontextmanager
 from baml_client.types import QuestionType
 from discord_thread import run_bot
 from baml_client.types import Classification
-from pipeline.pipeline_steps import run_pipeline
+from pipeline.pipeline_steps import RAG_INDEX_NAME, run_pipeline
+from notorious_r_a_g.rag_simple import warm_retrievers
+from retrieval.rerank import retrieval_latency
 from fastapi import BackgroundTasks, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pipeline.db import AgentStateManager, FinalState, InitialState
@@ -15,6 +17,8 @@ from baml_client import b
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # build the long-lived retrievers once, before the first question arrives
+    await asyncio.to_thread(warm_retrievers, RAG_INDEX_NAME)
     task = asyncio.create_task(run_bot())
     yield
     task.cancel()
@@ -61,6 +65,12 @@ async def read_agent(agent_id: str) -> FinalState | None:
     return state.final_state()
 
 
+@app.get("/retrieval/stats")
+async def retrieval_stats() -> dict:
+    # p50/p95 of first-stage retrieval and reranking, in ms
+    return retrieval_latency().summary()
+
+
 # Socket.IO event handlers
 # @sio.event
 # async def connect(sid, environ):
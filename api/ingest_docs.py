@@ -4,78 +4,88 @@ from dotenv import load_dotenv
 load_dotenv()
 client = OpenAI()
 
+from retrieval.embedding_batcher import EmbeddingBatcher
+from retrieval.embedding_cache import get_embedding_cache
+from retrieval.embeddings import embed_texts, embed_texts_batched
+
 def get_embedding(text, model="text-embedding-ada-002"):
    text = text.replace("\n", " ")
-   return client.embeddings.create(input = [text], model=model).data[0].embedding
+   return embed_texts([text], model=model, query=True)[0]
 
-import os
-import json
 import uuid
 
-data = []
-
-# Load all documents from crawled_docs directory
-crawled_docs_dir = os.path.join(os.path.dirname(__file__), 'crawled_docs')
 from tqdm import tqdm
 
-for filename in tqdm(os.listdir(crawled_docs_dir), desc="Processing files"):
-    if filename.endswith('.json'):
-        file_path = os.path.join(crawled_docs_dir, filename)
-        with open(file_path, 'r', encoding='utf-8') as f:
-            doc = json.load(f)
-            # Assuming the crawled document has a 'content' field
+from crawling.page_store import PageStore
+from retrieval.chunking import chunk_markdown
+from retrieval.ingest import legacy_uuid_ids, sync_index
+from retrieval.registry import get_registry
+
+def load_pages():
+    # one crawled page at a time from the page store (crawl_docs.py / fix_markdown.py), so memory
+    # does not grow with the crawl; each page is split on headings / code blocks into token-sized chunks
+    store = PageStore()
+    try:
+        for _, doc in tqdm(store.pages(include_html=False), total=len(store), desc="Processing pages"):
             if 'markdown' in doc and doc['metadata']['statusCode'] != 404:
-                data.append({
-                    'id': str(uuid.uuid4()),
-                    'values': get_embedding(doc['markdown']),
-                    'metadata': {'text': doc['markdown'], 'type': 'docs', 'url': doc['metadata']['ogUrl'], 'title': doc['metadata']['ogTitle']}
-                })
-
-# If no documents were found, print a warning
-if not data:
-    print("Warning: No documents found in the crawled_docs directory.")
-
-import time
-from pinecone import ServerlessSpec, Pinecone
-import os
+                url = doc['metadata']['ogUrl']
+                # stable per URL, so re-runs update the page instead of adding a duplicate;
+                # the same URL stored under several crawl URLs is one page
+                page_id = str(uuid.uuid5(uuid.NAMESPACE_URL, url))
+                chunks = chunk_markdown(doc['markdown'])
+                for index, chunk in enumerate(chunks):
+                    yield {
+                        'id': f"{page_id}/{index}",
+                        'metadata': {
+                            'text': chunk.text, 'type': 'docs', 'url': url, 'title': doc['metadata']['ogTitle'],
+                            'chunk_index': index, 'chunk_count': len(chunks),
+                        }
+                    }
+    finally:
+        store.close()
+
+def get_embeddings(texts, model="text-embedding-ada-002", batcher=None):
+    # embed pages in packed, concurrent requests rather than one request per page
+    return embed_texts_batched([text.replace("\n", " ") for text in texts], model=model, batcher=batcher)
 
 def get_index(index_name):
-    api_key = os.environ.get('PINECONE_API_KEY')
-
-    pc = Pinecone(api_key=api_key)
-
-    cloud = 'aws'
-    region = 'us-east-1'
-
-    spec = ServerlessSpec(cloud=cloud, region=region)
-
-    # check if index already exists (it shouldn't if this is first time)
-    if index_name not in pc.list_indexes().names():
-        # if does not exist, create index
-        pc.create_index(
+    # streamed: only new or changed pages are embedded and upserted, in fixed-size batches, and
+    # near-duplicate chunks (versioned copies, nav stubs) not at all; pages gone from the crawl
+    # are deleted. The first run also drops the random-uuid ids
+    # earlier runs left behind.
+    with tqdm(desc="Embedding cache misses", unit="text") as progress:
+        batcher = EmbeddingBatcher("text-embedding-ada-002", on_batch=progress.update)
+        stats = sync_index(
             index_name,
-            dimension=1536,
-            metric='cosine',
-            spec=spec
+            "docs",
+            load_pages,
+            lambda texts: get_embeddings(texts, batcher=batcher),
+            legacy_ids=lambda: legacy_uuid_ids(get_registry().vector_index(index_name), "docs"),
         )
-        # wait for index to be initialized
-        while not pc.describe_index(index_name).status['ready']:
-            time.sleep(1)
+    print(f"Index: {stats.summary()}")
+    if batcher.stats.requests:
+        print(f"Embeddings: {batcher.stats.summary()}")
 
-    # connect to index
-    index = pc.Index(index_name)
+    # If no documents were found, print a warning
+    if not stats.chunks:
+        print("Warning: No documents found in the page store.")
 
-    index.upsert(vectors=data)
+    cache_stats = get_embedding_cache().stats
+    print(f"Embedding cache: {cache_stats.hits} hits, {cache_stats.misses} misses")
+    return get_registry().vector_index(index_name)
 
-def retrieve(index, query):
+def retrieve(index_name, query):
     limit = 3750
     res = get_embedding(query)
 
-    # get relevant contexts
-    res = index.query(vector=res, top_k=3, include_metadata=True)
+    # get relevant contexts; their text lives in the doc store, not in vector metadata
+    res = get_registry().vector_index(index_name, readonly=True).query(vector=res, top_k=3, include_metadata=True)
+    texts = get_registry().doc_store(index_name).get_many([x['id'] for x in res['matches']])
     contexts = [
-        x['metadata']['text'] for x in res['matches']
+        texts.get(x['id']) or x.get('metadata', {}).get('text') for x in res['matches']
     ]
+    contexts = [context for context in contexts if context]
+    prompt = None
     # build our prompt with the retrieved contexts included
     prompt_start = (
         "Answer the question based on the context below.\n\n"+
@@ -99,10 +109,12 @@ def retrieve(index, query):
                 "\n\n---\n\n".join(contexts) +
                 prompt_end
             )
+    if prompt is None:
+        prompt = prompt_start + "\n\n---\n\n".join(contexts) + prompt_end
     return prompt
 
-def query(index, prompt):
-    prompt = retrieve(index, prompt)
+def query(index_name, prompt):
+    prompt = retrieve(index_name, prompt)
     completion = client.chat.completions.create(
     model="gpt-4o",
     messages=[
@@ -113,7 +125,9 @@ def query(index, prompt):
     return completion.choices[0].message.content
 
 
-index = get_index("baml")
-# query = "who is alice?"
-# prompt = retrieve(index, query)
-# print(query(index, prompt))
\ No newline at end of file
+def main():
+    get_index("baml")
+    # print(query("baml", "who is alice?"))
+
+if __name__ == "__main__":
+    main()
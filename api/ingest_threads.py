@@ -1,4 +1,4 @@
-"""Script to compute embeddings of threads and ingesting them into a Pinecone index
+"""Script to compute embeddings of threads and ingesting them into the vector index (Pinecone or local)
 
 Sample commands:
 $ python3 ./api/ingest_threads.py --channel-id 1253172394345107466  # questions
@@ -7,47 +7,67 @@ $ python3 ./api/ingest_threads.py --channel-id 1119375594984050779  # general
 """
 
 import argparse
-import time
-from dotenv import load_dotenv
-from pinecone import ServerlessSpec, Pinecone
 import os
-from openai import OpenAI
-import json
+from dotenv import load_dotenv
 from tqdm import tqdm
 
+from retrieval.embedding_batcher import EmbeddingBatcher
+from retrieval.embedding_cache import get_embedding_cache
+from retrieval.embeddings import embed_texts_batched
+from retrieval.ingest import sync_index
+from retrieval.json_stream import iter_records, iter_threads
+from retrieval.registry import get_registry
+from retrieval.chunking import DEFAULT_OVERLAP_TOKENS, DEFAULT_TARGET_TOKENS, chunk_messages
+from retrieval.threads import chunk_id
+
 
 def get_index(index_name):
-    api_key = os.environ.get("PINECONE_API_KEY")
+    # Pinecone or the local index, depending on RETRIEVAL_BACKEND
+    return get_registry().vector_index(index_name)
 
-    pc = Pinecone(api_key=api_key)
 
-    cloud = "aws"
-    region = "us-east-1"
+def thread_dump_path(channel_id):
+    """The incremental export (discord_threads.py) if there is one, else the older single-array dump."""
+    path = f"discord_json/thread_messages_{channel_id}.jsonl"
+    return path if os.path.exists(path) else f"discord_json/thread_messages_{channel_id}.json"
 
-    spec = ServerlessSpec(cloud=cloud, region=region)
 
-    # check if index already exists (it shouldn't if this is first time)
-    if index_name not in pc.list_indexes().names():
-        # if does not exist, create index
-        pc.create_index(index_name, dimension=1536, metric="cosine", spec=spec)
-        # wait for index to be initialized
-        while not pc.describe_index(index_name).status["ready"]:
-            time.sleep(1)
+def get_embeddings(texts, model="text-embedding-ada-002", batcher=None):
+    # cache misses go out in packed, concurrent requests
+    return embed_texts_batched(texts, model=model, batcher=batcher)
 
-    # connect to index
-    index = pc.Index(index_name)
-    return index
 
+def thread_chunks(threads, channel_id, chunk_tokens, chunk_overlap, legacy_ids):
+    """Chunks of every thread, one at a time; collects each thread's pre-chunking id in `legacy_ids`."""
+    for thread in threads:
 
-def get_embedding(messages, client, model="text-embedding-ada-002"):
-    # Remove empty messages
-    messages = [m for m in messages if m["content"] != ""]
+        if not thread["thread_id"]:
+            continue
 
-    # TODO: Right now, we are embedding the whole thread, which contains timestamp and authors.
-    # See if it performs better w/o timestamps and/or authors
-    text = json.dumps(messages)
+        # Remove empty messages
+        messages = [m for m in thread["messages"] if m["content"] != ""]
+        if not messages:
+            continue
 
-    return client.embeddings.create(input=[text], model=model).data[0].embedding
+        # Whole messages up to `chunk_tokens` per chunk, each its own vector, id "channel/thread/chunk"
+        chunks = chunk_messages(messages, chunk_tokens, chunk_overlap)
+        for index, chunk in enumerate(chunks):
+            yield {
+                "id": chunk_id(channel_id, thread["thread_id"], index),
+                "metadata": {
+                    "type": "discord_thread",
+                    "text": chunk.text,
+                    "channel_id": str(channel_id),
+                    "thread_id": str(thread["thread_id"]),
+                    "thread_name": str(thread.get("thread_name", "")),
+                    "chunk_index": index,
+                    "chunk_count": len(chunks),
+                    "message_start": chunk.start,
+                    "message_end": chunk.end,
+                },
+            }
+        # before chunk ids, every chunk of a thread was upserted under the bare thread id
+        legacy_ids.append(str(thread["thread_id"]))
 
 
 def main():
@@ -61,45 +81,47 @@ def main():
     parser.add_argument(
         "--channel-id", type=int, help="Discord channel ID", default=1253172394345107466
     )
+    parser.add_argument(
+        "--chunk-tokens", type=int, help="Target tokens per embedded chunk", default=DEFAULT_TARGET_TOKENS
+    )
+    parser.add_argument(
+        "--chunk-overlap",
+        type=int,
+        help="Tokens of trailing messages repeated at the start of the next chunk",
+        default=DEFAULT_OVERLAP_TOKENS,
+    )
 
     args = parser.parse_args()
 
-    with open(f"discord_json/thread_messages_{args.channel_id}.json", "r") as file:
-        threads = json.load(file)
-
-    assert threads, "threads is empty!"
-
-    client = OpenAI()
-
-    data = []
-
-    # Chunk 100 messages into one embedding
-    message_count = 100
-    print(f"Computing embeddings for {len(threads)} threads")
-    for thread in tqdm(threads):
-
-        if not thread["thread_id"]:
-            continue
-
-        for start in range(0, len(thread["messages"]), message_count):
-            messages = thread["messages"][start : start + message_count]
-
-            data.append(
-                {
-                    "id": str(thread["thread_id"]),  # TODO: change to "channel_id/thread_id"
-                    "values": get_embedding(messages, client),
-                    "metadata": {
-                        "type": "discord_thread",
-                        "text": json.dumps(thread),
-                        "channel_id": str(args.channel_id),
-                        "thread_id": str(thread["thread_id"]),
-                        "thread_name": str(thread.get("thread_name", "")),
-                    },
-                }
-            )
-
-    index = get_index("baml2")
-    index.upsert(vectors=data)
+    # threads are read one at a time, so memory holds one thread rather than the whole channel.
+    # A .json dump is read once, while its chunks are embedded; a .jsonl export is first scanned
+    # for each thread's line offsets (see json_stream.py), so embedding starts after that scan
+    path = thread_dump_path(args.channel_id)
+    # an empty dump would delete the channel's chunks from the index; checked on the first record only
+    assert next(iter_records(path), None) is not None, "threads is empty!"
+
+    print(f"Ingesting threads from {path}")
+    legacy_ids = []
+    with tqdm(desc="Embedding cache misses", unit="text") as progress:
+        batcher = EmbeddingBatcher("text-embedding-ada-002", on_batch=progress.update)
+        # streamed: only new or changed chunks are embedded and upserted, in fixed-size
+        # batches, and near-duplicates of earlier chunks not at all; chunks of this
+        # channel that are gone from the export are deleted
+        ingest_stats = sync_index(
+            "baml2",
+            f"discord_thread:{args.channel_id}",
+            lambda: thread_chunks(
+                iter_threads(path), args.channel_id, args.chunk_tokens, args.chunk_overlap, legacy_ids
+            ),
+            lambda texts: get_embeddings(texts, batcher=batcher),
+            legacy_ids=lambda: legacy_ids,
+        )
+    print(f"Index: {ingest_stats.summary()}")
+    if batcher.stats.requests:
+        print(f"Embeddings: {batcher.stats.summary()}")
+
+    stats = get_embedding_cache().stats
+    print(f"Embedding cache: {stats.hits} hits, {stats.misses} misses")
     print("Success! Updated index")
 
 
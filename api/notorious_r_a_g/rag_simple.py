@@ -1,10 +1,7 @@
-from typing import Dict, List, Tuple, cast
-from llama_index.core.vector_stores import (
-    MetadataFilter,
-    MetadataFilters,
-    FilterOperator,
-)
-from llama_index.core.schema import NodeWithScore
+import asyncio
+import os
+from typing import Dict, List, Optional, Sequence, Tuple, cast
+from llama_index.core.schema import NodeWithScore, QueryBundle
 from openai import OpenAI
 from baml_client.types import Source
 
@@ -13,6 +10,10 @@ from dotenv import load_dotenv
 from openinference.instrumentation.llama_index import LlamaIndexInstrumentor
 from phoenix.otel import register
 
+from retrieval.context_packer import pack_contexts
+from retrieval.embeddings import aembed_texts, embed_texts
+from retrieval.registry import FilterKey, get_registry
+
 # tracer_provider = register(
 #   project_name="notorious-RAG", # Default is 'default'
 #   endpoint="http://localhost:6006/v1/traces",
@@ -24,38 +25,26 @@ from phoenix.otel import register
 load_dotenv()
 client = OpenAI()
 
+# upper bound on vector searches in flight across all async pipelines
+RETRIEVAL_CONCURRENCY = int(os.environ.get("RETRIEVAL_CONCURRENCY", "16"))
+_retrieval_semaphore: Optional[asyncio.Semaphore] = None
 
-def get_embedding(text, model="text-embedding-ada-002"):
-    text = text.replace("\n", " ")
-    return client.embeddings.create(input=[text], model=model).data[0].embedding
-
-
-import time
-from pinecone import ServerlessSpec, Pinecone
-import os
-
-
-def get_index(index_name):
-    api_key = os.environ.get("PINECONE_API_KEY")
 
-    pc = Pinecone(api_key=api_key)
+def retrieval_semaphore() -> asyncio.Semaphore:
+    global _retrieval_semaphore
+    if _retrieval_semaphore is None:
+        _retrieval_semaphore = asyncio.Semaphore(RETRIEVAL_CONCURRENCY)
+    return _retrieval_semaphore
 
-    cloud = "aws"
-    region = "us-east-1"
 
-    spec = ServerlessSpec(cloud=cloud, region=region)
+def get_embedding(text, model="text-embedding-ada-002"):
+    text = text.replace("\n", " ")
+    return embed_texts([text], model=model, query=True)[0]
 
-    # check if index already exists (it shouldn't if this is first time)
-    if index_name not in pc.list_indexes().names():
-        # if does not exist, create index
-        pc.create_index(index_name, dimension=1536, metric="cosine", spec=spec)
-        # wait for index to be initialized
-        while not pc.describe_index(index_name).status["ready"]:
-            time.sleep(1)
 
-    # connect to index
-    index = pc.Index(index_name)
-    return index
+def get_index(index_name):
+    # connect to the configured backend, reusing the process-wide clients
+    return get_registry().vector_index(index_name, readonly=True)
 
 
 def retrieve(index_name: str, query: str) -> str:
@@ -63,31 +52,13 @@ def retrieve(index_name: str, query: str) -> str:
 
     # get relevant contexts
     res = get_index(index_name).query(vector=res, top_k=3, include_metadata=True)
-    contexts = [x.get("metadata", {}).get("text") for x in res["matches"]]
+    # text lives in the doc store; older vectors still carry it in metadata
+    matches = res["matches"]
+    texts = get_registry().doc_store(index_name).get_many([x["id"] for x in matches])
+    contexts = [texts.get(x["id"]) or x.get("metadata", {}).get("text") for x in matches]
     print(f"Found {len(contexts)} contexts for query: {query}")
-    # build our prompt with the retrieved contexts included
-    
-    # append contexts until hitting limit
-    limit = 3750
-    prompt = "No relevant information found."
-    accumulated_length = 0
-    selected_contexts = []
-
-    for context in contexts:
-        context_length = len(context) + len("\n\n---\n\n")
-        if accumulated_length + context_length > limit:
-            # Truncate the context to fit within the limit
-            remaining_space = limit - accumulated_length
-            truncated_context = context[:remaining_space - len("\n\n---\n\n")]
-            selected_contexts.append(truncated_context)
-            break
-        selected_contexts.append(context)
-        accumulated_length += context_length
-
-    if selected_contexts:
-        prompt = "\n\n---\n\n".join(selected_contexts)
-
-    return prompt
+    # build our prompt with the retrieved contexts included, within the token budget
+    return pack_contexts([(context, {}) for context in contexts if context])
 
 def filter_to_str(filter_to: Source) -> str:
     if filter_to == Source.Documentation:
@@ -98,38 +69,70 @@ def filter_to_str(filter_to: Source) -> str:
         
     
 
-def retrieve_llamaindex(index_name: str, query: str, filter_to: List[Source]) -> List[Tuple[str, Dict[str, str]]]:
-    from llama_index.core import VectorStoreIndex
-    from llama_index.vector_stores.pinecone import PineconeVectorStore
-
-    vector_store = PineconeVectorStore(index_name=index_name)
-    from llama_index.embeddings.openai import OpenAIEmbedding
-    embed_model = OpenAIEmbedding(model="text-embedding-ada-002")
-    index = VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
+def filter_key(filter_to: List[Source]) -> FilterKey:
     if len(filter_to) == 0 or len(filter_to) == len(Source):
-        filters = MetadataFilters(
-            filters=[
-                MetadataFilter(
-                    key="type", operator=FilterOperator.NE, value="docs"
-                ),
-            ]
-        )
-    else:
-        filters = MetadataFilters(
-            filters=[
-                MetadataFilter(
-                    key="type", operator=FilterOperator.IN, value=[filter_to_str(x) for x in filter_to]
-                ),
-            ]
-        )
-
-    retriever = index.as_retriever(similarity_top_k=5, filters=filters)
-    top_results: List[NodeWithScore] = retriever.retrieve(query)
+        return ("ne", ("docs",))
+    return ("in", tuple(sorted({filter_to_str(x) for x in filter_to})))
+
+
+def warm_retrievers(index_name: str):
+    """Builds the retrievers for every filter combination ahead of the first query."""
+    keys = [filter_key([])] + [filter_key([source]) for source in Source]
+    get_registry().warm(index_name, keys)
+
+
+def retrieve_llamaindex(index_name: str, query: str, filter_to: List[Source]) -> List[Tuple[str, Dict[str, str]]]:
+    retriever = get_registry().retriever(index_name, filter_key(filter_to))
+    # embed through the shared cache so repeated questions skip the OpenAI call
+    query_bundle = QueryBundle(query_str=query, embedding=get_embedding(query))
+    top_results: List[NodeWithScore] = retriever.retrieve(query_bundle)
     for result in top_results:
         print(result.node.get_content())
     contexts = [(result.node.get_content(), cast(Dict[str, str], result.node.metadata)) for result in top_results]
     return contexts
 
+async def aretrieve_many(
+    index_name: str, queries: Sequence[Tuple[str, List[Source]]]
+) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    Runs several (query, filter_to) searches as one step: one batched
+    embeddings request, concurrent vector searches bounded by
+    `retrieval_semaphore()`, and a single merged list that interleaves the
+    per-query rankings and drops duplicate chunks. Runs in a TaskGroup, so
+    cancelling the calling pipeline cancels every search.
+    """
+    if not queries:
+        return []
+    embeddings = await aembed_texts([q.replace("\n", " ") for q, _ in queries], query=True)
+
+    async def search(i: int) -> List[NodeWithScore]:
+        text, filter_to = queries[i]
+        retriever = get_registry().retriever(index_name, filter_key(filter_to))
+        async with retrieval_semaphore():
+            return await retriever.aretrieve(QueryBundle(query_str=text, embedding=embeddings[i]))
+
+    async with asyncio.TaskGroup() as group:
+        tasks = [group.create_task(search(i)) for i in range(len(queries))]
+    return merge_rankings([task.result() for task in tasks])
+
+
+def merge_rankings(rankings: List[List[NodeWithScore]]) -> List[Tuple[str, Dict[str, str]]]:
+    """Interleaves per-query rankings by rank, dropping repeated chunks."""
+    contexts = []
+    seen = set()
+    for rank in range(max((len(r) for r in rankings), default=0)):
+        for ranking in rankings:
+            if rank >= len(ranking):
+                continue
+            node = ranking[rank].node
+            content = node.get_content()
+            if node.node_id in seen or content in seen:
+                continue
+            seen.update((node.node_id, content))
+            contexts.append((content, cast(Dict[str, str], node.metadata)))
+    return contexts
+
+
 def query(index_name: str, prompt: str) -> str:
     prompt = retrieve(index_name, prompt)
     completion = client.chat.completions.create(
@@ -21,6 +21,8 @@ class Action(BaseModel):
     type: str
     content: "str | RagResult"
     create_time_ms: Optional[int] = None
+    # position in the run, also the id of its document in the actions subcollection
+    seq: Optional[int] = None
 
 
 class AgentState(BaseModel):
@@ -28,7 +30,9 @@ class AgentState(BaseModel):
     update_time_ms: Optional[int] = None
     state: StateName
     initial_state: InitialState
-    actions: list[Action]
+    # only documents written before the actions subcollection hold their actions here
+    actions: list[Action] = []
+    action_count: int = 0
     final_state: Optional[FinalState]
 
     @staticmethod
@@ -51,11 +55,25 @@ class RagResult(BaseModel):
     result: List[RagItem]
 
 COLLECTION = "agentstate"
+# subcollection of an agentstate document holding one document per action
+ACTIONS_COLLECTION = "actions"
+# everything but the action history; small, and all `from_id` and `final_state` need
+HEADER_FIELDS = ["create_time_ms", "update_time_ms", "state", "initial_state", "action_count", "final_state"]
+
+
+def _now_ms() -> int:
+    return int(datetime.utcnow().timestamp() * 1000)
 
 
 class AgentStateManager:
     """
     Manages saving agent states to Firestore with each incremental update.
+
+    The agentstate document is a header (state, timestamps, initial and
+    final state, action count) updated in place; each action is its own
+    document in the `actions` subcollection, written once. Rewriting the
+    whole state, earlier RAG results included, on every action wrote O(N²)
+    bytes over a run and ran into Firestore's 1 MiB document limit.
     """
 
     def __init__(
@@ -70,22 +88,37 @@ class AgentStateManager:
         db = firestore.client()
         collection_ref = db.collection(COLLECTION)
         doc_ref = collection_ref.document()  # Auto-generates an ID
-        doc_ref.set(action.model_dump())
+        doc_ref.set(action.model_dump(exclude={"actions"}))
         return AgentStateManager(doc_ref, action)
 
     @staticmethod
-    def from_id(id: str):
+    def from_id(id: str, with_actions: bool = False):
+        """
+        Loads the header only, unless `with_actions`; `actions()` fetches the
+        history later.
+        """
         db = firestore.client()
         doc_ref = db.collection(COLLECTION).document(id)
-        doc = doc_ref.get()
+        doc = doc_ref.get() if with_actions else doc_ref.get(field_paths=HEADER_FIELDS)
         if doc.exists:
             data = doc.to_dict()
             assert data is not None
             action = AgentState(**data)
-            return AgentStateManager(doc_ref, action)
+            manager = AgentStateManager(doc_ref, action)
+            if with_actions:
+                manager.__data.actions = manager.actions()
+            return manager
         else:
             raise ValueError(f"Id {id} does not exist")
 
+    def actions(self) -> List[Action]:
+        """The whole action history, in order."""
+        legacy = self.__doc_ref.get(field_paths=["actions"]).to_dict() or {}
+        appended = self.__doc_ref.collection(ACTIONS_COLLECTION).order_by("seq").stream()
+        return [Action(**data) for data in legacy.get("actions", [])] + [
+            Action(**doc.to_dict()) for doc in appended
+        ]
+
     def final_state(self) -> FinalState | None:
         if self.__data.state == "cancelled":
             return "sorry, I couldn't get an answer. Tagging for help <@99252724855496704>!"
@@ -94,28 +127,32 @@ class AgentStateManager:
     def id(self) -> str:
         return self.__doc_ref.id
 
-    def add_action(self, *, type: str, content: str | RagResult):
-        if type == "HumanApproval":
-            self.__data.state = "paused"
+    def __update_header(self, batch=None, **fields):
+        for name, value in fields.items():
+            setattr(self.__data, name, value)
+        changes = {name: getattr(self.__data, name) for name in fields}
+        if batch is not None:
+            batch.update(self.__doc_ref, changes)
         else:
-            self.__data.state = "running"
-        self.__data.actions.append(
-            Action(
-                type=type,
-                content=content,
-                create_time_ms=int(datetime.utcnow().timestamp() * 1000),
-            )
+            self.__doc_ref.update(changes)
+
+    def add_action(self, *, type: str, content: str | RagResult):
+        now = _now_ms()
+        seq = self.__data.action_count
+        action = Action(type=type, content=content, create_time_ms=now, seq=seq)
+        # the new action and the header change land together or not at all
+        batch = firestore.client().batch()
+        batch.set(self.__doc_ref.collection(ACTIONS_COLLECTION).document(f"{seq:06d}"), action.model_dump())
+        self.__update_header(
+            batch,
+            state="paused" if type == "HumanApproval" else "running",
+            action_count=seq + 1,
+            update_time_ms=now,
         )
-        self.__doc_ref.set(self.__data.model_dump())
+        batch.commit()
 
     def cancel(self, message: str):
-        self.__data.state = "cancelled"
-        self.__data.update_time_ms = int(datetime.utcnow().timestamp() * 1000)
-        self.__data.final_state = message
-        self.__doc_ref.set(self.__data.model_dump())
+        self.__update_header(state="cancelled", update_time_ms=_now_ms(), final_state=message)
 
     def complete(self, final_state: FinalState):
-        self.__data.state = "completed"
-        self.__data.final_state = final_state
-        self.__data.update_time_ms = int(datetime.utcnow().timestamp() * 1000)
-        self.__doc_ref.set(self.__data.model_dump())
+        self.__update_header(state="completed", final_state=final_state, update_time_ms=_now_ms())
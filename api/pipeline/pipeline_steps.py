@@ -1,10 +1,11 @@
 import asyncio
 import logging
 import random
-from typing import Callable, List, Tuple
+from typing import Callable, List
 from pipeline.db import RagItem
 from pipeline.db import RagResult
-from notorious_r_a_g.rag_simple import retrieve_llamaindex
+from notorious_r_a_g.rag_simple import aretrieve_many
+from retrieval.context_packer import ContextPacker
 
 from pipeline.db import AgentStateManager
 from baml_client.async_client import b
@@ -15,6 +16,8 @@ from humanlayer import HumanLayer, ContactChannel, ResponseOption, SlackContactC
 
 logger = logging.getLogger(__name__)
 
+RAG_INDEX_NAME = "baml2"
+
 hl = HumanLayer(
     verbose=True,
     contact_channel=ContactChannel(
@@ -51,6 +54,8 @@ async def formulate_response(sio: AgentStateManager, question: str) -> str:
     sio.add_action(type="formulate_response", content="Formulating response")
 
     context: List[Context] = []
+    # token-budgeted, deduplicated across every RAG step of this run
+    packer = ContextPacker()
 
     max_steps = 5
 
@@ -74,36 +79,14 @@ async def formulate_response(sio: AgentStateManager, question: str) -> str:
                 # Reset max_steps to 5 after a human gives feedback
                 max_steps = 5
         else:
+            # every query of this step is embedded in one request and searched concurrently
             sio.add_action(
                 type="RAGQuery",
-                content=f'Filtered: {resp.filter_to}\n{resp.question}',
+                content="\n".join(f'Filtered: {q.filter_to}\n{q.question}' for q in resp),
             )
-            result = await run_async(retrieve_llamaindex, "baml2", resp.question, resp.filter_to)
-
-            def make_rag_prompt(contexts: List[Tuple[str, dict]]) -> str:
-                # append contexts until hitting limit
-                limit = 3750
-                prompt = "No relevant information found."
-                accumulated_length = 0
-                selected_contexts = []
-
-                for (context, meta) in contexts:
-                    context_length = len(context) + len("\n\n---\n\n")
-                    if accumulated_length + context_length > limit:
-                        # Truncate the context to fit within the limit
-                        remaining_space = limit - accumulated_length
-                        truncated_context = context[:remaining_space - len("\n\n---\n\n")]
-                        selected_contexts.append(truncated_context)
-                        break
-                    selected_contexts.append(context)
-                    accumulated_length += context_length
-
-                if selected_contexts:
-                    prompt = "\n\n---\n\n".join(selected_contexts)
-
-                return prompt
-
-            context.append(Context(intent="RAGQuery", context=make_rag_prompt(result)))
+            result = await aretrieve_many(RAG_INDEX_NAME, [(q.question, q.filter_to) for q in resp])
+
+            context.append(Context(intent="RAGQuery", context=packer.pack(result)))
             sio.add_action(type="RAGResult", content=RagResult(result=[RagItem(content=content, metadata=metadata) for content, metadata in result]))
 
     raise Exception("No answer found")
@@ -0,0 +1,126 @@
+"""`PineconeVectorStore` with a non-blocking `aquery`.
+
+llama_index's Pinecone store implements `aquery` by calling the blocking
+`query`, and pinecone-client 5.x has no asyncio client, so `aretrieve` on a
+Pinecone-backed retriever would block the event loop. This store sends
+queries (and metadata fetches) straight to the index's data-plane endpoints
+over a shared `httpx.AsyncClient`; everything else (upserts, deletes) still
+goes through the regular client. Both query paths leave vector values out of
+the response and accept metadata without text, which lives in the doc store.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryResult
+from llama_index.core.vector_stores.utils import (
+    legacy_metadata_dict_to_node,
+    metadata_dict_to_node,
+)
+from llama_index.vector_stores.pinecone import PineconeVectorStore
+from llama_index.vector_stores.pinecone.base import _to_pinecone_filter
+from pydantic import PrivateAttr
+
+PINECONE_API_VERSION = "2024-07"
+DEFAULT_TIMEOUT = 10.0
+
+
+class AsyncPineconeVectorStore(PineconeVectorStore):
+    _host: str = PrivateAttr()
+    _api_key: str = PrivateAttr()
+    _http: Optional[httpx.AsyncClient] = PrivateAttr(default=None)
+
+    def __init__(self, pinecone_index: Any, host: str, api_key: Optional[str] = None, **kwargs: Any):
+        super().__init__(pinecone_index=pinecone_index, **kwargs)
+        self._host = host if host.startswith("http") else f"https://{host}"
+        self._api_key = api_key or os.environ.get("PINECONE_API_KEY", "")
+        self._http = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self._host,
+                headers={
+                    "Api-Key": self._api_key,
+                    "X-Pinecone-API-Version": PINECONE_API_VERSION,
+                },
+                timeout=DEFAULT_TIMEOUT,
+            )
+        return self._http
+
+    def _node(self, match: Dict[str, Any]) -> TextNode:
+        # same conversion as PineconeVectorStore.query
+        metadata = match.get("metadata") or {}
+        try:
+            return metadata_dict_to_node(metadata)
+        except Exception:
+            extra, node_info, relationships = legacy_metadata_dict_to_node(
+                metadata, text_key=self.text_key
+            )
+            return TextNode(
+                text=metadata.get(self.text_key, ""),
+                id_=match["id"],
+                metadata=extra,
+                start_char_idx=node_info.get("start", None),
+                end_char_idx=node_info.get("end", None),
+                relationships=relationships,
+            )
+
+    def _result(self, matches: List[Dict[str, Any]]) -> VectorStoreQueryResult:
+        return VectorStoreQueryResult(
+            nodes=[self._node(match) for match in matches],
+            similarities=[match["score"] for match in matches],
+            ids=[match["id"] for match in matches],
+        )
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        # vectors are never needed back, and metadata may carry no text (doc_store.py)
+        if query.query_embedding is None:
+            raise ValueError("Pinecone queries require a query embedding")
+        response = self._pinecone_index.query(
+            vector=list(query.query_embedding),
+            top_k=query.similarity_top_k,
+            include_values=False,
+            include_metadata=True,
+            namespace=self.namespace,
+            filter=_to_pinecone_filter(query.filters) if query.filters is not None else None,
+        )
+        return self._result([match.to_dict() for match in response.matches])
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None:
+            raise ValueError("Async Pinecone queries require a query embedding")
+        body: Dict[str, Any] = {
+            "vector": list(query.query_embedding),
+            "topK": query.similarity_top_k,
+            "includeMetadata": True,
+            "includeValues": False,
+        }
+        if self.namespace:
+            body["namespace"] = self.namespace
+        if query.filters is not None:
+            body["filter"] = _to_pinecone_filter(query.filters)
+
+        response = await self._client().post("/query", json=body)
+        response.raise_for_status()
+        return self._result(response.json().get("matches", []))
+
+    def fetch_metadata(self, ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        response = self._pinecone_index.fetch(ids=list(ids), namespace=self.namespace or "")
+        return {id: dict(vector.metadata or {}) for id, vector in response.vectors.items()}
+
+    async def afetch_metadata(self, ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        params: List[Any] = [("ids", id) for id in ids]
+        if self.namespace:
+            params.append(("namespace", self.namespace))
+        response = await self._client().get("/vectors/fetch", params=params)
+        response.raise_for_status()
+        vectors = response.json().get("vectors", {})
+        return {id: vector.get("metadata") or {} for id, vector in vectors.items()}
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
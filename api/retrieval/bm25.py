@@ -0,0 +1,241 @@
+"""Local BM25 inverted index over the chunks sent to the vector store.
+
+ada-002 similarity is weak on exact identifiers (BAML function names, error
+strings, CLI flags, `baml-py` versions), so ingestion writes the same
+chunks here and `HybridRetriever` (hybrid.py) fuses both rankings.
+
+The tokenizer keeps identifiers whole and also emits their parts:
+`b.FormulateAnswer` yields `b.formulateanswer`, `formulate` and `answer`, so
+an exact identifier match outranks documents that only share the words.
+
+The index is a SQLite file of per-chunk term counts (`postings`) and
+metadata without the text, which lives in the doc store (doc_store.py).
+Each upsert or delete writes only the rows of its own chunks. Queries run
+over an in-memory snapshot (per-term rows and precomputed BM25 weights,
+plus the row count of each `type`), built from those tables without
+re-tokenizing anything and rebuilt only after the tables change, here or
+in another process (an ingest script). Scoring is one vectorized add per
+query term, so a query over the whole Discord corpus costs well under a
+millisecond.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from retrieval.local_index import UNTYPED, SearchHits, topk_rows
+
+TEXT_KEY = "text"
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# identifiers, dotted names, versions, paths and --flags
+_TOKEN = re.compile(r"-{0,2}[A-Za-z0-9_]+(?:[.\-/:@][A-Za-z0-9_]+)*")
+_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have how i if in is it its "
+    "me my no not of on or so that the their then there this to was we what when "
+    "where which who why will with you your".split()
+)
+
+# term -> (rows, bm25 weights); ids; type of each row; rows per type
+Postings = Tuple[Dict[str, Tuple[np.ndarray, np.ndarray]], List[str], np.ndarray, Dict[str, int]]
+_SQL_BATCH = 500
+
+
+@lru_cache(maxsize=65536)
+def _split(token: str) -> Tuple[Optional[str], Tuple[str, ...]]:
+    """(the whole token if it is a compound identifier, its non-stopword parts)"""
+    whole = token.lower()
+    parts = [p.lower() for p in _PART.findall(token)]
+    compound = whole if len(parts) > 1 or whole != (parts[0] if parts else whole) else None
+    return compound, tuple(p for p in parts if p not in _STOPWORDS)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN.findall(text):
+        compound, parts = _split(token)
+        if compound is not None:
+            tokens.append(compound)
+        tokens.extend(parts)
+    return tokens
+
+
+def identifiers(text: str) -> List[str]:
+    """The compound tokens of `text` (dotted names, versions, flags, camelCase), lowercased."""
+    return [c for c in (_split(token)[0] for token in _TOKEN.findall(text)) if c is not None]
+
+
+class BM25Index:
+    """
+    BM25 over `metadata["text"]` of Pinecone-style `{"id", "metadata"}`
+    items; the text itself is not kept. Writes persist immediately;
+    read-only instances rebuild their snapshot when another process (an
+    ingest script) commits. Pass `path=None` for a memory-only index.
+    """
+
+    def __init__(
+        self,
+        path: Optional[os.PathLike | str] = None,
+        readonly: bool = False,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+    ):
+        self.path = Path(path) if path is not None else None
+        self.readonly = readonly
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path) if self.path is not None else ":memory:", check_same_thread=False)
+        if self.path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "doc INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, type TEXT NOT NULL, "
+            "length INTEGER NOT NULL, metadata TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS docs_type ON docs (type);"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, doc INTEGER NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);"
+        )
+        self._db.commit()
+        self._data_version: Optional[int] = None
+        self._postings: Optional[Postings] = None
+
+    def _check_version(self):
+        """Drops the snapshot when another connection has committed."""
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._postings = None
+            self._data_version = version
+
+    def _check_writable(self):
+        if self.readonly:
+            raise RuntimeError("BM25 index was opened read-only")
+
+    def _remove(self, ids: Sequence[str]):
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = ids[start : start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            self._db.execute(
+                f"DELETE FROM postings WHERE doc IN (SELECT doc FROM docs WHERE id IN ({placeholders}))", batch
+            )
+            self._db.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", batch)
+
+    def upsert(self, vectors: Sequence[Dict[str, Any]]):
+        """Accepts the same items as the vector index; `values` are ignored."""
+        self._check_writable()
+        # last write wins within a batch
+        items = list({item["id"]: item for item in vectors}.values())
+        with self._lock:
+            self._remove([item["id"] for item in items])
+            for item in items:
+                metadata = {k: v for k, v in (item.get("metadata") or {}).items() if k != TEXT_KEY}
+                terms = Counter(tokenize((item.get("metadata") or {}).get(TEXT_KEY, "")))
+                cursor = self._db.execute(
+                    "INSERT INTO docs (id, type, length, metadata) VALUES (?, ?, ?, ?)",
+                    (
+                        item["id"],
+                        metadata.get("type", UNTYPED),
+                        sum(terms.values()),
+                        json.dumps(metadata, ensure_ascii=False, separators=(",", ":")),
+                    ),
+                )
+                self._db.executemany(
+                    "INSERT INTO postings (term, doc, tf) VALUES (?, ?, ?)",
+                    [(term, cursor.lastrowid, tf) for term, tf in terms.items()],
+                )
+            self._db.commit()
+            self._postings = None
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids: Iterable[str]):
+        self._check_writable()
+        with self._lock:
+            self._remove(list(dict.fromkeys(ids)))
+            self._db.commit()
+            self._postings = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def metadata(self, id: str) -> Optional[Dict[str, Any]]:
+        """The chunk's metadata, without its text (see the doc store)."""
+        with self._lock:
+            row = self._db.execute("SELECT metadata FROM docs WHERE id = ?", (id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def ids(self, type: Optional[str] = None) -> List[str]:
+        """Every indexed id, or those whose metadata `type` is `type`."""
+        with self._lock:
+            if type is None:
+                rows = self._db.execute("SELECT id FROM docs ORDER BY doc").fetchall()
+            else:
+                rows = self._db.execute("SELECT id FROM docs WHERE type = ? ORDER BY doc", (type,)).fetchall()
+        return [id for (id,) in rows]
+
+    def partitions(self) -> Dict[str, int]:
+        return dict(self._snapshot()[3])
+
+    def _build(self) -> Postings:
+        docs = self._db.execute("SELECT doc, id, type, length FROM docs ORDER BY doc").fetchall()
+        ids = [id for _, id, _, _ in docs]
+        doc_numbers = np.array([doc for doc, _, _, _ in docs], dtype=np.int64)
+        types = np.array([type for _, _, type, _ in docs], dtype=object)
+        lengths = np.array([length for _, _, _, length in docs], dtype=np.float32)
+        average = float(lengths.mean()) if len(ids) else 0.0
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(average, 1e-9))
+
+        # the primary key keeps postings sorted by term, so each term is one run
+        rows = self._db.execute("SELECT term, doc, tf FROM postings ORDER BY term").fetchall()
+        terms = np.array([term for term, _, _ in rows], dtype=object)
+        all_rows = np.searchsorted(doc_numbers, np.array([doc for _, doc, _ in rows], dtype=np.int64))
+        tfs = np.array([tf for _, _, tf in rows], dtype=np.float32)
+        starts = np.flatnonzero(np.concatenate([[True], terms[1:] != terms[:-1]])) if len(rows) else np.zeros(0, int)
+        ends = np.append(starts[1:], len(rows))
+        document_frequency = (ends - starts).astype(np.float32)
+        idf = np.log(1 + (len(ids) - document_frequency + 0.5) / (document_frequency + 0.5))
+        weights = (np.repeat(idf, ends - starts) * tfs * (self.k1 + 1) / (tfs + norm[all_rows])).astype(np.float32)
+        postings = {
+            term: (all_rows[start:end], weights[start:end])
+            for term, start, end in zip(terms[starts].tolist(), starts.tolist(), ends.tolist())
+        }
+        partitions = dict(Counter(types.tolist()))
+        return postings, ids, types, partitions
+
+    def _snapshot(self) -> Postings:
+        with self._lock:
+            self._check_version()
+            if self._postings is None:
+                self._postings = self._build()
+            return self._postings
+
+    def search(self, query: str, top_k: int, types: Optional[Sequence[str]] = None) -> SearchHits:
+        postings, ids, row_types, _ = self._snapshot()
+        terms = set(tokenize(query))
+        scores = np.zeros(len(ids), dtype=np.float32)
+        for term in terms:
+            posting = postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        if types is not None:
+            scores[~np.isin(row_types, list(types))] = 0.0
+        matched = np.flatnonzero(scores)
+        rows, top = topk_rows(scores[matched, None], top_k)
+        return [(ids[matched[row]], float(score)) for row, score in zip(rows[:, 0], top[:, 0])]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,197 @@
+"""Token-sized, overlapping chunks for docs pages and Discord threads.
+
+Pages used to be embedded whole (long ones ran past the embedding input
+limit, short sections drowned in long pages) and threads as JSON of a fixed
+message count, timestamps and all. Both now split on natural boundaries
+into chunks of about `target_tokens`, repeating up to `overlap_tokens` of
+the previous chunk at the start of the next:
+
+- markdown splits between blocks (paragraphs, lists, whole fenced code
+  blocks), preferring to break before a heading; a chunk that does not
+  start at its section's heading is prefixed with the heading path, so it
+  still says what it is about. Only a block larger than a whole chunk is
+  cut, at line boundaries.
+- threads split between messages, never inside one; a message renders as
+  `author: content` with no timestamps or JSON quoting.
+
+Chunking is a pure function of its input and settings, so unchanged
+sources produce identical chunks and the ingestion manifest sees no change.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+
+from retrieval.context_packer import TokenCounter, token_counter
+
+EMBED_MODEL = "text-embedding-ada-002"
+DEFAULT_TARGET_TOKENS = int(os.environ.get("CHUNK_TOKENS", "512"))
+DEFAULT_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "64"))
+# messages of a thread chunk are separated by a blank line, and never contain one
+MESSAGE_SEPARATOR = "\n\n"
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+@dataclass(frozen=True)
+class TextChunk:
+    text: str
+    tokens: int
+    # [start, end) of the blocks (markdown) or messages (threads) it covers
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class _Block:
+    text: str
+    tokens: int
+    # heading path the block sits under, including its own heading
+    headings: Tuple[str, ...]
+    is_heading: bool = False
+
+
+def _markdown_blocks(markdown: str, counter: TokenCounter, target_tokens: int) -> List[_Block]:
+    blocks: List[_Block] = []
+    headings: List[Tuple[int, str]] = []
+    lines: List[str] = []
+    fence = None
+
+    def flush():
+        text = "\n".join(lines).strip("\n")
+        lines.clear()
+        if text.strip():
+            path = tuple(title for _, title in headings)
+            blocks.extend(_split_block(text, path, counter, target_tokens))
+
+    for line in markdown.splitlines():
+        if fence is not None:
+            lines.append(line)
+            if line.strip().startswith(fence):
+                fence = None
+                flush()
+            continue
+        fence_match = _FENCE.match(line)
+        if fence_match:
+            flush()
+            fence = fence_match.group(1)
+            lines.append(line)
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            flush()
+            level = len(heading.group(1))
+            headings[:] = [h for h in headings if h[0] < level] + [(level, heading.group(2))]
+            path = tuple(title for _, title in headings)
+            blocks.append(_Block(line.strip(), counter.count(line), path, is_heading=True))
+        elif not line.strip():
+            flush()
+        else:
+            lines.append(line)
+    flush()
+    return blocks
+
+
+def _split_block(text: str, headings: Tuple[str, ...], counter: TokenCounter, target_tokens: int) -> List[_Block]:
+    """`text` as one block, or cut at line boundaries when it is larger than a chunk."""
+    tokens = counter.count(text)
+    if tokens <= target_tokens:
+        return [_Block(text, tokens, headings)]
+    pieces: List[_Block] = []
+    current: List[str] = []
+    current_tokens = 0
+    for line in text.split("\n"):
+        line_tokens = counter.count(line) + 1
+        if current and current_tokens + line_tokens > target_tokens:
+            pieces.append(_Block("\n".join(current), current_tokens, headings))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append(_Block("\n".join(current), current_tokens, headings))
+    return pieces
+
+
+def _pack(
+    sizes: Sequence[int],
+    target_tokens: int,
+    overlap_tokens: int,
+    breaks: Sequence[bool] = (),
+) -> List[Tuple[int, int]]:
+    """
+    [start, end) ranges of consecutive items, each about `target_tokens`,
+    starting with trailing items of the previous range worth up to
+    `overlap_tokens`. Where `breaks[i]` is set, a range at least half full
+    ends before item i.
+    """
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    while start < len(sizes):
+        end, total = start, 0
+        while end < len(sizes):
+            if end > start and total + sizes[end] > target_tokens:
+                break
+            if end > start and breaks and breaks[end] and total >= target_tokens // 2:
+                break
+            total += sizes[end]
+            end += 1
+        ranges.append((start, end))
+        if end == len(sizes):
+            break
+        # step back over whole items for the overlap, always moving forward
+        next_start, carried = end, 0
+        while next_start - 1 > start and carried + sizes[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            carried += sizes[next_start]
+        start = next_start
+    return ranges
+
+
+def chunk_markdown(
+    markdown: str,
+    target_tokens: int = DEFAULT_TARGET_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    model: str = EMBED_MODEL,
+) -> List[TextChunk]:
+    counter = token_counter(model)
+    blocks = _markdown_blocks(markdown, counter, target_tokens)
+    ranges = _pack(
+        [block.tokens for block in blocks],
+        target_tokens,
+        overlap_tokens,
+        [block.is_heading for block in blocks],
+    )
+    chunks = []
+    for start, end in ranges:
+        first = blocks[start]
+        body = "\n\n".join(block.text for block in blocks[start:end])
+        # the section's heading path, when the chunk does not open with that heading
+        path = first.headings[:-1] if first.is_heading else first.headings
+        text = " > ".join(path) + "\n\n" + body if path else body
+        chunks.append(TextChunk(text, counter.count(text), start, end))
+    return chunks
+
+
+def render_message(message: Dict[str, Any]) -> str:
+    """`author: content`, with blank lines folded so `MESSAGE_SEPARATOR` stays unambiguous."""
+    content = _BLANK_LINES.sub("\n", message["content"].strip())
+    return f"{message.get('author', 'unknown')}: {content}"
+
+
+def chunk_messages(
+    messages: Sequence[Dict[str, Any]],
+    target_tokens: int = DEFAULT_TARGET_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    model: str = EMBED_MODEL,
+) -> List[TextChunk]:
+    counter = token_counter(model)
+    rendered = [render_message(message) for message in messages]
+    sizes = [counter.count(text) for text in rendered]
+    chunks = []
+    for start, end in _pack(sizes, target_tokens, overlap_tokens):
+        text = MESSAGE_SEPARATOR.join(rendered[start:end])
+        chunks.append(TextChunk(text, sum(sizes[start:end]), start, end))
+    return chunks
@@ -0,0 +1,172 @@
+"""Packs retrieved chunks into a prompt context under a token budget.
+
+Replaces the character-count loops that truncated chunks mid-way and
+re-added evidence the agent had already seen. A `ContextPacker` lives for
+one agent run:
+
+- sizes are real tokens for the target model (tiktoken; offline hosts
+  need the encoding pre-cached under TIKTOKEN_CACHE_DIR);
+- chunks already packed earlier in the run, or near-identical to one
+  (cosine over BM25 terms), are dropped;
+- selection is maximal marginal relevance: relevance comes from the
+  retrieval rank, redundancy from similarity to chunks already chosen;
+- a chunk that does not fit is skipped in favour of later ones that do, so
+  the budget fills with whole chunks. Only a top chunk larger than the
+  whole budget is cut, at a line boundary.
+"""
+
+import hashlib
+import math
+import os
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import tiktoken
+
+from retrieval.bm25 import tokenize
+
+DEFAULT_MODEL = "gpt-4o"
+# ~ the old 3750-character limit, but counted in tokens
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1000"))
+DEFAULT_DIVERSITY = 0.3
+DUPLICATE_SIMILARITY = 0.9
+SEPARATOR = "\n\n---\n\n"
+NO_CONTEXT = "No relevant information found."
+NO_NEW_CONTEXT = "No new information beyond the context above."
+
+Chunk = Tuple[str, Dict[str, Any]]
+TermVector = Dict[str, float]
+
+class TokenCounter:
+    """Counts and truncates text in the target model's tokens."""
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        self.model = model
+        try:
+            name = tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            name = "o200k_base"
+        try:
+            self._encoding = tiktoken.get_encoding(name)
+        except Exception as e:
+            # the encoding is downloaded on first use; a wrong count would silently overflow the budget
+            raise RuntimeError(
+                f"Could not load the tiktoken encoding {name!r} for {model!r}; "
+                "pre-cache it under TIKTOKEN_CACHE_DIR on hosts without network access"
+            ) from e
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix within `max_tokens`, cut back to a line break when one is close."""
+        if max_tokens <= 0:
+            return ""
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        prefix = self._encoding.decode(tokens[:max_tokens])
+        line_end = prefix.rfind("\n")
+        return prefix[:line_end] if line_end > len(prefix) // 2 else prefix
+
+
+@lru_cache(maxsize=8)
+def token_counter(model: str = DEFAULT_MODEL) -> TokenCounter:
+    return TokenCounter(model)
+
+
+def term_vector(text: str) -> TermVector:
+    counts = Counter(tokenize(text))
+    norm = math.sqrt(sum(c * c for c in counts.values())) or 1.0
+    return {term: c / norm for term, c in counts.items()}
+
+
+def cosine(a: TermVector, b: TermVector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+
+def _content_key(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+class ContextPacker:
+    """
+    Stateful across one agent run: `pack` returns the text for the next
+    `Context` entry and remembers what it packed.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        budget: int = DEFAULT_TOKEN_BUDGET,
+        diversity: float = DEFAULT_DIVERSITY,
+        duplicate_similarity: float = DUPLICATE_SIMILARITY,
+    ):
+        self.counter = token_counter(model)
+        self.budget = budget
+        self.diversity = diversity
+        self.duplicate_similarity = duplicate_similarity
+        self._seen: set = set()
+        self._packed: List[TermVector] = []
+
+    def select(self, chunks: Sequence[Chunk], budget: Optional[int] = None) -> List[str]:
+        """Chooses the chunk texts to include, in the order they should appear."""
+        budget = self.budget if budget is None else budget
+        separator = self.counter.count(SEPARATOR)
+
+        candidates = []
+        for rank, (text, _) in enumerate(chunks):
+            key = _content_key(text)
+            if not text.strip() or key in self._seen:
+                continue
+            vector = term_vector(text)
+            if any(cosine(vector, seen) >= self.duplicate_similarity for seen in self._packed):
+                continue
+            # retrieval order is the relevance signal: 1, 1/2, 1/3, ...
+            candidates.append((1.0 / (rank + 1), text, key, vector, self.counter.count(text)))
+
+        chosen: List[Tuple[str, str, TermVector]] = []
+        remaining = budget
+        while candidates:
+            best, best_score = None, -math.inf
+            for i, (relevance, text, key, vector, tokens) in enumerate(candidates):
+                cost = tokens + (separator if chosen else 0)
+                if cost > remaining:
+                    continue
+                redundancy = max((cosine(vector, v) for _, _, v in chosen), default=0.0)
+                if redundancy >= self.duplicate_similarity:
+                    continue
+                score = (1 - self.diversity) * relevance - self.diversity * redundancy
+                if score > best_score:
+                    best, best_score = i, score
+            if best is None:
+                break
+            relevance, text, key, vector, tokens = candidates.pop(best)
+            remaining -= tokens + (separator if chosen else 0)
+            chosen.append((text, key, vector))
+
+        if not chosen and candidates:
+            # the best chunk alone is over budget: keep its beginning rather than nothing
+            _, text, key, vector, _ = candidates[0]
+            chosen.append((self.counter.truncate(text, budget), key, vector))
+
+        for _, key, vector in chosen:
+            self._seen.add(key)
+            self._packed.append(vector)
+        return [text for text, _, _ in chosen]
+
+    def pack(self, chunks: Sequence[Chunk], budget: Optional[int] = None) -> str:
+        texts = self.select(chunks, budget)
+        if texts:
+            return SEPARATOR.join(texts)
+        return NO_NEW_CONTEXT if chunks and self._seen else NO_CONTEXT
+
+
+def pack_contexts(
+    chunks: Sequence[Chunk], budget: int = DEFAULT_TOKEN_BUDGET, model: str = DEFAULT_MODEL
+) -> str:
+    """One-off packing, for callers without a run to deduplicate across."""
+    return ContextPacker(model=model, budget=budget).pack(chunks)
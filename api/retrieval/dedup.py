@@ -0,0 +1,121 @@
+"""Near-duplicate detection for ingestion, with MinHash LSH over word shingles.
+
+The docs crawl holds many near-identical pages (versioned copies, one page
+under several URLs, nav-heavy stubs) and Discord threads repeat the same
+questions. Every copy was embedded and stored, and the copies crowded each
+other out of the top-k. `NearDuplicateIndex` is fed chunks in ingestion
+order; a chunk whose estimated Jaccard similarity to an earlier one reaches
+`threshold` is reported as a duplicate of that earlier, canonical chunk.
+Ingestion then skips it and lists it among the canonical chunk's aliases.
+`match` and `insert` split that in two, so ingestion can decide for a
+whole document before indexing any of its chunks.
+
+Signatures are `num_perm` 32-bit min-hashes of crc32-hashed word
+shingles, so results do not depend on PYTHONHASHSEED and the same corpus
+always yields the same clusters. LSH splits them into `bands` bands; only
+chunks sharing a whole band are compared. Chunks of the same document
+(`group`: a thread, a page URL) are never compared: neighbouring chunks
+share their overlap, and dropping one would leave a hole in the document.
+"""
+
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.85"))
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE = 5
+# short chunks ("thanks, that worked!") are left alone
+DEFAULT_MIN_WORDS = 20
+
+_WORD = re.compile(r"\w+")
+_MASK = np.uint64(0xFFFFFFFF)
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+        bands: int = DEFAULT_BANDS,
+        shingle: int = DEFAULT_SHINGLE,
+        min_words: int = DEFAULT_MIN_WORDS,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.min_words = min_words
+        rng = np.random.default_rng(seed)
+        # multiply-add hashing mod 2^32, one (odd a, b) pair per permutation
+        self._a = rng.integers(1, 2**32, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**32, num_perm, dtype=np.uint64)
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._groups: Dict[str, Optional[str]] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [defaultdict(list) for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of `text`'s word shingles, or None when it is too short to compare."""
+        words = _WORD.findall(text.lower())
+        if len(words) < self.min_words:
+            return None
+        shingles = {
+            zlib.crc32(" ".join(words[i : i + self.shingle]).encode("utf-8"))
+            for i in range(len(words) - self.shingle + 1)
+        }
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self._a, hashes) + self._b[:, None]) & _MASK).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows : (i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def match(self, text: str, group: Optional[str] = None) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        (the id of the indexed chunk, from another `group`, that `text`
+        nearly duplicates, or None; `text`'s signature for `insert`).
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None, None
+        best: Tuple[float, Optional[str]] = (0.0, None)
+        checked = set()
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            for candidate in band.get(key, ()):
+                if candidate in checked or (group is not None and self._groups[candidate] == group):
+                    continue
+                checked.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity > best[0]:
+                    best = (similarity, candidate)
+        return (best[1] if best[0] >= self.threshold else None), signature
+
+    def insert(self, id: str, signature: Optional[np.ndarray], group: Optional[str] = None):
+        """Indexes `id` as a canonical chunk that later chunks can duplicate."""
+        if signature is None or id in self._signatures:
+            return
+        self._signatures[id] = signature
+        self._groups[id] = group
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            band[key].append(id)
+
+    def add(self, id: str, text: str, group: Optional[str] = None) -> Optional[str]:
+        """
+        The id of the earlier chunk, from another `group`, that `text` nearly
+        duplicates, if any; otherwise `id` is indexed as a canonical chunk
+        and None is returned.
+        """
+        canonical, signature = self.match(text, group)
+        if canonical is None:
+            self.insert(id, signature, group)
+        return canonical
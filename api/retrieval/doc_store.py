@@ -0,0 +1,128 @@
+"""Chunk text kept outside the vector index, keyed by chunk id.
+
+Vector metadata used to carry each chunk's full text (the Discord thread
+JSON, the page markdown), which Pinecone stored and shipped back with every
+match. Ingestion now writes the text here and upserts vectors whose
+metadata holds only ids and small filter fields; retrieval hydrates the
+nodes it keeps through a bounded LRU in front of a SQLite table of
+zlib-compressed text.
+
+Another process (an ingest script) may rewrite entries while the app is
+running; `PRAGMA data_version` changes when it commits, and the LRU is
+dropped when it does.
+"""
+
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+TEXT_KEY = "text"
+DEFAULT_MAX_ENTRIES = 2048
+_SQL_BATCH = 500
+
+
+class DocStore:
+    """
+    id -> text. Safe to share across threads; pass `path=None` for a
+    memory-only store.
+    """
+
+    def __init__(
+        self,
+        path: Optional[os.PathLike | str] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._data_version: Optional[int] = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path) if path is not None else ":memory:", check_same_thread=False)
+        if path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, text BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    def _remember(self, id: str, text: str):
+        self._memory[id] = text
+        self._memory.move_to_end(id)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _check_version(self):
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._memory.clear()
+            self._data_version = version
+
+    def put_many(self, items: Iterable[Tuple[str, str]]):
+        rows = [(id, zlib.compress(text.encode("utf-8"))) for id, text in items]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO documents (id, text) VALUES (?, ?)", rows)
+            self._db.commit()
+            for id, _ in rows:
+                self._memory.pop(id, None)
+
+    def get_many(self, ids: Sequence[str]) -> Dict[str, str]:
+        found: Dict[str, str] = {}
+        with self._lock:
+            self._check_version()
+            missing = []
+            for id in ids:
+                text = self._memory.get(id)
+                if text is not None:
+                    self._memory.move_to_end(id)
+                    found[id] = text
+                else:
+                    missing.append(id)
+            for start in range(0, len(missing), _SQL_BATCH):
+                batch = missing[start : start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT id, text FROM documents WHERE id IN ({placeholders})", batch
+                ).fetchall()
+                for id, blob in rows:
+                    text = zlib.decompress(blob).decode("utf-8")
+                    found[id] = text
+                    self._remember(id, text)
+        return found
+
+    def delete(self, ids: Sequence[str]):
+        ids = list(ids)
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start : start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                self._db.execute(f"DELETE FROM documents WHERE id IN ({placeholders})", batch)
+                for id in batch:
+                    self._memory.pop(id, None)
+            self._db.commit()
+
+    def store_items(self, items: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Writes the `metadata["text"]` of Pinecone-style items here and returns
+        copies without it, ready to upsert into the vector index.
+        """
+        self.put_many(
+            (item["id"], item["metadata"][TEXT_KEY])
+            for item in items
+            if TEXT_KEY in (item.get("metadata") or {})
+        )
+        return [
+            {
+                **item,
+                "metadata": {k: v for k, v in (item.get("metadata") or {}).items() if k != TEXT_KEY},
+            }
+            for item in items
+        ]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
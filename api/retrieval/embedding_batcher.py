@@ -0,0 +1,190 @@
+"""Batched, concurrent embedding for the ingest scripts.
+
+The ingest scripts used to send one embeddings request per text, serially.
+`EmbeddingBatcher` packs inputs into requests up to the model's token and
+item limits, keeps up to `concurrency` requests in flight, and retries
+429s, 5xx responses and connection errors with exponential backoff and full
+jitter (honouring `Retry-After` when the server sends one). Results come
+back in input order whatever order the requests complete in.
+
+The client is an `AsyncOpenAI`, so pointing `OPENAI_BASE_URL` (or the
+`client` argument) at a local server such as
+`benchmarks/fake_embeddings_server.py` exercises the whole path offline.
+"""
+
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import openai
+from openai import AsyncOpenAI
+
+from retrieval.context_packer import token_counter
+from retrieval.embedding_cache import Embedding
+
+# hard limits of the embeddings endpoint
+MAX_INPUT_TOKENS = 8191
+MAX_REQUEST_ITEMS = 2048
+MAX_REQUEST_TOKENS = 300_000
+
+# smaller than the limits so a large ingest spreads over concurrent requests
+DEFAULT_BATCH_ITEMS = int(os.environ.get("EMBED_BATCH_ITEMS", "256"))
+DEFAULT_BATCH_TOKENS = int(os.environ.get("EMBED_BATCH_TOKENS", "100000"))
+DEFAULT_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+
+Batch = List[Tuple[int, str]]
+
+
+@dataclass
+class BatchStats:
+    texts: int = 0
+    tokens: int = 0
+    requests: int = 0
+    retries: int = 0
+    truncated: int = 0
+    seconds: float = 0.0
+
+    @property
+    def texts_per_second(self) -> float:
+        return self.texts / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.texts} texts / {self.tokens} tokens in {self.requests} requests "
+            f"({self.retries} retries, {self.truncated} truncated) in {self.seconds:.1f}s: "
+            f"{self.texts_per_second:.1f} texts/s, {self.tokens_per_second:.0f} tokens/s"
+        )
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class EmbeddingBatcher:
+    """
+    Embeds any number of texts with `model`. One instance can be reused;
+    `stats` accumulates over every `embed` call.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        client: Optional[AsyncOpenAI] = None,
+        batch_items: int = DEFAULT_BATCH_ITEMS,
+        batch_tokens: int = DEFAULT_BATCH_TOKENS,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        on_batch: Optional[Callable[[int], None]] = None,
+    ):
+        self.model = model
+        self.batch_items = min(batch_items, MAX_REQUEST_ITEMS)
+        self.batch_tokens = min(batch_tokens, MAX_REQUEST_TOKENS)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_batch = on_batch
+        self.stats = BatchStats()
+        self._client = client
+        self._counter = token_counter(model)
+
+    def pack(self, texts: Sequence[str]) -> List[Batch]:
+        """
+        Splits `texts` into batches of (position, text), in order, each within
+        `batch_items` inputs and `batch_tokens` tokens. Inputs over the
+        per-input limit are truncated, which the endpoint would reject anyway.
+        """
+        batches: List[Batch] = []
+        batch: Batch = []
+        batch_tokens = 0
+        for position, text in enumerate(texts):
+            # the endpoint rejects empty strings
+            text = text.replace("\n", " ") or " "
+            tokens = self._counter.count(text)
+            if tokens > MAX_INPUT_TOKENS:
+                text = self._counter.truncate(text, MAX_INPUT_TOKENS)
+                tokens = MAX_INPUT_TOKENS
+                self.stats.truncated += 1
+            if batch and (len(batch) >= self.batch_items or batch_tokens + tokens > self.batch_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append((position, text))
+            batch_tokens += tokens
+            self.stats.tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _delay(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        retry_after = _retry_after(error)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    async def _request(self, client: AsyncOpenAI, batch: Batch) -> List[Embedding]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.stats.requests += 1
+                response = await client.embeddings.create(
+                    input=[text for _, text in batch], model=self.model
+                )
+                return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+            except Exception as error:
+                if attempt == self.max_retries or not _retryable(error):
+                    raise
+                self.stats.retries += 1
+                await asyncio.sleep(self._delay(attempt, error))
+        raise AssertionError("unreachable")
+
+    async def aembed(self, texts: Sequence[str]) -> List[Embedding]:
+        start = time.perf_counter()
+        results: List[Optional[Embedding]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # retries are ours, so the client must not retry underneath us. A
+        # client of our own is bound to this event loop and closed with it.
+        client = self._client or AsyncOpenAI(max_retries=0)
+
+        async def run(batch: Batch):
+            async with semaphore:
+                vectors = await self._request(client, batch)
+            for (position, _), vector in zip(batch, vectors):
+                results[position] = vector
+            if self.on_batch is not None:
+                self.on_batch(len(batch))
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for batch in self.pack(texts):
+                    group.create_task(run(batch))
+        finally:
+            if self._client is None:
+                await client.close()
+        self.stats.texts += len(texts)
+        self.stats.seconds += time.perf_counter() - start
+        return results  # type: ignore[return-value]
+
+    def embed(self, texts: Sequence[str]) -> List[Embedding]:
+        """`aembed` for synchronous callers (the ingest scripts); not for use inside an event loop."""
+        return asyncio.run(self.aembed(texts))
@@ -0,0 +1,218 @@
+"""Two-tier embedding cache shared by query-time and ingest-time code.
+
+Entries are keyed by (model, sha256 of the text), with query text
+normalized first. Lookups go to a bounded in-memory LRU of float32 arrays
+first and then to a SQLite file that survives restarts; misses are embedded
+in a single batched call and written to both tiers.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+Embedding = List[float]
+EmbedFn = Callable[[List[str], str], List[Embedding]]
+AsyncEmbedFn = Callable[[List[str], str], Awaitable[List[Embedding]]]
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / ".cache" / "embeddings.sqlite3"
+DEFAULT_MAX_ENTRIES = 4096
+# stay well below SQLite's bound-parameter limit
+_SQL_BATCH = 500
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = "?!.,;:"
+
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical form of a query for its cache key: unicode-normalized,
+    case-folded, whitespace collapsed and trailing punctuation stripped, so
+    "How do I use images?" and "how do I use  images" share an entry.
+    Document text is keyed as is: chunks differing only in case or
+    punctuation get their own embeddings.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.strip(_EDGE_PUNCTUATION).strip()
+
+
+def cache_key(text: str, query: bool = False) -> str:
+    if query:
+        # a separate namespace, so a query never hits a document's entry for its normalized text
+        return "q:" + hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class EmbeddingCache:
+    """
+    In-memory LRU in front of an on-disk SQLite table. Safe to share across
+    threads; pass `path=None` for a memory-only cache.
+    """
+
+    def __init__(
+        self,
+        path: Optional[os.PathLike | str] = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        # float32 arrays: a quarter of the memory of lists of Python floats
+        self._memory: "OrderedDict[Tuple[str, str], array]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, key))"
+            )
+            self._db.commit()
+
+    def _remember(self, key: Tuple[str, str], vector: array):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str], model: str, query: bool = False) -> List[Optional[Embedding]]:
+        keys = [cache_key(text, query) for text in texts]
+        found: Dict[str, array] = {}
+        with self._lock:
+            missing: Dict[str, None] = {}
+            for key in keys:
+                vector = self._memory.get((model, key))
+                if vector is not None:
+                    self._memory.move_to_end((model, key))
+                    found[key] = vector
+                    self.stats.memory_hits += 1
+                else:
+                    missing[key] = None
+
+            if missing and self._db is not None:
+                pending = list(missing)
+                for start in range(0, len(pending), _SQL_BATCH):
+                    batch = pending[start : start + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                        [model, *batch],
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f", blob)
+                        found[key] = vector
+                        self._remember((model, key), vector)
+                        self.stats.disk_hits += 1
+
+            self.stats.misses += sum(1 for key in keys if key not in found)
+        return [found[key].tolist() if key in found else None for key in keys]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Embedding], model: str, query: bool = False):
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(text, query)
+                packed = array("f", vector)
+                self._remember((model, key), packed)
+                rows.append((model, key, packed.tobytes()))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._db.commit()
+
+    def _pending(self, texts: Sequence[str], vectors: List[Optional[Embedding]], query: bool) -> Dict[str, str]:
+        pending: Dict[str, str] = {}
+        for text, vector in zip(texts, vectors):
+            if vector is None:
+                pending.setdefault(cache_key(text, query), text)
+        return pending
+
+    def _fill(
+        self,
+        texts: Sequence[str],
+        vectors: List[Optional[Embedding]],
+        pending: Dict[str, str],
+        fresh: List[Embedding],
+        query: bool,
+    ) -> List[Embedding]:
+        by_key = dict(zip(pending.keys(), fresh))
+        return [
+            vector if vector is not None else by_key[cache_key(text, query)]
+            for text, vector in zip(texts, vectors)
+        ]
+
+    def embed(self, texts: Sequence[str], model: str, embed_fn: EmbedFn, query: bool = False) -> List[Embedding]:
+        """
+        Returns embeddings for `texts`, calling `embed_fn(texts, model)` once
+        for the distinct texts that are not cached yet. `query=True` keys
+        the texts by their normalized form (see `normalize_query`).
+        """
+        vectors = self.get_many(texts, model, query)
+        pending = self._pending(texts, vectors, query)
+        if not pending:
+            return vectors  # type: ignore[return-value]
+        fresh = embed_fn(list(pending.values()), model)
+        self.put_many(list(pending.values()), fresh, model, query)
+        return self._fill(texts, vectors, pending, fresh, query)
+
+    async def aembed(
+        self, texts: Sequence[str], model: str, embed_fn: AsyncEmbedFn, query: bool = False
+    ) -> List[Embedding]:
+        """`embed` with an async `embed_fn`; SQLite reads and commits run off the event loop."""
+        vectors = await asyncio.to_thread(self.get_many, texts, model, query)
+        pending = self._pending(texts, vectors, query)
+        if not pending:
+            return vectors  # type: ignore[return-value]
+        fresh = await embed_fn(list(pending.values()), model)
+        await asyncio.to_thread(self.put_many, list(pending.values()), fresh, model, query)
+        return self._fill(texts, vectors, pending, fresh, query)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    path=os.environ.get("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    max_entries=int(os.environ.get("EMBEDDING_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                )
+    return _cache
@@ -0,0 +1,77 @@
+"""OpenAI embeddings routed through the shared embedding cache."""
+
+import threading
+from typing import List, Optional, Sequence
+
+from openai import AsyncOpenAI, OpenAI
+
+from retrieval.embedding_batcher import EmbeddingBatcher
+from retrieval.embedding_cache import Embedding, get_embedding_cache
+
+DEFAULT_EMBED_MODEL = "text-embedding-ada-002"
+
+_client: Optional[OpenAI] = None
+_async_client: Optional[AsyncOpenAI] = None
+_client_lock = threading.Lock()
+
+
+def openai_client() -> OpenAI:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI()
+    return _client
+
+
+def async_openai_client() -> AsyncOpenAI:
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncOpenAI()
+    return _async_client
+
+
+def _embed_uncached(texts: List[str], model: str) -> List[Embedding]:
+    response = openai_client().embeddings.create(input=texts, model=model)
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+async def _aembed_uncached(texts: List[str], model: str) -> List[Embedding]:
+    response = await async_openai_client().embeddings.create(input=texts, model=model)
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+def embed_texts(texts: Sequence[str], model: str = DEFAULT_EMBED_MODEL, query: bool = False) -> List[Embedding]:
+    """
+    Embeds `texts` in one request, skipping anything already cached. Pass
+    `query=True` for search queries, which share cache entries across case,
+    spacing and trailing punctuation.
+    """
+    return get_embedding_cache().embed(texts, model, _embed_uncached, query)
+
+
+async def aembed_texts(
+    texts: Sequence[str], model: str = DEFAULT_EMBED_MODEL, query: bool = False
+) -> List[Embedding]:
+    """`embed_texts` on the event loop, without blocking a thread on the request."""
+    return await get_embedding_cache().aembed(texts, model, _aembed_uncached, query)
+
+
+def embed_texts_batched(
+    texts: Sequence[str],
+    model: str = DEFAULT_EMBED_MODEL,
+    batcher: Optional[EmbeddingBatcher] = None,
+) -> List[Embedding]:
+    """
+    `embed_texts` for bulk ingestion: cache misses go through an
+    `EmbeddingBatcher` (packed, concurrent, retried requests) instead of a
+    single request.
+    """
+    batcher = batcher or EmbeddingBatcher(model)
+    return get_embedding_cache().embed(texts, model, lambda pending, _: batcher.embed(pending))
+
+
+def get_embedding(text: str, model: str = DEFAULT_EMBED_MODEL, query: bool = False) -> Embedding:
+    return embed_texts([text], model, query)[0]
@@ -0,0 +1,210 @@
+"""Hierarchical Navigable Small World graph for approximate cosine search.
+
+A thin wrapper around faiss's `IndexHNSWFlat` (inner product over
+L2-normalized rows), sized for the local retrieval backend: inserts are
+buffered and added to the graph in one batch before the next search or
+save, deletes are tombstones for re-ingested threads, and `type` filtering
+is applied while faiss walks the bottom layer (an `IDSelectorBitmap` of the
+admissible nodes). Tune with `M`, `ef_construction` and `ef_search`; see
+benchmarks/bench_hnsw.py for recall/latency numbers.
+
+Memory: `IndexHNSWFlat` keeps its own float32 copy of every vector next to
+the links, 4 * dimension bytes per row (6 KiB at 1536-d) plus about 144
+bytes of links at M=16, measured at 6288 bytes per row in total. The
+graph is deserialized into each process's private memory, so unlike the
+segment's memmapped rows it is not shared through the page cache: with
+LOCAL_INDEX_ANN=hnsw every worker holds roughly one more full copy of the
+indexed vectors.
+
+faiss is an optional dependency (the `hnsw` extra: `pip install
+"api[hnsw]"`, or `uv sync --extra hnsw`), imported only when a graph is
+built or loaded, i.e. with LOCAL_INDEX_ANN=hnsw.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Collection, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+def _faiss():
+    try:
+        import faiss
+    except ImportError as e:
+        raise ImportError("LOCAL_INDEX_ANN=hnsw needs faiss: install the hnsw extra (faiss-cpu)") from e
+    return faiss
+
+
+@dataclass
+class HNSWConfig:
+    M: int = 16
+    ef_construction: int = 200
+    ef_search: int = 64
+    # partitions with at most this many live rows are searched exactly
+    exact_threshold: int = 10000
+    # rebuild the graph once this fraction of nodes are tombstones
+    max_deleted_fraction: float = 0.25
+
+    @staticmethod
+    def from_env() -> "HNSWConfig":
+        defaults = HNSWConfig()
+        return HNSWConfig(
+            M=int(os.environ.get("HNSW_M", defaults.M)),
+            ef_construction=int(os.environ.get("HNSW_EF_CONSTRUCTION", defaults.ef_construction)),
+            ef_search=int(os.environ.get("HNSW_EF_SEARCH", defaults.ef_search)),
+            exact_threshold=int(os.environ.get("HNSW_EXACT_THRESHOLD", defaults.exact_threshold)),
+        )
+
+
+class HNSWIndex:
+    """
+    Nodes are addressed by their faiss sequence number; `ids[node]` maps
+    back to the vector id. Re-adding an existing id tombstones the old node.
+    Vectors are expected to be L2-normalized; scores are dot products.
+    """
+
+    def __init__(self, dimension: int, config: Optional[HNSWConfig] = None):
+        faiss = _faiss()
+        self.dimension = dimension
+        self.config = config or HNSWConfig()
+        self._lock = threading.RLock()
+        self._index = faiss.IndexHNSWFlat(dimension, self.config.M, faiss.METRIC_INNER_PRODUCT)
+        self._index.hnsw.efConstruction = self.config.ef_construction
+        self.ids: List[str] = []
+        self._types: List[str] = []
+        self._deleted = np.zeros(0, dtype=bool)
+        self._node_of: Dict[str, int] = {}
+        self._deleted_count = 0
+        # rows added since the last flush, indexed in one faiss call
+        self._pending: List[np.ndarray] = []
+        # packed admissible-node bitmaps per `types`, until the next write
+        self._bitmaps: Dict[Optional[FrozenSet[str]], Optional[np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self._node_of)
+
+    def live_ids(self) -> Set[str]:
+        return set(self._node_of)
+
+    @property
+    def deleted_fraction(self) -> float:
+        return self._deleted_count / len(self.ids) if self.ids else 0.0
+
+    def add(self, id: str, vector: np.ndarray, type: str = ""):
+        with self._lock:
+            if id in self._node_of:
+                self.delete(id)
+            self._node_of[id] = len(self.ids)
+            self.ids.append(id)
+            self._types.append(type)
+            self._pending.append(np.asarray(vector, dtype=np.float32))
+            self._bitmaps.clear()
+
+    def flush(self):
+        """Adds the buffered rows to the graph; searches, deletes and saves call it first."""
+        with self._lock:
+            if not self._pending:
+                return
+            self._index.add(np.ascontiguousarray(np.stack(self._pending)))
+            self._deleted = np.concatenate([self._deleted, np.zeros(len(self._pending), dtype=bool)])
+            self._pending = []
+
+    def delete(self, id: str) -> bool:
+        """Tombstones `id`; the node keeps routing searches until `rebuild()`."""
+        with self._lock:
+            node = self._node_of.pop(id, None)
+            if node is None:
+                return False
+            self.flush()
+            self._deleted[node] = True
+            self._deleted_count += 1
+            self._bitmaps.clear()
+            return True
+
+    def _bitmap(self, types: Optional[Collection[str]]) -> Optional[np.ndarray]:
+        """Packed bits of the admissible nodes, or None when every node is."""
+        key = frozenset(types) if types is not None else None
+        with self._lock:
+            if key not in self._bitmaps:
+                admissible = ~self._deleted
+                if key is not None:
+                    admissible &= np.isin(np.array(self._types, dtype=object), list(key))
+                self._bitmaps[key] = None if admissible.all() else np.packbits(admissible, bitorder="little")
+            return self._bitmaps[key]
+
+    def search_many(
+        self,
+        queries: np.ndarray,
+        k: int,
+        ef: Optional[int] = None,
+        types: Optional[Collection[str]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Returns, per row of `queries`, up to k (id, cosine similarity) pairs, best first."""
+        faiss = _faiss()
+        self.flush()
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+        if not self.ids:
+            return [[] for _ in range(len(queries))]
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = max(ef or self.config.ef_search, k)
+        bitmap = self._bitmap(types)
+        if bitmap is not None:
+            # `bitmap` stays referenced until the search returns
+            params.sel = faiss.IDSelectorBitmap(len(self.ids), faiss.swig_ptr(bitmap))
+        scores, nodes = self._index.search(queries, k, params=params)
+        return [
+            [(self.ids[node], score) for node, score in zip(row_nodes, row_scores) if node >= 0]
+            for row_nodes, row_scores in zip(nodes.tolist(), scores.tolist())
+        ]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        ef: Optional[int] = None,
+        types: Optional[Collection[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Returns up to k (id, cosine similarity) pairs, best first."""
+        return self.search_many(query, k, ef, types)[0]
+
+    def rebuild(self) -> "HNSWIndex":
+        """Returns a fresh graph over the live nodes, dropping tombstones."""
+        self.flush()
+        fresh = HNSWIndex(self.dimension, self.config)
+        with self._lock:
+            live = sorted(self._node_of.items(), key=lambda item: item[1])
+            if live:
+                vectors = self._index.reconstruct_batch(np.array([node for _, node in live], dtype=np.int64))
+                for (id, node), vector in zip(live, vectors):
+                    fresh.add(id, vector, self._types[node])
+        return fresh
+
+    def save(self, path: os.PathLike | str):
+        """Writes the graph, which holds its own copy of the vectors, to a single .npz file."""
+        faiss = _faiss()
+        self.flush()
+        with self._lock:
+            np.savez(
+                Path(path),
+                graph=faiss.serialize_index(self._index),
+                ids=np.array(self.ids, dtype=object),
+                types=np.array(self._types, dtype=object),
+                deleted=self._deleted,
+            )
+
+    @staticmethod
+    def load(path: os.PathLike | str, config: Optional[HNSWConfig] = None) -> "HNSWIndex":
+        faiss = _faiss()
+        with np.load(Path(path), allow_pickle=True) as stored:
+            graph = faiss.deserialize_index(stored["graph"])
+            index = HNSWIndex(graph.d, config)
+            index._index = graph
+            index.ids = stored["ids"].tolist()
+            index._types = stored["types"].tolist()
+            index._deleted = np.array(stored["deleted"], dtype=bool)
+        index._node_of = {id: node for node, id in enumerate(index.ids) if not index._deleted[node]}
+        index._deleted_count = int(index._deleted.sum())
+        return index
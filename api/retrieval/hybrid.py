@@ -0,0 +1,102 @@
+"""Lexical + vector retrieval fused with reciprocal rank fusion (RRF).
+
+RRF scores each document by `sum(1 / (k + rank))` over the rankings it
+appears in, so it needs no calibration between cosine similarities and
+BM25 scores. Each side contributes its top `candidates`; the fused list is
+cut back to `top_k`.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from retrieval.bm25 import BM25Index
+
+# the constant from Cormack et al.; larger values flatten the rank discount
+RRF_K = 60
+DEFAULT_CANDIDATES = 20
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int = RRF_K
+) -> List[Tuple[str, float]]:
+    """Fuses ranked id lists into (id, score) pairs, best first."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id in enumerate(ranking):
+            scores[id] = scores.get(id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def types_for_filter_key(filter_key, all_types) -> List[str]:
+    """The `type` partitions a registry `FilterKey` selects."""
+    op, values = filter_key
+    if op == "ne":
+        return sorted(set(all_types) - set(values))
+    return sorted(set(all_types) & set(values))
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Wraps a vector retriever (which should return `candidates` nodes) and a
+    `BM25Index` over the same ids. Lexical-only hits carry the BM25 index's
+    stored metadata and no text; wrap in a `HydratingRetriever` (as the
+    registry does) to fill it in from the doc store.
+    """
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        lexical: BM25Index,
+        filter_key,
+        top_k: int,
+        candidates: int = DEFAULT_CANDIDATES,
+        rrf_k: int = RRF_K,
+    ):
+        super().__init__()
+        self._vector = vector_retriever
+        self._lexical = lexical
+        self._filter_key = filter_key
+        self._top_k = top_k
+        self._candidates = candidates
+        self._rrf_k = rrf_k
+
+    def _lexical_node(self, id: str) -> Optional[TextNode]:
+        metadata = self._lexical.metadata(id)
+        if metadata is None:
+            return None
+        return TextNode(id_=id, text="", metadata=metadata)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._fuse(self._vector.retrieve(query_bundle), self._lexical_search(query_bundle))
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # BM25 scoring and its SQLite metadata reads run in a worker thread, alongside the vector search
+        vector_hits, lexical_hits = await asyncio.gather(
+            self._vector.aretrieve(query_bundle),
+            asyncio.to_thread(self._lexical_search, query_bundle),
+        )
+        return await asyncio.to_thread(self._fuse, vector_hits, lexical_hits)
+
+    def _lexical_search(self, query_bundle: QueryBundle) -> List[Tuple[str, float]]:
+        types = types_for_filter_key(self._filter_key, self._lexical.partitions())
+        return self._lexical.search(query_bundle.query_str, self._candidates, types)
+
+    def _fuse(
+        self, vector_hits: List[NodeWithScore], lexical_hits: List[Tuple[str, float]]
+    ) -> List[NodeWithScore]:
+        nodes = {hit.node.node_id: hit.node for hit in vector_hits}
+        fused = reciprocal_rank_fusion(
+            [[hit.node.node_id for hit in vector_hits], [id for id, _ in lexical_hits]],
+            k=self._rrf_k,
+        )
+        results = []
+        for id, score in fused:
+            node = nodes.get(id) or self._lexical_node(id)
+            if node is not None:
+                results.append(NodeWithScore(node=node, score=score))
+            if len(results) == self._top_k:
+                break
+        return results
@@ -0,0 +1,42 @@
+"""Fills in node text from the `DocStore` for nodes whose vector metadata had none."""
+
+import asyncio
+from typing import List
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from retrieval.doc_store import DocStore
+
+
+def hydrate(hits: List[NodeWithScore], docs: DocStore) -> List[NodeWithScore]:
+    """Text from `docs` for text-less hits; hits that already have text are left alone."""
+    missing = [hit.node.node_id for hit in hits if not hit.node.get_content()]
+    if not missing:
+        return hits
+    texts = docs.get_many(missing)
+    hydrated = []
+    for hit in hits:
+        text = texts.get(hit.node.node_id)
+        if text is not None and not hit.node.get_content():
+            node = TextNode(id_=hit.node.node_id, text=text, metadata=hit.node.metadata)
+            hit = NodeWithScore(node=node, score=hit.score)
+        hydrated.append(hit)
+    return hydrated
+
+
+class HydratingRetriever(BaseRetriever):
+    """Hydrates whatever `retriever` returns. The async path reads and decompresses in a worker thread."""
+
+    def __init__(self, retriever: BaseRetriever, docs: DocStore):
+        super().__init__()
+        self._retriever = retriever
+        self._docs = docs
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return hydrate(self._retriever.retrieve(query_bundle), self._docs)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        hits = await self._retriever.aretrieve(query_bundle)
+        # SQLite reads and zlib decompression would otherwise block the event loop
+        return await asyncio.to_thread(hydrate, hits, self._docs)
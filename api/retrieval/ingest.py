@@ -0,0 +1,362 @@
+"""Streaming ingestion of a source's chunks into every index of `index_name`.
+
+Shared by the ingest scripts, which used to build the whole corpus (text and
+embeddings) in one list and upsert it in a single request. Now the script
+supplies a generator (load -> clean -> chunk) and `sync_index` runs it as a
+pipeline of threads joined by bounded queues:
+
+    chunks -> skip duplicates, unchanged -> embed batches -> upsert batches
+
+so at most `queue_size` batches are in flight between stages and memory
+stays flat however large the source is. Chunk text goes to the doc store,
+vectors (without text) to the vector index in fixed-size upserts, and the
+full items to the BM25 index. Each upsert batch is recorded in the
+manifest as soon as it is on disk (for the local store, which buffers
+upserts into large segments, when the buffer is next written), so an
+interrupted run resumes after the last written batch; see manifest.py.
+
+Near-duplicates (see dedup.py) are found in the same pass, against the
+MinHash signatures of the chunks kept so far, so `chunks()` is read once
+and the first-seen copy is canonical. A document's chunks (consecutive
+chunks sharing a `DOCUMENT_KEYS` value) are decided together: the
+document is dropped only when every chunk duplicates another document's,
+so a kept thread or page never loses an inner chunk. Dropped ids are
+recorded in the manifest as duplicates of their canonical chunk, and once
+the pass is done the canonical chunks whose `aliases` / `alias_urls`
+metadata changed are re-upserted with their stored vectors.
+"""
+
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from retrieval.dedup import DEFAULT_THRESHOLD, NearDuplicateIndex
+from retrieval.embedding_cache import Embedding
+from retrieval.manifest import content_hash
+from retrieval.registry import get_registry
+
+# Pinecone's recommended upsert size for 1536-dimension vectors
+DEFAULT_UPSERT_BATCH = int(os.environ.get("INGEST_UPSERT_BATCH", "100"))
+DEFAULT_EMBED_BATCH = int(os.environ.get("INGEST_EMBED_BATCH", "500"))
+DEFAULT_QUEUE_SIZE = 4
+# Pinecone accepts at most 1000 ids per delete
+DELETE_BATCH = 1000
+# Pinecone's largest query top_k
+MAX_QUERY_TOP_K = 10000
+# metadata naming the document a chunk belongs to; chunks of one document are never duplicates
+DOCUMENT_KEYS = ("thread_id", "url")
+
+# alias metadata of a canonical chunk, maintained by ingestion
+ALIAS_KEYS = ("aliases", "alias_urls")
+# manifest hash prefix of ids skipped as near-duplicates: "duplicate:<canonical id>"
+DUPLICATE_PREFIX = "duplicate:"
+
+Chunk = Dict[str, Any]
+_DONE = object()
+_UUID4 = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}")
+
+
+def legacy_uuid_ids(index: Any, type: str) -> List[str]:
+    """
+    The random uuid4 ids that ingest_docs.py wrote before ids were derived
+    from the page URL. They predate the manifest and the BM25 index, so they
+    are listed from the vector index itself: every id of a serverless
+    Pinecone index (`list()`, no other script wrote uuid4 ids), or else the
+    matches of a query filtered on `type`. That query returns at most
+    MAX_QUERY_TOP_K ids; if it is full, delete the manifest once the run
+    completes and ingest again to find the rest.
+    """
+    if hasattr(index, "list"):
+        return [id for page in index.list() for id in page if _UUID4.fullmatch(id)]
+    dimension = getattr(index, "dimension", 1536)
+    probe = [1.0] + [0.0] * (dimension - 1)
+    matches = index.query(vector=probe, top_k=MAX_QUERY_TOP_K, filter={"type": {"$eq": type}})["matches"]
+    if len(matches) == MAX_QUERY_TOP_K:
+        print(f"{type}: found the query limit of {MAX_QUERY_TOP_K} legacy ids; more may remain")
+    return [match["id"] for match in matches if _UUID4.fullmatch(match["id"])]
+
+
+class _Stopped(Exception):
+    """Another stage failed; this one gives up."""
+
+
+@dataclass
+class IngestStats:
+    chunks: int = 0
+    duplicates: int = 0
+    unchanged: int = 0
+    written: int = 0
+    upserts: int = 0
+    removed: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.chunks} chunks: {self.duplicates} near-duplicates not embedded, "
+            f"{self.unchanged} unchanged, {self.written} written in {self.upserts} upserts, "
+            f"{self.removed} removed"
+        )
+
+
+def _document(chunk: Chunk) -> Optional[str]:
+    metadata = chunk["metadata"]
+    return next((str(metadata[key]) for key in DOCUMENT_KEYS if metadata.get(key)), None)
+
+
+class _Deduplicator:
+    """
+    Online near-duplicate filter over documents, in ingestion order. Tracks
+    which ids were dropped as duplicates of which canonical chunk and the
+    alias metadata each canonical chunk should carry.
+    """
+
+    def __init__(self, threshold: float):
+        self.index = NearDuplicateIndex(threshold)
+        self.duplicates: Dict[str, str] = {}
+        self.aliases: Dict[str, Dict[str, List[str]]] = {}
+        self._urls: Dict[str, Optional[str]] = {}
+
+    def keep(self, document: List[Chunk]) -> bool:
+        """Whether to keep `document`; if so its chunks become canonical candidates."""
+        group = _document(document[0])
+        matches = [self.index.match(chunk["metadata"]["text"], group) for chunk in document]
+        if all(canonical is not None for canonical, _ in matches):
+            for chunk, (canonical, _) in zip(document, matches):
+                self._alias(chunk, canonical)
+            return False
+        for chunk, (_, signature) in zip(document, matches):
+            self.index.insert(chunk["id"], signature, group)
+            self._urls[chunk["id"]] = chunk["metadata"].get("url")
+        return True
+
+    def _alias(self, chunk: Chunk, canonical: str):
+        self.duplicates[chunk["id"]] = canonical
+        aliases = self.aliases.setdefault(canonical, {"aliases": []})
+        aliases["aliases"].append(chunk["id"])
+        url = chunk["metadata"].get("url")
+        if url and url != self._urls.get(canonical) and url not in aliases.get("alias_urls", []):
+            aliases.setdefault("alias_urls", []).append(url)
+
+
+def _fetch_vectors(index: Any, ids: List[str]) -> Dict[str, Tuple[List[float], Dict[str, Any]]]:
+    """id -> (values, metadata), from a local index's dict or a Pinecone FetchResponse."""
+    response = index.fetch(ids=ids)
+    vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+    fetched = {}
+    for id, vector in vectors.items():
+        if isinstance(vector, dict):
+            fetched[id] = (vector["values"], dict(vector.get("metadata") or {}))
+        else:
+            fetched[id] = (list(vector.values), dict(vector.metadata or {}))
+    return fetched
+
+
+def sync_index(
+    index_name: str,
+    scope: str,
+    chunks: Callable[[], Iterable[Chunk]],
+    embed: Callable[[List[str]], List[Embedding]],
+    legacy_ids: Optional[Callable[[], Iterable[str]]] = None,
+    upsert_batch: int = DEFAULT_UPSERT_BATCH,
+    embed_batch: int = DEFAULT_EMBED_BATCH,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    dedup_threshold: float = DEFAULT_THRESHOLD,
+) -> IngestStats:
+    """
+    Brings `index_name` in line with the complete current set of
+    Pinecone-style items (without `values`) for `scope`. `chunks()` yields
+    them lazily, in the same order each run, and is called once; a
+    `dedup_threshold` of 0 turns near-duplicate detection off. Repeated ids
+    keep their first chunk. `embed` is called with the texts of
+    up to `embed_batch` changed chunks at a time. `legacy_ids` is called once
+    the chunks are exhausted and returns ids written before the manifest
+    existed; they are deleted by the first complete run for `scope`.
+    """
+    registry = get_registry()
+    manifest = registry.manifest(index_name)
+    index = registry.vector_index(index_name)
+    lexical = registry.lexical_index(index_name, readonly=False)
+    docs = registry.doc_store(index_name)
+
+    dedup = _Deduplicator(dedup_threshold) if dedup_threshold > 0 else None
+    previous = manifest.hashes(scope)
+    first_run = not manifest.completed(scope)
+    seen: Set[str] = set()
+    stats = IngestStats()
+    stop = threading.Event()
+    to_embed: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+    to_write: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+
+    def put(q: queue.Queue, item: Any):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise _Stopped()
+
+    def get(q: queue.Queue) -> Any:
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise _Stopped()
+
+    def select():
+        """load -> clean -> chunk (the caller's generator), minus duplicates and unchanged chunks."""
+        batch: List[Tuple[Chunk, str]] = []
+        # the chunks of the current document, decided on together
+        document: List[Chunk] = []
+
+        def emit(document: List[Chunk]):
+            nonlocal batch
+            if dedup is not None and not dedup.keep(document):
+                stats.duplicates += len(document)
+                return
+            for chunk in document:
+                hash = content_hash(chunk)
+                if previous.get(chunk["id"]) == hash:
+                    stats.unchanged += 1
+                    continue
+                batch.append((chunk, hash))
+                if len(batch) == embed_batch:
+                    put(to_embed, batch)
+                    batch = []
+
+        for chunk in chunks():
+            if chunk["id"] in seen:
+                continue
+            seen.add(chunk["id"])
+            stats.chunks += 1
+            if document and (_document(chunk) is None or _document(chunk) != _document(document[0])):
+                emit(document)
+                document = []
+            document.append(chunk)
+            metadata = chunk["metadata"]
+            if _document(chunk) is None or metadata.get("chunk_index", -1) + 1 == metadata.get("chunk_count"):
+                emit(document)
+                document = []
+        if document:
+            emit(document)
+        if batch:
+            put(to_embed, batch)
+        put(to_embed, _DONE)
+
+    def embed_batches():
+        while (batch := get(to_embed)) is not _DONE:
+            embeddings = embed([chunk["metadata"]["text"] for chunk, _ in batch])
+            embedded = [({**chunk, "values": values}, hash) for (chunk, hash), values in zip(batch, embeddings)]
+            put(to_write, embedded)
+        put(to_write, _DONE)
+
+    unrecorded: Dict[str, str] = {}
+
+    def record_written():
+        # the local store buffers upserts; only rows it has written count as done
+        if unrecorded and not getattr(index, "buffered_rows", 0):
+            manifest.record(scope, unrecorded)
+            unrecorded.clear()
+
+    def write(batch: List[Tuple[Chunk, str]]):
+        data = [item for item, _ in batch]
+        # chunk text goes to the doc store; vector metadata keeps ids and filter fields
+        index.upsert(vectors=docs.store_items(data))
+        # same chunks and ids into the BM25 index used by RETRIEVAL_MODE=hybrid
+        lexical.upsert(data)
+        unrecorded.update({item["id"]: hash for item, hash in batch})
+        record_written()
+        stats.written += len(batch)
+        stats.upserts += 1
+
+    def run(stage: Callable[[], None]):
+        try:
+            stage()
+        except _Stopped:
+            pass
+        except BaseException:
+            stop.set()
+            raise
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"ingest-{scope}") as pool:
+        stages = [pool.submit(run, select), pool.submit(run, embed_batches)]
+        try:
+            pending: List[Tuple[Chunk, str]] = []
+            while (batch := get(to_write)) is not _DONE:
+                pending.extend(batch)
+                while len(pending) >= upsert_batch:
+                    write(pending[:upsert_batch])
+                    pending = pending[upsert_batch:]
+            if pending:
+                write(pending)
+        except _Stopped:
+            pass
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            # re-raises a failed stage's error
+            for stage in stages:
+                stage.result()
+    if stop.is_set():
+        # never delete stale ids after a partial pass over the source
+        raise RuntimeError(f"ingestion of {scope} stopped early")
+    if getattr(index, "buffered_rows", 0):
+        index.flush()
+    record_written()
+
+    duplicates = dedup.duplicates if dedup is not None else {}
+    kept = seen.difference(duplicates)
+    if dedup is not None:
+        # canonical chunks that gained, changed or lost aliases since the last run
+        refresh = set(dedup.aliases) | {
+            hash[len(DUPLICATE_PREFIX) :] for hash in previous.values() if hash.startswith(DUPLICATE_PREFIX)
+        }
+        _update_aliases(index, lexical, docs, sorted(refresh & kept), dedup.aliases, upsert_batch)
+
+    # ids written before (now gone, or now duplicates) are deleted; old duplicate records just forgotten
+    stale = [id for id in previous if id not in kept]
+    removed = [id for id in stale if not previous[id].startswith(DUPLICATE_PREFIX)]
+    if first_run and legacy_ids is not None:
+        legacy = [id for id in dict.fromkeys(legacy_ids()) if id not in seen and id not in previous]
+        if legacy:
+            print(f"{scope}: deleting {len(legacy)} ids written before the manifest")
+        removed.extend(legacy)
+    if removed:
+        for start in range(0, len(removed), DELETE_BATCH):
+            index.delete(ids=removed[start : start + DELETE_BATCH])
+        lexical.delete(removed)
+        docs.delete(removed)
+    if stale:
+        manifest.forget(scope, stale)
+    if duplicates:
+        manifest.record(scope, {id: DUPLICATE_PREFIX + canonical for id, canonical in duplicates.items()})
+    stats.removed = len(removed)
+    manifest.mark_completed(scope)
+    return stats
+
+
+def _update_aliases(index, lexical, docs, ids: List[str], aliases: Dict[str, Dict[str, List[str]]], batch: int):
+    """Rewrites the alias metadata of `ids` where it differs from `aliases`, reusing the stored vectors."""
+    for start in range(0, len(ids), batch):
+        fetched = _fetch_vectors(index, ids[start : start + batch])
+        updated = []
+        for id, (values, metadata) in fetched.items():
+            current = {key: metadata[key] for key in ALIAS_KEYS if key in metadata}
+            if current != aliases.get(id, {}):
+                metadata = {k: v for k, v in metadata.items() if k not in ALIAS_KEYS}
+                updated.append({"id": id, "values": values, "metadata": {**metadata, **aliases.get(id, {})}})
+        if not updated:
+            continue
+        # vector metadata has no text; the BM25 index gets it back from the doc store
+        index.upsert(vectors=updated)
+        texts = docs.get_many([item["id"] for item in updated])
+        lexical.upsert(
+            [{"id": item["id"], "metadata": {**item["metadata"], "text": texts.get(item["id"], "")}} for item in updated]
+        )
+    if getattr(index, "buffered_rows", 0):
+        index.flush()
@@ -0,0 +1,149 @@
+"""Incremental readers for the Discord dumps, one record at a time.
+
+The dumps under discord_json/ (`thread_messages_*.json`,
+`channel_messages.json`) and `discord_documents.json` are single JSON
+arrays of objects, already near a megabyte per channel, and ingest_threads
+used to `json.load` a whole one before chunking its first thread.
+`iter_json_array` decodes one element at a time from a buffered read of the
+file, so memory stays around one record however large the file grows, and
+records reach the caller while the rest of the file is still unread.
+
+Line-delimited files (`.jsonl`, as written by discord_json/thread_exporter.py)
+are read line by line. `iter_threads` reads either kind of thread dump.
+A JSON array is read once. For JSONL, where a thread's messages can be
+spread over lines appended by several exports, the file is read twice:
+a scan that records each thread's line offsets (decoding only the
+leading `"thread_id"` the exporter writes, not the messages), then one
+seek-and-read per thread that merges its lines, dropping repeated message
+ids. Memory is one offset per line plus the thread being merged.
+"""
+
+import json
+import os
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+
+CHUNK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+# the exporter's lines start with the thread id; other lines are decoded whole
+_THREAD_ID_PREFIX = re.compile(rb'\{"thread_id": (null|-?[0-9]+)[,}]')
+
+
+def iter_json_array(path: os.PathLike | str, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """The elements of the JSON array in `path`, decoded one at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size)
+        position = 0
+        eof = not buffer
+        expect = "["
+        read_size = chunk_size
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position == len(buffer):
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of JSON array")
+                buffer, position = f.read(read_size), 0
+                eof = not buffer
+                continue
+            char = buffer[position]
+            if expect == "[":
+                if char != "[":
+                    raise ValueError(f"{path}: expected a JSON array")
+                position += 1
+                expect = "value"
+                continue
+            if char == "]" and expect in ("value", ","):
+                return
+            if expect == ",":
+                if char != ",":
+                    raise ValueError(f"{path}: expected ',' between array elements")
+                position += 1
+                expect = "element"
+                continue
+            try:
+                value, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the element continues past the buffer: read more, doubling so long elements stay linear
+                more = f.read(read_size)
+                eof = not more
+                buffer = buffer[position:] + more
+                position = 0
+                read_size *= 2
+                continue
+            # a number cut by the end of the buffer decodes as its prefix; anything else ends on its delimiter
+            if (
+                isinstance(value, (int, float))
+                and not eof
+                and (end == len(buffer) or buffer[end] not in ",]" + _WHITESPACE)
+            ):
+                more = f.read(read_size)
+                eof = not more
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield value
+            position = end
+            read_size = chunk_size
+            expect = ","
+
+
+def iter_jsonl(path: os.PathLike | str) -> Iterator[Any]:
+    """One value per non-empty line of `path`."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_records(path: os.PathLike | str) -> Iterator[Any]:
+    """The records of a JSON array file or, for `.jsonl`, of a line-delimited file."""
+    if str(path).endswith(".jsonl"):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def _merge_thread_lines(path: os.PathLike | str) -> Iterator[Dict[str, Any]]:
+    offsets: Dict[Optional[Any], List[int]] = defaultdict(list)
+    with open(path, "rb") as f:
+        # first pass: where each thread's lines are, in order of first appearance
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                prefix = _THREAD_ID_PREFIX.match(line)
+                if prefix is not None:
+                    thread_id = None if prefix.group(1) == b"null" else int(prefix.group(1))
+                else:
+                    thread_id = json.loads(line)["thread_id"]
+                offsets[thread_id].append(offset)
+        for thread_id, thread_offsets in offsets.items():
+            thread: Dict[str, Any] = {"thread_id": thread_id, "thread_name": None, "messages": []}
+            seen = set()
+            for offset in thread_offsets:
+                f.seek(offset)
+                record = json.loads(f.readline())
+                thread["thread_name"] = record.get("thread_name") or thread["thread_name"]
+                for message in record["messages"]:
+                    if message.get("id") is None or message["id"] not in seen:
+                        seen.add(message.get("id"))
+                        thread["messages"].append(message)
+            yield thread
+
+
+def iter_threads(path: os.PathLike | str) -> Iterator[Dict[str, Any]]:
+    """
+    `{"thread_id", "thread_name", "messages"}` dicts of a thread dump, one
+    at a time: the elements of a `thread_messages_*.json` array, or the
+    merged lines of a `.jsonl` export.
+    """
+    if str(path).endswith(".jsonl"):
+        return _merge_thread_lines(path)
+    return iter_json_array(path)
@@ -0,0 +1,71 @@
+"""Search primitives shared by the local backend (segment_store.py, bm25.py).
+
+Local indexes keep L2-normalized float32 rows grouped by metadata `type`
+(`docs`, `docs2`, `discord_thread`), so each type is a contiguous slice. A
+query with a `type` filter only multiplies against the matching slices;
+top-k is one matmul plus `argpartition` per slice.
+"""
+
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_DIMENSION = 1536
+UNTYPED = ""
+
+# (id, score) pairs, best first
+SearchHits = List[Tuple[str, float]]
+
+
+def types_for_filter(
+    filter: Optional[Dict[str, Any]], all_types: Collection[str]
+) -> Optional[List[str]]:
+    """
+    Resolves a Pinecone-style metadata filter on `type` into the partitions
+    to scan. Returns None when the filter does not restrict `type`.
+    """
+    if not filter:
+        return None
+    unsupported = set(filter) - {"type"}
+    if unsupported:
+        raise ValueError(f"Local index can only filter on 'type', got {sorted(unsupported)}")
+    condition = filter["type"]
+    if not isinstance(condition, dict):
+        condition = {"$eq": condition}
+    selected = set(all_types)
+    for op, value in condition.items():
+        if op == "$eq":
+            selected &= {value}
+        elif op == "$ne":
+            selected -= {value}
+        elif op == "$in":
+            selected &= set(value)
+        elif op == "$nin":
+            selected -= set(value)
+        else:
+            raise ValueError(f"Unsupported filter operator {op}")
+    return sorted(selected)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def topk_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k along axis 0 of a (rows, queries) score matrix.
+    Returns (rows, scores), both (k, queries) and sorted best first.
+    """
+    k = min(k, scores.shape[0])
+    if k == 0:
+        return np.empty((0, scores.shape[1]), dtype=np.int64), np.empty((0, scores.shape[1]), dtype=np.float32)
+    if k < scores.shape[0]:
+        rows = np.argpartition(-scores, k - 1, axis=0)[:k]
+    else:
+        rows = np.broadcast_to(np.arange(scores.shape[0])[:, None], scores.shape).copy()
+    top = np.take_along_axis(scores, rows, axis=0)
+    order = np.argsort(-top, axis=0)
+    return np.take_along_axis(rows, order, axis=0), np.take_along_axis(top, order, axis=0)
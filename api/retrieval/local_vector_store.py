@@ -0,0 +1,108 @@
+"""llama_index `VectorStore` over a `SegmentStore`.
+
+Lets the retriever registry hand out local retrievers with the same
+interface, and the same results shape, as the Pinecone-backed ones.
+`aquery` runs the NumPy search on a small dedicated pool (NumPy releases
+the GIL in the matmul), so async callers never queue behind the event
+loop's default executor.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from llama_index.core.schema import BaseNode, TextNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from pydantic import PrivateAttr
+
+from retrieval.local_index import types_for_filter
+from retrieval.segment_store import SegmentStore
+
+TEXT_KEY = "text"
+
+_search_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("LOCAL_SEARCH_THREADS", "4")),
+    thread_name_prefix="local-search",
+)
+
+_OPERATORS = {
+    FilterOperator.EQ: "$eq",
+    FilterOperator.NE: "$ne",
+    FilterOperator.IN: "$in",
+    FilterOperator.NIN: "$nin",
+}
+
+
+def to_pinecone_filter(filters: Optional[MetadataFilters]) -> Optional[Dict[str, Any]]:
+    if filters is None or not filters.filters:
+        return None
+    condition: Dict[str, Dict[str, Any]] = {}
+    for f in filters.filters:
+        if isinstance(f, MetadataFilters) or f.operator not in _OPERATORS:
+            raise ValueError(f"Unsupported filter for the local index: {f}")
+        condition.setdefault(f.key, {})[_OPERATORS[f.operator]] = f.value
+    return condition
+
+
+class LocalVectorStore(BasePydanticVectorStore):
+    stores_text: bool = True
+
+    _index: SegmentStore = PrivateAttr()
+
+    def __init__(self, index: SegmentStore, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._index = index
+
+    @property
+    def client(self) -> SegmentStore:
+        return self._index
+
+    def add(self, nodes: List[BaseNode], **kwargs: Any) -> List[str]:
+        self._index.upsert(
+            vectors=[
+                {
+                    "id": node.node_id,
+                    "values": node.get_embedding(),
+                    "metadata": {**node.metadata, TEXT_KEY: node.get_content()},
+                }
+                for node in nodes
+            ]
+        )
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **kwargs: Any) -> None:
+        self._index.delete(ids=[ref_doc_id])
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None:
+            raise ValueError("Local vector store requires a query embedding")
+        types = types_for_filter(to_pinecone_filter(query.filters), self._index.partitions())
+        hits = self._index.search_records(query.query_embedding, query.similarity_top_k, types)[0]
+
+        nodes, similarities, ids = [], [], []
+        for record, score in hits:
+            metadata = dict(record["metadata"])
+            text = metadata.pop(TEXT_KEY, "")
+            nodes.append(TextNode(id_=record["id"], text=text, metadata=metadata))
+            similarities.append(score)
+            ids.append(record["id"])
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_search_pool, self.query, query)
+
+    def fetch_metadata(self, ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        vectors = self._index.fetch(ids=list(ids))["vectors"]
+        return {id: vector["metadata"] for id, vector in vectors.items()}
+
+    async def afetch_metadata(self, ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_search_pool, self.fetch_metadata, ids)
@@ -0,0 +1,90 @@
+"""Ingestion manifest: the content hash of every chunk id last written.
+
+The ingest scripts used to re-embed and re-upsert their whole corpus on
+every run. With the manifest, a run hashes each chunk it would write,
+compares against what was recorded, and only embeds and upserts new or
+changed chunks; ids recorded earlier but absent now are deleted from the
+indexes. Entries are grouped by `scope` (a Discord channel, the docs
+crawl) so one source's run never deletes another's chunks.
+
+Hashes are recorded batch by batch as soon as the indexes were written,
+which makes the manifest the ingestion checkpoint too: an interrupted run
+leaves the batches it finished recorded, and the next run skips them.
+Stale ids are only deleted by a run that saw its whole source, after which
+the scope is marked complete. Deleting the file makes the next run a full
+re-ingest, without stale deletion.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+_SQL_BATCH = 500
+
+
+def content_hash(item: Mapping[str, Any]) -> str:
+    """Hash of a Pinecone-style item's metadata (text included); `values` are ignored."""
+    payload = json.dumps(item.get("metadata") or {}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """(scope, id) -> content hash, in SQLite. Pass `path=None` for a memory-only manifest."""
+
+    def __init__(self, path: Optional[os.PathLike | str] = None):
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path) if path is not None else ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "scope TEXT NOT NULL, id TEXT NOT NULL, hash TEXT NOT NULL, "
+            "PRIMARY KEY (scope, id))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS completed (scope TEXT PRIMARY KEY)")
+        self._db.commit()
+
+    def hashes(self, scope: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._db.execute("SELECT id, hash FROM chunks WHERE scope = ?", (scope,)).fetchall()
+        return dict(rows)
+
+    def record(self, scope: str, hashes: Mapping[str, str]):
+        """Marks `hashes` (id -> hash) as written."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (scope, id, hash) VALUES (?, ?, ?)",
+                [(scope, id, hash) for id, hash in hashes.items()],
+            )
+            self._db.commit()
+
+    def forget(self, scope: str, ids: Iterable[str]):
+        """Drops `ids`, once they were deleted from the indexes."""
+        ids = list(ids)
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start : start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                self._db.execute(
+                    f"DELETE FROM chunks WHERE scope = ? AND id IN ({placeholders})", [scope, *batch]
+                )
+            self._db.commit()
+
+    def completed(self, scope: str) -> bool:
+        """Whether a run over the whole of `scope` has finished before."""
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM completed WHERE scope = ?", (scope,)).fetchone()
+        return row is not None
+
+    def mark_completed(self, scope: str):
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO completed (scope) VALUES (?)", (scope,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,254 @@
+"""Compressed embedding codes for a first-stage search, rescored exactly.
+
+Two codecs over L2-normalized float32 vectors:
+
+- `ScalarQuantizer` ("int8"): per-dimension affine int8, 1 byte per
+  dimension (4x smaller than float32). NumPy has no integer GEMM, so codes
+  are dequantized to float32 one cache-sized block of rows at a time and
+  scored with the float matmul; the win is the bytes read, not the
+  arithmetic.
+- `ProductQuantizer` ("pq"): splits each vector into `subspaces` chunks
+  and stores the index of the nearest of 256 k-means centroids per chunk
+  (1 byte per chunk, e.g. 96 bytes for a 1536-d ada-002 vector instead of
+  6 KB). Queries are scored against all codes without decompressing them,
+  through one lookup table per query and subspace.
+
+`two_stage_search` keeps the best `rescore` candidates from the codes and
+re-ranks them with exact dot products against the float rows, which can
+stay on disk in a memmap so only the candidates' pages are read.
+
+Codecs are trained once per store (see `SegmentStore.compact`), on a
+sample of all its rows, and shared by every segment's codes.
+"""
+
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from retrieval.local_index import topk_rows
+
+# rows scored per block, bounding the lookup temporaries
+_BLOCK_ROWS = 16384
+# int8 rows cast to float32 per block: 256 x 1536 floats (1.5 MB) stay in cache for the matmul
+_DEQUANTIZE_ROWS = 256
+
+
+class ScalarQuantizer:
+    kind = "int8"
+
+    def __init__(self, offset: Optional[np.ndarray] = None, scale: Optional[np.ndarray] = None):
+        self.offset = offset
+        self.scale = scale
+
+    def fit(self, vectors: np.ndarray, sample: int = 10000) -> "ScalarQuantizer":
+        """Per-dimension ranges, from up to `sample` rows of `vectors`."""
+        rng = np.random.default_rng(0)
+        if len(vectors) > sample:
+            vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        self.scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+        # center codes on zero so they fit in int8
+        self.offset = (low + 128.0 * self.scale).astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), _BLOCK_ROWS):
+            block = np.asarray(vectors[start : start + _BLOCK_ROWS], dtype=np.float32)
+            codes[start : start + len(block)] = np.clip(np.rint((block - self.offset) / self.scale), -128, 127)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        block = np.asarray(codes, dtype=np.float32)
+        block *= self.scale
+        block += self.offset
+        return block
+
+    def scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Approximate dot products, (rows, queries), dequantizing one cache-sized block at a time."""
+        queries = np.asarray(queries, dtype=np.float32)
+        # q . (offset + scale * c) = q . offset + (q * scale) . c, so a block only needs the int8 -> float32 cast
+        scaled = np.ascontiguousarray((queries * self.scale).T)
+        bias = queries @ self.offset
+        out = np.empty((codes.shape[0], len(queries)), dtype=np.float32)
+        buffer = np.empty((min(_DEQUANTIZE_ROWS, codes.shape[0]), codes.shape[1]), dtype=np.float32)
+        for start in range(0, codes.shape[0], _DEQUANTIZE_ROWS):
+            block = codes[start : start + _DEQUANTIZE_ROWS]
+            floats = buffer[: len(block)]
+            np.copyto(floats, block, casting="unsafe")
+            np.matmul(floats, scaled, out=out[start : start + len(block)])
+        out += bias
+        return out
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"kind": np.array(self.kind), "offset": self.offset, "scale": self.scale}
+
+    @staticmethod
+    def from_arrays(arrays) -> "ScalarQuantizer":
+        return ScalarQuantizer(offset=arrays["offset"], scale=arrays["scale"])
+
+
+class ProductQuantizer:
+    kind = "pq"
+
+    def __init__(
+        self,
+        subspaces: int = 96,
+        centroids: int = 256,
+        iterations: int = 10,
+        seed: int = 0,
+        codebooks: Optional[np.ndarray] = None,
+    ):
+        if centroids > 256:
+            raise ValueError("Product quantizer codes are stored as uint8")
+        self.subspaces = subspaces
+        self.centroids = centroids
+        self.iterations = iterations
+        self.seed = seed
+        # (subspaces, centroids, sub_dimension)
+        self.codebooks = codebooks
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        n, dimension = vectors.shape
+        if dimension % self.subspaces:
+            raise ValueError(f"Dimension {dimension} is not divisible into {self.subspaces} subspaces")
+        return vectors.reshape(n, self.subspaces, dimension // self.subspaces)
+
+    def fit(self, vectors: np.ndarray, sample: int = 10000) -> "ProductQuantizer":
+        """k-means in every subspace at once, on up to `sample` rows of `vectors`."""
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > sample:
+            vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+        # (subspaces, n, sub_dimension)
+        data = np.ascontiguousarray(self._split(np.asarray(vectors, dtype=np.float32)).transpose(1, 0, 2))
+        n, k = data.shape[1], min(self.centroids, len(vectors))
+        centers = data[:, rng.choice(n, k, replace=False)].copy()
+        # each subspace's assignments offset into one flat range of cluster ids
+        flat = np.arange(self.subspaces)[:, None] * k
+        for _ in range(self.iterations):
+            assign = (_nearest(data, centers) + flat).ravel()
+            counts = np.bincount(assign, minlength=self.subspaces * k).reshape(self.subspaces, k)
+            sums = np.stack(
+                [
+                    np.bincount(assign, weights=data[:, :, j].ravel(), minlength=self.subspaces * k)
+                    for j in range(data.shape[2])
+                ],
+                axis=1,
+            ).reshape(self.subspaces, k, data.shape[2])
+            empty = counts == 0
+            centers = np.where(empty[:, :, None], centers, sums / np.maximum(counts, 1)[:, :, None])
+            # re-seed empty clusters on random points of their subspace
+            for m, c in zip(*np.nonzero(empty)):
+                centers[m, c] = data[m, rng.integers(n)]
+            centers = centers.astype(np.float32)
+        codebooks = np.zeros((self.subspaces, self.centroids, data.shape[2]), dtype=np.float32)
+        codebooks[:, :k] = centers
+        self.codebooks = codebooks
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for start in range(0, len(vectors), _BLOCK_ROWS):
+            parts = self._split(np.asarray(vectors[start : start + _BLOCK_ROWS], dtype=np.float32))
+            codes[start : start + len(parts)] = _nearest(parts.transpose(1, 0, 2), self.codebooks).T
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = self.codebooks[np.arange(self.subspaces), codes]
+        return parts.reshape(len(codes), -1)
+
+    def scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Asymmetric distance computation: per-query lookup tables, summed per code."""
+        query_parts = self._split(np.asarray(queries, dtype=np.float32))
+        # (subspaces, centroids, queries)
+        tables = np.ascontiguousarray(np.einsum("qmd,mcd->mcq", query_parts, self.codebooks))
+        out = np.zeros((codes.shape[0], len(queries)), dtype=np.float32)
+        for start in range(0, codes.shape[0], _BLOCK_ROWS):
+            block = np.asarray(codes[start : start + _BLOCK_ROWS])
+            acc = out[start : start + len(block)]
+            for m in range(self.subspaces):
+                # one gather of a (rows, queries) slab per subspace
+                acc += np.take(tables[m], block[:, m], axis=0)
+        return out
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"kind": np.array(self.kind), "codebooks": self.codebooks}
+
+    @staticmethod
+    def from_arrays(arrays) -> "ProductQuantizer":
+        codebooks = arrays["codebooks"]
+        return ProductQuantizer(
+            subspaces=codebooks.shape[0], centroids=codebooks.shape[1], codebooks=codebooks
+        )
+
+
+Quantizer = Union[ScalarQuantizer, ProductQuantizer]
+
+
+def _nearest(data: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Per subspace, the nearest center of each row: (subspaces, n) from (subspaces, n, d) and (subspaces, k, d)."""
+    half_norms = 0.5 * (centers * centers).sum(axis=2)
+    nearest = np.empty(data.shape[:2], dtype=np.int64)
+    # one subspace at a time keeps the (n, k) score matrix small
+    for m in range(data.shape[0]):
+        # argmin ||x - c||^2 == argmax (x . c - ||c||^2 / 2)
+        scores = data[m] @ centers[m].T
+        scores -= half_norms[m]
+        nearest[m] = np.argmax(scores, axis=1)
+    return nearest
+
+
+def make_quantizer(kind: str, dimension: int) -> Optional[Quantizer]:
+    """Builds an untrained quantizer for "int8", "pq" or "none"."""
+    if kind in ("", "none"):
+        return None
+    if kind == "int8":
+        return ScalarQuantizer()
+    if kind == "pq":
+        # 16 dimensions per subspace: 96 bytes per ada-002 vector
+        subspaces = max(1, dimension // 16)
+        while dimension % subspaces:
+            subspaces -= 1
+        return ProductQuantizer(subspaces=subspaces)
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+def quantizer_from_arrays(arrays) -> Quantizer:
+    kind = str(arrays["kind"])
+    if kind == ScalarQuantizer.kind:
+        return ScalarQuantizer.from_arrays(arrays)
+    if kind == ProductQuantizer.kind:
+        return ProductQuantizer.from_arrays(arrays)
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+def two_stage_search(
+    quantizer: Quantizer,
+    codes: np.ndarray,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    top_k: int,
+    rescore: int,
+    mask: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compressed first stage over `codes`, then exact rescoring of the best
+    `rescore` rows against the float `vectors`. `mask` marks rows to skip.
+    Returns (rows, scores), both (k, queries) and sorted best first.
+    """
+    approx = quantizer.scores(codes, queries)
+    if mask is not None:
+        approx[mask] = -np.inf
+    candidates, _ = topk_rows(approx, max(rescore, top_k))
+    rows = np.empty((min(top_k, len(candidates)), len(queries)), dtype=np.int64)
+    scores = np.empty(rows.shape, dtype=np.float32)
+    for q in range(len(queries)):
+        cand = np.sort(candidates[:, q])  # sorted rows keep memmap reads sequential
+        exact = np.asarray(vectors[cand] @ queries[q], dtype=np.float32)
+        if mask is not None:
+            exact[mask[cand]] = -np.inf
+        best, best_scores = topk_rows(exact[:, None], top_k)
+        rows[:, q] = cand[best[:, 0]]
+        scores[:, q] = best_scores[:, 0]
+    return rows, scores
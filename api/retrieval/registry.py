@@ -0,0 +1,405 @@
+"""Process-wide registry of long-lived retrieval clients.
+
+Building a `PineconeVectorStore`, an `OpenAIEmbedding` and a
+`VectorStoreIndex` is expensive (client construction, `list_indexes()`
+round-trips, pydantic validation), so we do it once per key and hand the
+same objects to every request. All lookups are guarded by a lock so the
+registry can be shared by the thread pool that serves retrieval.
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.vector_stores import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+)
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBED_MODEL = "text-embedding-ada-002"
+DEFAULT_TOP_K = 5
+
+# "pinecone" (default) or "local" for the memory-mapped store in segment_store.py
+DEFAULT_BACKEND = "pinecone"
+DEFAULT_LOCAL_INDEX_DIR = Path(__file__).parent.parent / ".cache" / "local_index"
+# "vector" (default) or "hybrid" to fuse in the BM25 index written at ingestion
+DEFAULT_MODE = "vector"
+DEFAULT_LEXICAL_INDEX_DIR = Path(__file__).parent.parent / ".cache" / "bm25"
+# chunk text lives here rather than in vector metadata; see doc_store.py
+DEFAULT_DOC_STORE_DIR = Path(__file__).parent.parent / ".cache" / "docstore"
+# content hashes of what ingestion last wrote; see manifest.py
+DEFAULT_MANIFEST_DIR = Path(__file__).parent.parent / ".cache" / "manifests"
+# "lexical" (default), "none", or "package.module:factory"; see rerank.py
+DEFAULT_RERANKER = "lexical"
+DEFAULT_RERANK_CANDIDATES = 20
+# Discord hits collapse to one per thread, expanded by THREAD_WINDOW chunks each side
+# as long as the window stays within THREAD_WINDOW_TOKENS (default: CONTEXT_TOKEN_BUDGET)
+DEFAULT_THREAD_WINDOW = 1
+
+# ("ne", ("docs",)) or ("in", ("docs2", "discord_thread")): a hashable form
+# of the `type` metadata filter that `retrieve_llamaindex` builds.
+FilterKey = Tuple[str, Tuple[str, ...]]
+
+_OPERATORS = {
+    "ne": FilterOperator.NE,
+    "in": FilterOperator.IN,
+}
+
+
+def filters_from_key(filter_key: FilterKey) -> MetadataFilters:
+    op, values = filter_key
+    value = values[0] if op == "ne" else list(values)
+    return MetadataFilters(
+        filters=[MetadataFilter(key="type", operator=_OPERATORS[op], value=value)]
+    )
+
+
+def _default_vector_store_factory(registry: "RetrieverRegistry", index_name: str):
+    if registry.backend == "local":
+        from retrieval.local_vector_store import LocalVectorStore
+
+        return LocalVectorStore(registry.local_index(index_name))
+
+    from retrieval.async_pinecone import AsyncPineconeVectorStore
+
+    return AsyncPineconeVectorStore(
+        pinecone_index=registry.pinecone_index(index_name),
+        host=registry.pinecone_host(index_name),
+    )
+
+
+def _default_embed_model_factory(model: str):
+    from llama_index.embeddings.openai import OpenAIEmbedding
+
+    return OpenAIEmbedding(model=model)
+
+
+class RetrieverRegistry:
+    """
+    Caches Pinecone clients, vector stores, embedding models, indexes and
+    retrievers for the lifetime of the process.
+    """
+
+    def __init__(
+        self,
+        vector_store_factory: Optional[
+            Callable[["RetrieverRegistry", str], BasePydanticVectorStore]
+        ] = None,
+        embed_model_factory: Optional[Callable[[str], BaseEmbedding]] = None,
+        backend: Optional[str] = None,
+        local_index_dir: Optional[os.PathLike | str] = None,
+        mode: Optional[str] = None,
+        lexical_index_dir: Optional[os.PathLike | str] = None,
+        reranker: Optional[str] = None,
+        rerank_candidates: Optional[int] = None,
+        collapse_threads: Optional[bool] = None,
+        thread_window: Optional[int] = None,
+        thread_window_tokens: Optional[int] = None,
+    ):
+        self.backend = backend or os.environ.get("RETRIEVAL_BACKEND", DEFAULT_BACKEND)
+        if self.backend not in ("pinecone", "local"):
+            raise ValueError(f"Unknown RETRIEVAL_BACKEND: {self.backend}")
+        self.local_index_dir = Path(
+            # an empty LOCAL_INDEX_DIR (as in .env.example) means the default
+            local_index_dir or os.environ.get("LOCAL_INDEX_DIR") or DEFAULT_LOCAL_INDEX_DIR
+        )
+        self.mode = mode or os.environ.get("RETRIEVAL_MODE", DEFAULT_MODE)
+        if self.mode not in ("vector", "hybrid"):
+            raise ValueError(f"Unknown RETRIEVAL_MODE: {self.mode}")
+        self.lexical_index_dir = Path(
+            lexical_index_dir or os.environ.get("LEXICAL_INDEX_DIR", DEFAULT_LEXICAL_INDEX_DIR)
+        )
+        self.reranker_spec = reranker or os.environ.get("RERANKER", DEFAULT_RERANKER)
+        self.rerank_candidates = rerank_candidates or int(
+            os.environ.get("RERANK_CANDIDATES", DEFAULT_RERANK_CANDIDATES)
+        )
+        if collapse_threads is None:
+            collapse_threads = os.environ.get("COLLAPSE_THREADS", "1").lower() not in ("0", "false", "no")
+        self.collapse_threads = collapse_threads
+        self.thread_window = (
+            thread_window
+            if thread_window is not None
+            else int(os.environ.get("THREAD_WINDOW", DEFAULT_THREAD_WINDOW))
+        )
+        if thread_window_tokens is None:
+            from retrieval.context_packer import DEFAULT_TOKEN_BUDGET
+
+            thread_window_tokens = int(os.environ.get("THREAD_WINDOW_TOKENS", DEFAULT_TOKEN_BUDGET))
+        self.thread_window_tokens = thread_window_tokens
+        self.doc_store_dir = Path(os.environ.get("DOC_STORE_DIR") or DEFAULT_DOC_STORE_DIR)
+        self.manifest_dir = Path(os.environ.get("INGEST_MANIFEST_DIR") or DEFAULT_MANIFEST_DIR)
+        self._vector_store_factory = vector_store_factory or _default_vector_store_factory
+        self._embed_model_factory = embed_model_factory or _default_embed_model_factory
+        self._lock = threading.RLock()
+        self._pinecone = None
+        self._pinecone_indexes: Dict[str, Any] = {}
+        self._pinecone_hosts: Dict[str, str] = {}
+        self._local_indexes: Dict[Tuple[str, bool], Any] = {}
+        self._lexical_indexes: Dict[Tuple[str, bool], Any] = {}
+        self._doc_stores: Dict[str, Any] = {}
+        self._manifests: Dict[str, Any] = {}
+        self._vector_stores: Dict[str, BasePydanticVectorStore] = {}
+        self._embed_models: Dict[str, BaseEmbedding] = {}
+        self._indexes: Dict[Tuple[str, str], VectorStoreIndex] = {}
+        self._retrievers: Dict[Hashable, BaseRetriever] = {}
+        self._rerankers: Dict[int, Any] = {}
+
+    def _get_or_create(self, cache: dict, key: Hashable, create: Callable[[], Any]):
+        # Fast path without the lock; dict reads are atomic under the GIL.
+        value = cache.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            value = cache.get(key)
+            if value is None:
+                value = create()
+                cache[key] = value
+            return value
+
+    def pinecone_client(self):
+        with self._lock:
+            if self._pinecone is None:
+                from pinecone import Pinecone
+
+                self._pinecone = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
+            return self._pinecone
+
+    def pinecone_index(self, index_name: str, create_if_missing: bool = True):
+        """
+        Returns a connected `pinecone.Index`, creating the index on first use.
+        `list_indexes()` is only called the first time a name is requested.
+        """
+
+        def create():
+            from pinecone import ServerlessSpec
+
+            pc = self.pinecone_client()
+            if create_if_missing and index_name not in pc.list_indexes().names():
+                spec = ServerlessSpec(cloud="aws", region="us-east-1")
+                pc.create_index(index_name, dimension=1536, metric="cosine", spec=spec)
+                # wait for index to be initialized
+                while not pc.describe_index(index_name).status["ready"]:
+                    time.sleep(1)
+            return pc.Index(index_name)
+
+        return self._get_or_create(self._pinecone_indexes, index_name, create)
+
+    def pinecone_host(self, index_name: str) -> str:
+        """Data-plane host of an index, for the async query client."""
+        self.pinecone_index(index_name)
+        return self._get_or_create(
+            self._pinecone_hosts,
+            index_name,
+            lambda: self.pinecone_client().describe_index(index_name).host,
+        )
+
+    def _ann_config(self):
+        from retrieval.hnsw import HNSWConfig
+
+        # LOCAL_INDEX_ANN=hnsw builds an HNSW graph for large segments
+        return HNSWConfig.from_env() if os.environ.get("LOCAL_INDEX_ANN") == "hnsw" else None
+
+    def local_index(self, index_name: str, readonly: bool = True):
+        """
+        The local memory-mapped store. Read-only views map the segments
+        without copying and pick up segments appended by later ingests.
+        """
+        from retrieval.segment_store import SegmentStore
+
+        return self._get_or_create(
+            self._local_indexes,
+            (index_name, readonly),
+            lambda: SegmentStore(
+                self.local_index_dir / index_name,
+                readonly=readonly,
+                ann=self._ann_config(),
+                # "int8" or "pq" stores compressed codes next to the float rows
+                quantization=os.environ.get("LOCAL_INDEX_QUANTIZATION", "none"),
+            ),
+        )
+
+    def vector_index(self, index_name: str, readonly: bool = False):
+        """
+        The raw index for the configured backend. Both kinds support
+        `upsert`, `delete`, `fetch` and `query` with Pinecone semantics;
+        ingestion asks for a writable one, query paths for a read-only one.
+        """
+        if self.backend == "local":
+            return self.local_index(index_name, readonly=readonly)
+        return self.pinecone_index(index_name)
+
+    def lexical_index(self, index_name: str, readonly: bool = True):
+        """
+        The BM25 index over the same chunks as `index_name`. Ingestion
+        upserts into a writable one alongside the vector index.
+        """
+        from retrieval.bm25 import BM25Index
+
+        return self._get_or_create(
+            self._lexical_indexes,
+            (index_name, readonly),
+            lambda: BM25Index(self.lexical_index_dir / f"{index_name}.sqlite3", readonly=readonly),
+        )
+
+    def doc_store(self, index_name: str):
+        """Chunk text for `index_name`, keyed by vector id."""
+        from retrieval.doc_store import DEFAULT_MAX_ENTRIES, DocStore
+
+        return self._get_or_create(
+            self._doc_stores,
+            index_name,
+            lambda: DocStore(
+                self.doc_store_dir / f"{index_name}.sqlite3",
+                max_entries=int(os.environ.get("DOC_STORE_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+            ),
+        )
+
+    def manifest(self, index_name: str):
+        """The ingestion manifest for `index_name`."""
+        from retrieval.manifest import IngestManifest
+
+        return self._get_or_create(
+            self._manifests,
+            index_name,
+            lambda: IngestManifest(self.manifest_dir / f"{index_name}.sqlite3"),
+        )
+
+    def vector_store(self, index_name: str) -> BasePydanticVectorStore:
+        return self._get_or_create(
+            self._vector_stores,
+            index_name,
+            lambda: self._vector_store_factory(self, index_name),
+        )
+
+    def embed_model(self, model: str = DEFAULT_EMBED_MODEL) -> BaseEmbedding:
+        return self._get_or_create(
+            self._embed_models, model, lambda: self._embed_model_factory(model)
+        )
+
+    def index(self, index_name: str, model: str = DEFAULT_EMBED_MODEL) -> VectorStoreIndex:
+        return self._get_or_create(
+            self._indexes,
+            (index_name, model),
+            lambda: VectorStoreIndex.from_vector_store(
+                self.vector_store(index_name), embed_model=self.embed_model(model)
+            ),
+        )
+
+    def reranker(self, top_k: int = DEFAULT_TOP_K):
+        """The configured reranker keeping `top_k` nodes, or None when disabled."""
+        if self.reranker_spec in ("", "none"):
+            return None
+        from retrieval.rerank import load_reranker
+
+        return self._get_or_create(
+            self._rerankers, top_k, lambda: load_reranker(self.reranker_spec, top_k)
+        )
+
+    def retriever(
+        self,
+        index_name: str,
+        filter_key: FilterKey,
+        model: str = DEFAULT_EMBED_MODEL,
+        top_k: int = DEFAULT_TOP_K,
+    ) -> BaseRetriever:
+        def create():
+            store = self.vector_store(index_name)
+            # neighbours are fetched by id, which injected stores need not support
+            collapse = self.collapse_threads and hasattr(store, "fetch_metadata")
+            if self.collapse_threads and not collapse:
+                logger.warning(
+                    "%s has no fetch_metadata; thread collapsing is off for %s",
+                    type(store).__name__,
+                    index_name,
+                )
+            over_fetch = max(top_k, self.rerank_candidates)
+            # collapsing merges hits, so the reranker then hands on every candidate, in order
+            keep = over_fetch if collapse else top_k
+            reranker = self.reranker(keep)
+            # over-fetch when a reranker or the collapser picks the final top_k
+            fetch = over_fetch if reranker is not None or collapse else top_k
+            if self.mode == "hybrid":
+                from retrieval.hybrid import DEFAULT_CANDIDATES, HybridRetriever
+
+                candidates = max(fetch, DEFAULT_CANDIDATES)
+                vector = self.index(index_name, model).as_retriever(
+                    similarity_top_k=candidates, filters=filters_from_key(filter_key)
+                )
+                retriever = HybridRetriever(
+                    vector, self.lexical_index(index_name), filter_key, fetch, candidates
+                )
+            else:
+                retriever = self.index(index_name, model).as_retriever(
+                    similarity_top_k=fetch, filters=filters_from_key(filter_key)
+                )
+            from retrieval.hydrate import HydratingRetriever
+
+            docs = self.doc_store(index_name)
+            if reranker is not None:
+                from retrieval.rerank import RerankingRetriever
+
+                # rerankers score text, so the candidates are hydrated first
+                retriever = RerankingRetriever(HydratingRetriever(retriever, docs), reranker, keep)
+            if collapse:
+                from retrieval.threads import ThreadCollapser
+
+                retriever = ThreadCollapser(
+                    retriever,
+                    store.fetch_metadata,
+                    store.afetch_metadata,
+                    top_k,
+                    self.thread_window,
+                    texts=docs.get_many,
+                    max_tokens=self.thread_window_tokens,
+                )
+            # no-op for nodes that already have text
+            return HydratingRetriever(retriever, docs)
+
+        return self._get_or_create(
+            self._retrievers, (index_name, model, filter_key, top_k), create
+        )
+
+    def warm(self, index_name: str, filter_keys, model: str = DEFAULT_EMBED_MODEL):
+        """Builds every retriever up front, e.g. from the app's lifespan hook."""
+        for filter_key in filter_keys:
+            self.retriever(index_name, filter_key, model)
+        if self.mode == "hybrid":
+            # load the postings now rather than on the first query
+            self.lexical_index(index_name).search("", 1)
+
+    def clear(self):
+        with self._lock:
+            self._pinecone_indexes.clear()
+            self._pinecone_hosts.clear()
+            self._local_indexes.clear()
+            self._lexical_indexes.clear()
+            self._doc_stores.clear()
+            self._manifests.clear()
+            self._vector_stores.clear()
+            self._embed_models.clear()
+            self._indexes.clear()
+            self._retrievers.clear()
+            self._rerankers.clear()
+
+
+_registry: Optional[RetrieverRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> RetrieverRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = RetrieverRegistry()
+    return _registry
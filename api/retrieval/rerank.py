@@ -0,0 +1,218 @@
+"""Reranking stage between vector retrieval and the LLM.
+
+The registry over-fetches `RERANK_CANDIDATES` nodes and a reranker keeps
+the best `top_k`, so good hits at rank 6-20 are no longer lost. Rerankers
+are llama_index `BaseNodePostprocessor`s, so heavier scorers
+(`SentenceTransformerRerank`, `CohereRerank`, `LLMRerank`, ...) plug in
+unchanged via `RERANKER=package.module:factory`. The default,
+`LexicalReranker`, needs no model: it blends the first-stage score with
+query-term coverage, exact identifier matches and title matches, and
+costs a few milliseconds for 20 candidates.
+
+Per-query latency of the first stage and of reranking is kept in
+`retrieval_latency()` so the candidate count can be traded against the
+p95 retrieval budget.
+"""
+
+import asyncio
+import importlib
+import math
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Deque, Dict, List, Optional
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from retrieval.bm25 import identifiers, tokenize
+
+TITLE_KEYS = ("thread_name", "title")
+
+# model-backed rerankers run here from the async path, off the event loop
+_rerank_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rerank")
+
+
+class LatencyStats:
+    """Rolling per-stage latencies (ms) over the last `window` queries."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, stage: str, ms: float):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self._window)).append(ms)
+
+    def percentile(self, stage: str, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        return _percentile(samples, p)
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        with self._lock:
+            snapshot = {stage: sorted(samples) for stage, samples in self._samples.items()}
+        return {
+            stage: {
+                "count": len(samples),
+                "p50": _percentile(samples, 50),
+                "p95": _percentile(samples, 95),
+                "max": samples[-1] if samples else None,
+            }
+            for stage, samples in snapshot.items()
+        }
+
+
+def _percentile(sorted_samples: List[float], p: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, math.ceil(p / 100 * len(sorted_samples)) - 1)]
+
+
+_latency = LatencyStats()
+
+
+def retrieval_latency() -> LatencyStats:
+    return _latency
+
+
+class LexicalReranker(BaseNodePostprocessor):
+    """
+    Scores each candidate as a weighted sum of features in [0, 1]:
+
+    - the first-stage score, min-max normalized over the candidates;
+    - coverage of the query's terms, each weighted by how rare it is among
+      the candidates (a local IDF, so no corpus statistics are needed);
+    - the fraction of the query's identifiers (`b.FormulateAnswer`,
+      `baml-py`, `--watch`) found verbatim in the text;
+    - coverage of the query's terms by the thread name / page title.
+    """
+
+    top_n: int = 5
+    vector_weight: float = 0.45
+    coverage_weight: float = 0.35
+    identifier_weight: float = 0.15
+    title_weight: float = 0.05
+
+    # cheap enough to run inline on the event loop
+    inline: bool = True
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LexicalReranker"
+
+    def _postprocess_nodes(
+        self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        if query_bundle is None or not nodes:
+            return nodes[: self.top_n]
+        query_terms = set(tokenize(query_bundle.query_str))
+        query_identifiers = set(identifiers(query_bundle.query_str))
+
+        texts = [hit.node.get_content() for hit in nodes]
+        node_terms = [set(tokenize(text)) for text in texts]
+        document_frequency = Counter(term for terms in node_terms for term in terms & query_terms)
+        weights = {t: math.log(1 + len(nodes) / (1 + document_frequency[t])) for t in query_terms}
+        total_weight = sum(weights.values()) or 1.0
+
+        scores = [hit.score or 0.0 for hit in nodes]
+        low, high = min(scores), max(scores)
+        spread = (high - low) or 1.0
+
+        reranked = []
+        for hit, text, terms, score in zip(nodes, texts, node_terms, scores):
+            coverage = sum(w for t, w in weights.items() if t in terms) / total_weight
+            lowered = text.lower()
+            exact = (
+                sum(1 for ident in query_identifiers if ident in lowered) / len(query_identifiers)
+                if query_identifiers
+                else 0.0
+            )
+            title = " ".join(str(hit.node.metadata.get(key, "")) for key in TITLE_KEYS)
+            title_terms = set(tokenize(title))
+            title_coverage = len(query_terms & title_terms) / len(query_terms) if query_terms else 0.0
+            combined = (
+                self.vector_weight * (score - low) / spread
+                + self.coverage_weight * coverage
+                + self.identifier_weight * exact
+                + self.title_weight * title_coverage
+            )
+            reranked.append(NodeWithScore(node=hit.node, score=combined))
+        reranked.sort(key=lambda hit: hit.score, reverse=True)
+        return reranked[: self.top_n]
+
+
+def load_reranker(spec: str, top_n: int) -> Optional[BaseNodePostprocessor]:
+    """
+    "none", "lexical", or "package.module:factory" for any callable taking
+    `top_n` and returning a `BaseNodePostprocessor`.
+    """
+    if spec in ("", "none"):
+        return None
+    if spec == "lexical":
+        return LexicalReranker(top_n=top_n)
+    module, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"Unknown RERANKER: {spec}")
+    return getattr(importlib.import_module(module), attr)(top_n=top_n)
+
+
+def _has_async_postprocess(reranker: BaseNodePostprocessor) -> bool:
+    """Whether `reranker` implements llama_index's async hooks rather than inheriting the sync fallback."""
+    cls = type(reranker)
+    # llama_index < 0.12 has no async postprocessor API at all
+    return any(
+        getattr(cls, name, None) is not None and getattr(cls, name) is not getattr(BaseNodePostprocessor, name, None)
+        for name in ("apostprocess_nodes", "_apostprocess_nodes")
+    )
+
+
+class RerankingRetriever(BaseRetriever):
+    """Over-fetches from `retriever` and keeps the reranker's best `top_k`."""
+
+    def __init__(
+        self,
+        retriever: BaseRetriever,
+        reranker: BaseNodePostprocessor,
+        top_k: int,
+        stats: Optional[LatencyStats] = None,
+    ):
+        super().__init__()
+        self._retriever = retriever
+        self._reranker = reranker
+        self._top_k = top_k
+        self._stats = stats or retrieval_latency()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        start = time.perf_counter()
+        candidates = self._retriever.retrieve(query_bundle)
+        fetched = time.perf_counter()
+        reranked = self._reranker.postprocess_nodes(candidates, query_bundle)
+        self._record(start, fetched, time.perf_counter())
+        return reranked[: self._top_k]
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        start = time.perf_counter()
+        candidates = await self._retriever.aretrieve(query_bundle)
+        fetched = time.perf_counter()
+        if getattr(self._reranker, "inline", False):
+            reranked = self._reranker.postprocess_nodes(candidates, query_bundle)
+        elif _has_async_postprocess(self._reranker):
+            reranked = await self._reranker.apostprocess_nodes(candidates, query_bundle)
+        else:
+            # inherited async hooks only wrap the sync scorer; run it on the bounded rerank pool
+            loop = asyncio.get_running_loop()
+            reranked = await loop.run_in_executor(
+                _rerank_pool, partial(self._reranker.postprocess_nodes, candidates, query_bundle)
+            )
+        self._record(start, fetched, time.perf_counter())
+        return reranked[: self._top_k]
+
+    def _record(self, start: float, fetched: float, done: float):
+        self._stats.record("retrieve", (fetched - start) * 1000)
+        self._stats.record("rerank", (done - fetched) * 1000)
+        self._stats.record("total", (done - start) * 1000)
@@ -0,0 +1,679 @@
+"""Memory-mapped, segment-based on-disk vector store.
+
+Layout of a store directory:
+
+    MANIFEST.json        live segments, tombstones, dimension, dtype, quantizer
+    quantizer-000001.npz optional int8 ranges or PQ codebooks shared by every segment's codes
+    seg-000001/
+        vectors.bin      4 KiB header page, then rows x dimension vectors
+        records.bin      one compact JSON record ({"id", "metadata"}) per row
+        records.idx      uint64 byte offsets into records.bin (rows + 1)
+        hnsw.npz         optional faiss HNSW graph over this segment's rows
+        codes.npy        optional int8 or PQ codes (quantization.py), memmapped
+
+Every flush of upserts appends a new immutable segment; rows are sorted by
+metadata `type` within a segment so each type is a contiguous slice,
+recorded in the header. Vectors are opened with `np.memmap` directly on the page-aligned
+data, so every worker process shares the OS page cache and opening a store
+deserializes nothing but the manifest. Records are decoded only for the
+final hits. Deletes and overwrites are tombstones in the manifest until
+a tiered merge (or `compact()`) rewrites the live rows.
+
+Searches run on a snapshot of the segment list taken under the lock and
+hold a reference on each segment, so a concurrent reload or merge only
+retires a segment (closed when its last search releases it). Files of
+merged segments and replaced codebooks are listed in the manifest's
+`garbage` and deleted by a later write once GARBAGE_GRACE_SECONDS have
+passed, so a reader that has just read an older manifest can still open
+them.
+
+With quantization enabled, the quantizer is trained once on a sample of
+the whole store, by `compact()` or by the first merge of at least
+MIN_TRAINING_ROWS rows, and every later segment is encoded with them.
+Queries scan the compact codes of encoded segments first and only touch
+the float rows of the best candidates for exact rescoring.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from retrieval.hnsw import HNSWConfig, HNSWIndex
+from retrieval.local_index import (
+    DEFAULT_DIMENSION,
+    UNTYPED,
+    SearchHits,
+    normalize_rows,
+    topk_rows,
+    types_for_filter,
+)
+from retrieval.quantization import (
+    Quantizer,
+    make_quantizer,
+    quantizer_from_arrays,
+    two_stage_search,
+)
+
+MAGIC = b"NRAGSEG1"
+PAGE_SIZE = 4096
+MANIFEST = "MANIFEST.json"
+# upserted rows held in memory before they are written as a segment
+DEFAULT_BUFFER_ROWS = 4096
+# segments of a size tier merged at once
+DEFAULT_MERGE_FACTOR = 4
+# quantized search rescores top_k * DEFAULT_RESCORE_FACTOR candidates exactly
+# rows a merge needs before it trains the store's first codebooks
+MIN_TRAINING_ROWS = 4096
+DEFAULT_RESCORE_FACTOR = 10
+# merged segment files outlive the manifest that dropped them by this long
+GARBAGE_GRACE_SECONDS = 300.0
+# attempts to open a manifest whose segments a concurrent writer removed
+_RELOAD_ATTEMPTS = 3
+
+
+def _write_json_atomic(path: Path, data: Any):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Segment:
+    """One immutable segment, opened read-only."""
+
+    def __init__(self, path: Path, ann: Optional[HNSWConfig] = None):
+        self.path = path
+        with open(path / "vectors.bin", "rb") as f:
+            page = f.read(PAGE_SIZE)
+        if page[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a vector segment")
+        header = json.loads(page[len(MAGIC) :].rstrip(b"\0"))
+        self.rows: int = header["rows"]
+        self.dimension: int = header["dimension"]
+        self.dtype = np.dtype(header["dtype"])
+        self.partitions: Dict[str, Tuple[int, int]] = {
+            type: (start, end) for type, (start, end) in header["partitions"].items()
+        }
+        if self.rows:
+            self.vectors = np.memmap(
+                path / "vectors.bin", dtype=self.dtype, mode="r", offset=PAGE_SIZE, shape=(self.rows, self.dimension)
+            )
+            self._offsets = np.memmap(path / "records.idx", dtype=np.uint64, mode="r")
+        else:
+            self.vectors = np.empty((0, self.dimension), dtype=self.dtype)
+            self._offsets = np.zeros(1, dtype=np.uint64)
+        self._records = open(path / "records.bin", "rb")
+        self._records_lock = threading.Lock()
+        # searches holding this segment; a retired segment closes when the last one releases it
+        self._refs = 0
+        self._retired = False
+        self.graph: Optional[HNSWIndex] = None
+        if ann is not None and (path / "hnsw.npz").exists():
+            self.graph = HNSWIndex.load(path / "hnsw.npz", ann)
+        self.codes: Optional[np.ndarray] = None
+        if (path / "codes.npy").exists():
+            self.codes = np.load(path / "codes.npy", mmap_mode="r")
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    def record(self, row: int) -> Dict[str, Any]:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        with self._records_lock:
+            self._records.seek(start)
+            return json.loads(self._records.read(end - start))
+
+    def records(self) -> Iterable[Dict[str, Any]]:
+        with open(self.path / "records.bin", "rb") as f:
+            data = f.read()
+        for row in range(self.rows):
+            yield json.loads(data[int(self._offsets[row]) : int(self._offsets[row + 1])])
+
+    def slices(self, types: Optional[Collection[str]]) -> List[Tuple[int, int]]:
+        if types is None:
+            return [(0, self.rows)]
+        return [self.partitions[t] for t in types if t in self.partitions]
+
+    def acquire(self):
+        with self._records_lock:
+            self._refs += 1
+
+    def release(self):
+        with self._records_lock:
+            self._refs -= 1
+            if self._retired and self._refs == 0:
+                self._records.close()
+
+    def retire(self):
+        """Closes the segment now, or when the last search holding it releases it."""
+        with self._records_lock:
+            self._retired = True
+            if self._refs == 0:
+                self._records.close()
+
+    def close(self):
+        self._records.close()
+
+    @staticmethod
+    def write(
+        path: Path,
+        items: Sequence[Dict[str, Any]],
+        dimension: int,
+        ann: Optional[HNSWConfig] = None,
+        quantizer: Optional[Quantizer] = None,
+    ):
+        """
+        Writes `items` (Pinecone-style {"id", "values", "metadata"}) as a
+        new segment at `path`. Vectors are normalized on the way in, and
+        encoded with `quantizer` if given. Returns the ids in row order.
+        """
+        items = sorted(items, key=lambda item: ((item.get("metadata") or {}).get("type", UNTYPED), item["id"]))
+        partitions: Dict[str, List[int]] = {}
+        for row, item in enumerate(items):
+            type = (item.get("metadata") or {}).get("type", UNTYPED)
+            partitions.setdefault(type, [row, row])[1] = row + 1
+
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        header = json.dumps(
+            {"rows": len(items), "dimension": dimension, "dtype": "float32", "partitions": partitions}
+        ).encode()
+        if len(MAGIC) + len(header) > PAGE_SIZE:
+            raise ValueError("Segment header does not fit in one page")
+        vectors = (
+            normalize_rows(np.array([item["values"] for item in items], dtype=np.float32))
+            if items
+            else np.empty((0, dimension), dtype=np.float32)
+        )
+        if vectors.shape[1] != dimension:
+            raise ValueError(f"Expected dimension {dimension}, got {vectors.shape[1]}")
+        with open(tmp / "vectors.bin", "wb") as f:
+            f.write((MAGIC + header).ljust(PAGE_SIZE, b"\0"))
+            f.write(np.ascontiguousarray(vectors).tobytes())
+
+        offsets = [0]
+        with open(tmp / "records.bin", "wb") as f:
+            for item in items:
+                record = json.dumps(
+                    {"id": item["id"], "metadata": item.get("metadata") or {}},
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                ).encode("utf-8")
+                f.write(record)
+                offsets.append(offsets[-1] + len(record))
+        np.array(offsets, dtype=np.uint64).tofile(tmp / "records.idx")
+
+        if ann is not None and len(items) > ann.exact_threshold:
+            graph = HNSWIndex(dimension, ann)
+            for row, item in enumerate(items):
+                graph.add(str(row), vectors[row], (item.get("metadata") or {}).get("type", UNTYPED))
+            graph.save(tmp / "hnsw.npz")
+
+        if quantizer is not None and items:
+            np.save(tmp / "codes.npy", quantizer.encode(vectors))
+
+        os.replace(tmp, path)
+        return [item["id"] for item in items]
+
+
+class SegmentStore:
+    """
+    Append-only store of memory-mapped segments with the subset of the
+    Pinecone `Index` API the ingest scripts and `retrieve` use: `upsert`,
+    `delete`, `fetch` and `query`.
+
+    Writers buffer upserts in memory and write them as one segment once
+    `buffer_rows` are pending, on `flush()`/`close()`, or before a read, so
+    an ingest run of 100-item upserts produces a few large segments.
+    Segments are merged by size tier: once `merge_factor` segments hold a
+    similar number of live rows (the same power of `merge_factor`), they are
+    rewritten as one, so each row is rewritten O(log n) times overall.
+
+    Readers (`readonly=True`) re-open the manifest when it changes on disk,
+    so a serving process picks up segments appended by an ingest run.
+    """
+
+    def __init__(
+        self,
+        path: os.PathLike | str,
+        dimension: int = DEFAULT_DIMENSION,
+        readonly: bool = False,
+        ann: Optional[HNSWConfig] = None,
+        quantization: str = "none",
+        rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+        buffer_rows: int = DEFAULT_BUFFER_ROWS,
+        merge_factor: int = DEFAULT_MERGE_FACTOR,
+    ):
+        self.path = Path(path)
+        self.readonly = readonly
+        self.ann = ann
+        # make_quantizer fails early on an unknown kind
+        self.quantization = quantization if make_quantizer(quantization, dimension) is not None else "none"
+        self.rescore_factor = rescore_factor
+        self.buffer_rows = buffer_rows
+        self.merge_factor = merge_factor
+        self._lock = threading.RLock()
+        self._manifest_version: Optional[Tuple[int, int]] = None
+        self._segments: List[Segment] = []
+        self._deleted: Dict[str, np.ndarray] = {}
+        # id -> (segment name, row), built lazily and then kept up to date by this writer
+        self._locations: Optional[Dict[str, Tuple[str, int]]] = None
+        # upserted items not yet written to a segment, by id
+        self._buffer: Dict[str, Dict[str, Any]] = {}
+        self._quantizer: Optional[Quantizer] = None
+        self._quantizer_name: Optional[str] = None
+        self._manifest: Dict[str, Any] = {
+            "version": 1,
+            "dimension": dimension,
+            "next_segment": 1,
+            "segments": [],
+            "tombstones": {},
+        }
+        if not readonly:
+            self.path.mkdir(parents=True, exist_ok=True)
+        self._reload(force=True)
+
+    @property
+    def dimension(self) -> int:
+        return self._manifest["dimension"]
+
+    @property
+    def buffered_rows(self) -> int:
+        """Upserted rows held in memory; 0 once everything upserted is on disk."""
+        return len(self._buffer)
+
+    def __len__(self) -> int:
+        self.flush()
+        self._reload()
+        return sum(self._live_rows(seg) for seg in self._segments)
+
+    def _live_rows(self, seg: Segment) -> int:
+        return seg.rows - len(self._manifest["tombstones"].get(seg.name, []))
+
+    def _reload(self, force: bool = False):
+        manifest_path = self.path / MANIFEST
+        try:
+            stat = manifest_path.stat()
+        except FileNotFoundError:
+            return
+        # the manifest is replaced atomically, so a new inode means a new version
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if not force and version == self._manifest_version:
+            return
+        with self._lock:
+            for attempt in range(_RELOAD_ATTEMPTS):
+                if attempt:
+                    stat = manifest_path.stat()
+                    version = (stat.st_ino, stat.st_mtime_ns)
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                opened = {seg.name: seg for seg in self._segments}
+                try:
+                    segments = [
+                        opened.pop(name, None) or Segment(self.path / name, self.ann)
+                        for name in manifest["segments"]
+                    ]
+                    break
+                except FileNotFoundError:
+                    # files of a manifest this old were already collected; read the current one
+                    if attempt == _RELOAD_ATTEMPTS - 1:
+                        raise
+            deleted = {}
+            for seg in segments:
+                rows = manifest["tombstones"].get(seg.name, [])
+                if rows:
+                    mask = np.zeros(seg.rows, dtype=bool)
+                    mask[rows] = True
+                    deleted[seg.name] = mask
+                    if seg.graph is not None:
+                        for row in rows:
+                            seg.graph.delete(str(row))
+            for seg in opened.values():
+                seg.retire()
+            quantizer_name = manifest.get("quantizer")
+            if quantizer_name != self._quantizer_name:
+                self._quantizer = None
+                if quantizer_name is not None:
+                    with np.load(self.path / quantizer_name) as arrays:
+                        self._quantizer = quantizer_from_arrays(arrays)
+                self._quantizer_name = quantizer_name
+            self._manifest = manifest
+            self._segments = segments
+            self._deleted = deleted
+            self._locations = None
+            self._manifest_version = version
+
+    def _collect_garbage(self):
+        """Deletes the files of merged segments once no reader can still be opening them."""
+        garbage = self._manifest.get("garbage", [])
+        expired = [name for name, retired_at in garbage if time.time() - retired_at >= GARBAGE_GRACE_SECONDS]
+        for name in expired:
+            target = self.path / name
+            if target.is_dir():
+                shutil.rmtree(target, ignore_errors=True)
+            else:
+                target.unlink(missing_ok=True)
+        if expired:
+            self._manifest["garbage"] = [entry for entry in garbage if entry[0] not in expired]
+
+    def _save_manifest(self):
+        # the caller has already applied this write to the id map
+        locations = self._locations
+        self._collect_garbage()
+        _write_json_atomic(self.path / MANIFEST, self._manifest)
+        self._reload(force=True)
+        self._locations = locations
+
+    def _id_locations(self) -> Dict[str, Tuple[str, int]]:
+        with self._lock:
+            if self._locations is None:
+                locations = {}
+                for seg in self._segments:
+                    dead = self._deleted.get(seg.name)
+                    for row, record in enumerate(seg.records()):
+                        if dead is None or not dead[row]:
+                            locations[record["id"]] = (seg.name, row)
+                self._locations = locations
+            return self._locations
+
+    def _tombstone(self, ids: Iterable[str]):
+        locations = self._id_locations()
+        tombstones = self._manifest["tombstones"]
+        for id in ids:
+            # popping also drops repeated ids
+            location = locations.pop(id, None)
+            if location is not None:
+                name, row = location
+                tombstones.setdefault(name, []).append(row)
+
+    def _write_segment(self, items: Sequence[Dict[str, Any]]) -> str:
+        """Writes `items` as a new segment and maps their ids to it; the caller saves the manifest."""
+        name = f"seg-{self._manifest['next_segment']:06d}"
+        ids = Segment.write(self.path / name, items, self.dimension, self.ann, self._quantizer)
+        self._manifest["next_segment"] += 1
+        self._manifest["segments"].append(name)
+        locations = self._id_locations()
+        for row, id in enumerate(ids):
+            locations[id] = (name, row)
+        return name
+
+    def upsert(self, vectors: Sequence[Dict[str, Any]], **kwargs):
+        if self.readonly:
+            raise PermissionError("Vector store was opened read-only")
+        with self._lock:
+            # last write wins, within a batch and across buffered batches
+            for item in vectors:
+                values = np.asarray(item["values"], dtype=np.float32)
+                if values.shape != (self.dimension,):
+                    raise ValueError(f"Expected dimension {self.dimension}, got {values.shape}")
+                self._buffer.pop(item["id"], None)
+                self._buffer[item["id"]] = {**item, "values": values}
+            if len(self._buffer) >= self.buffer_rows:
+                self.flush()
+        return {"upserted_count": len(vectors)}
+
+    def flush(self):
+        """Writes the buffered upserts as one segment, then merges full size tiers."""
+        with self._lock:
+            if not self._buffer:
+                return
+            items = list(self._buffer.values())
+            self._reload()
+            self._tombstone(self._buffer)
+            self._write_segment(items)
+            self._buffer = {}
+            self._save_manifest()
+            self._merge_tiers()
+
+    def delete(self, ids: Sequence[str], **kwargs):
+        if self.readonly:
+            raise PermissionError("Vector store was opened read-only")
+        with self._lock:
+            for id in ids:
+                self._buffer.pop(id, None)
+            self._reload()
+            self._tombstone(ids)
+            self._save_manifest()
+
+    def _tier(self, rows: int) -> int:
+        tier = 0
+        while rows >= self.merge_factor:
+            rows //= self.merge_factor
+            tier += 1
+        return tier
+
+    def _merge_tiers(self):
+        while True:
+            tiers: Dict[int, List[str]] = {}
+            for seg in self._segments:
+                tiers.setdefault(self._tier(self._live_rows(seg)), []).append(seg.name)
+            # segments with no live rows are dropped by any merge
+            empty = [seg.name for seg in self._segments if self._live_rows(seg) == 0]
+            full = [names for _, names in sorted(tiers.items()) if len(names) >= self.merge_factor]
+            if full:
+                self._merge(set(full[0]) | set(empty))
+            elif empty:
+                self._merge(set(empty))
+            else:
+                return
+
+    def _train(self, items: Sequence[Dict[str, Any]]):
+        """Trains the store's codebooks on `items`; every segment written afterwards is encoded with them."""
+        quantizer = make_quantizer(self.quantization, self.dimension)
+        quantizer.fit(np.stack([item["values"] for item in items]))
+        name = f"quantizer-{self._manifest['next_segment']:06d}.npz"
+        np.savez(self.path / name, **quantizer.to_arrays())
+        self._quantizer, self._quantizer_name = quantizer, name
+        self._manifest["quantizer"] = name
+
+    def _merge(self, names: Collection[str], retrain: bool = False):
+        """
+        Rewrites the live rows of segments `names` into one new segment.
+        `retrain` (for a merge of every segment) trains fresh codebooks
+        first; otherwise a merge of MIN_TRAINING_ROWS rows trains the first.
+        """
+        with self._lock:
+            items = []
+            for seg in self._segments:
+                if seg.name not in names:
+                    continue
+                dead = self._deleted.get(seg.name)
+                for row, record in enumerate(seg.records()):
+                    if dead is None or not dead[row]:
+                        items.append({**record, "values": np.asarray(seg.vectors[row], dtype=np.float32)})
+            self._manifest["segments"] = [name for name in self._manifest["segments"] if name not in names]
+            for name in names:
+                self._manifest["tombstones"].pop(name, None)
+            previous = self._quantizer_name
+            if self.quantization != "none" and items:
+                if retrain or (self._quantizer is None and len(items) >= MIN_TRAINING_ROWS):
+                    self._train(items)
+            if items:
+                self._write_segment(items)
+            garbage = self._manifest.setdefault("garbage", [])
+            garbage.extend([name, time.time()] for name in names)
+            if previous is not None and previous != self._quantizer_name:
+                garbage.append([previous, time.time()])
+            self._save_manifest()
+
+    def compact(self):
+        """
+        Rewrites all live rows into one segment and drops the old ones,
+        retraining the codebooks over the whole store when quantized.
+        """
+        if self.readonly:
+            raise PermissionError("Vector store was opened read-only")
+        with self._lock:
+            self.flush()
+            self._reload()
+            self._merge([seg.name for seg in self._segments], retrain=True)
+
+    def fetch(self, ids: Sequence[str], **kwargs) -> Dict[str, Any]:
+        self.flush()
+        self._reload()
+        # the id map and the segments it points into must come from the same manifest
+        with self._lock:
+            segments = {seg.name: seg for seg in self._segments}
+            locations = self._id_locations()
+            vectors = {}
+            for id in ids:
+                if id in locations:
+                    name, row = locations[id]
+                    seg = segments[name]
+                    vectors[id] = {
+                        "id": id,
+                        "values": np.asarray(seg.vectors[row], dtype=np.float32).tolist(),
+                        "metadata": seg.record(row)["metadata"],
+                    }
+        return {"vectors": vectors}
+
+    def partitions(self) -> Dict[str, int]:
+        """Live-or-dead row counts per type across all segments."""
+        self.flush()
+        self._reload()
+        counts: Dict[str, int] = {}
+        for seg in self._segments:
+            for type, (start, end) in seg.partitions.items():
+                counts[type] = counts.get(type, 0) + end - start
+        return counts
+
+    def _acquire(self) -> Tuple[List[Segment], Dict[str, np.ndarray], Optional[Quantizer]]:
+        """The current segments (each held until `_release`), tombstone masks and quantizer."""
+        with self._lock:
+            segments = list(self._segments)
+            for seg in segments:
+                seg.acquire()
+            return segments, self._deleted, self._quantizer
+
+    @staticmethod
+    def _release(segments: List[Segment]):
+        for seg in segments:
+            seg.release()
+
+    def _search_segment(
+        self,
+        seg: Segment,
+        queries: np.ndarray,
+        top_k: int,
+        types: Optional[Collection[str]],
+        dead: Optional[np.ndarray],
+        quantizer: Optional[Quantizer],
+    ) -> List[List[Tuple[float, int]]]:
+        slices = seg.slices(types)
+        if seg.graph is not None and sum(end - start for start, end in slices) > seg.graph.config.exact_threshold:
+            return [
+                [(score, int(row)) for row, score in hits]
+                for hits in seg.graph.search_many(queries, top_k, types=types)
+            ]
+        per_query: List[List[Tuple[float, int]]] = [[] for _ in range(len(queries))]
+        for start, end in slices:
+            mask = dead[start:end] if dead is not None else None
+            if seg.codes is not None and quantizer is not None:
+                rows, top = two_stage_search(
+                    quantizer,
+                    seg.codes[start:end],
+                    seg.vectors[start:end],
+                    queries,
+                    top_k,
+                    rescore=top_k * self.rescore_factor,
+                    mask=mask,
+                )
+            else:
+                scores = np.asarray(seg.vectors[start:end] @ queries.T, dtype=np.float32)
+                if mask is not None:
+                    scores[mask] = -np.inf
+                rows, top = topk_rows(scores, top_k)
+            for q in range(len(queries)):
+                per_query[q].extend(
+                    (score, row + start)
+                    for row, score in zip(rows[:, q].tolist(), top[:, q].tolist())
+                    if score != -np.inf
+                )
+        return per_query
+
+    def search_records(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        types: Optional[Collection[str]] = None,
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Batched search over every live segment. Returns, per query, the
+        decoded {"id", "metadata"} record and cosine similarity of each hit.
+        """
+        self.flush()
+        self._reload()
+        queries = normalize_rows(np.atleast_2d(queries))
+        candidates: List[List[Tuple[float, Segment, int]]] = [[] for _ in range(len(queries))]
+        segments, deleted, quantizer = self._acquire()
+        try:
+            for seg in segments:
+                hits_per_query = self._search_segment(seg, queries, top_k, types, deleted.get(seg.name), quantizer)
+                for q, hits in enumerate(hits_per_query):
+                    candidates[q].extend((score, seg, row) for score, row in hits)
+            results = []
+            for hits in candidates:
+                hits.sort(key=lambda hit: -hit[0])
+                results.append([(seg.record(row), score) for score, seg, row in hits[:top_k]])
+        finally:
+            self._release(segments)
+        return results
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        types: Optional[Collection[str]] = None,
+    ) -> List[SearchHits]:
+        """
+        Batched search. `queries` is (q, dimension) or (dimension,); `types`
+        limits the scan to those partitions. Returns one hit list per query
+        of (id, cosine similarity), best first.
+        """
+        return [
+            [(record["id"], score) for record, score in hits]
+            for hits in self.search_records(queries, top_k, types)
+        ]
+
+    def metadata(self, id: str) -> Dict[str, Any]:
+        return self.fetch([id])["vectors"][id]["metadata"]
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 10,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """Pinecone-compatible single-vector query."""
+        types = types_for_filter(filter, self.partitions())
+        hits = self.search_records(np.asarray(vector, dtype=np.float32), top_k, types)[0]
+        matches = []
+        for record, score in hits:
+            match: Dict[str, Any] = {"id": record["id"], "score": score}
+            if include_metadata:
+                match["metadata"] = record["metadata"]
+            matches.append(match)
+        if include_values:
+            fetched = self.fetch([m["id"] for m in matches])["vectors"]
+            for match in matches:
+                match["values"] = fetched[match["id"]]["values"]
+        return {"matches": matches}
+
+    def close(self):
+        self.flush()
+        for seg in self._segments:
+            seg.close()
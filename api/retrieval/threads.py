@@ -0,0 +1,180 @@
+"""Chunk ids for Discord threads and thread-collapsing retrieval.
+
+ingest_threads.py stores each thread as consecutive message chunks with
+ids `channel_id/thread_id/chunk_index`, each carrying its own messages
+plus the few it repeats from the previous chunk (see chunking.py).
+At query time several chunks of one thread often match; `ThreadCollapser`
+keeps the best-ranked one per thread and expands it to a bounded window of
+`window` neighbouring chunks on each side, fetched by id. One long thread
+therefore yields one result of at most `2 * window + 1` chunks instead of
+the whole thread (or several overlapping hits). With `max_tokens`, the
+window grows from the hit one neighbour at a time, earlier side first, only
+while the merged text stays within that many tokens, so an expanded hit
+still fits the context budget it is packed into (see context_packer.py).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from retrieval.chunking import MESSAGE_SEPARATOR
+from retrieval.context_packer import token_counter
+
+TEXT_KEY = "text"
+DEFAULT_WINDOW = 1
+# chunk-level keys that stop describing the result once a window is merged
+_CHUNK_KEYS = ("chunk_index", "message_start", "message_end")
+
+FetchFn = Callable[[Sequence[str]], Dict[str, Dict[str, Any]]]
+AsyncFetchFn = Callable[[Sequence[str]], Awaitable[Dict[str, Dict[str, Any]]]]
+# chunk id -> text, for chunks whose vector metadata carries no text (see doc_store.py)
+TextsFn = Callable[[Sequence[str]], Dict[str, str]]
+
+
+def chunk_id(channel_id: Any, thread_id: Any, chunk_index: int) -> str:
+    return f"{channel_id}/{thread_id}/{chunk_index}"
+
+
+def merge_window(chunks: Sequence[Tuple[str, Dict[str, Any]]]) -> str:
+    """
+    Joins consecutive chunks of one thread, dropping the messages a chunk
+    repeats from the previous one (chunking overlap).
+    """
+    texts: List[str] = []
+    previous_end = None
+    for text, metadata in chunks:
+        start = metadata.get("message_start")
+        if previous_end is not None and start is not None and previous_end > start:
+            messages = text.split(MESSAGE_SEPARATOR)[previous_end - start :]
+            text = MESSAGE_SEPARATOR.join(messages)
+        if text:
+            texts.append(text)
+        previous_end = metadata.get("message_end")
+    return MESSAGE_SEPARATOR.join(texts)
+
+
+def _chunk_position(metadata: Dict[str, Any]) -> Optional[Tuple[str, str, int, int]]:
+    """(channel_id, thread_id, chunk_index, chunk_count) for thread chunks, else None."""
+    try:
+        return (
+            str(metadata["channel_id"]),
+            str(metadata["thread_id"]),
+            int(metadata["chunk_index"]),
+            int(metadata["chunk_count"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ThreadCollapser(BaseRetriever):
+    """
+    Collapses hits from `retriever` to one per thread, expanded to a window
+    of neighbouring chunks, and returns the first `top_k`. Hits that are not
+    thread chunks (docs, pre-chunking ids) pass through unchanged.
+    """
+
+    def __init__(
+        self,
+        retriever: BaseRetriever,
+        fetch: FetchFn,
+        afetch: AsyncFetchFn,
+        top_k: int,
+        window: int = DEFAULT_WINDOW,
+        texts: Optional[TextsFn] = None,
+        max_tokens: Optional[int] = None,
+    ):
+        super().__init__()
+        self._retriever = retriever
+        self._fetch = fetch
+        self._afetch = afetch
+        self._texts = texts
+        self._top_k = top_k
+        self._window = window
+        self._max_tokens = max_tokens
+
+    def _plan(self, hits: List[NodeWithScore]):
+        """The kept hits and, for thread hits, the chunk ids of their windows."""
+        kept: List[Tuple[NodeWithScore, Optional[List[str]]]] = []
+        threads = set()
+        for hit in hits:
+            position = _chunk_position(hit.node.metadata)
+            if position is None:
+                kept.append((hit, None))
+            else:
+                channel_id, thread_id, index, count = position
+                if (channel_id, thread_id) in threads:
+                    continue
+                threads.add((channel_id, thread_id))
+                window = range(max(0, index - self._window), min(count, index + self._window + 1))
+                kept.append((hit, [chunk_id(channel_id, thread_id, i) for i in window]))
+            if len(kept) == self._top_k:
+                break
+
+        known = {hit.node.node_id: hit.node for hit in hits}
+        missing = [
+            id for _, window in kept if window for id in window if id not in known
+        ]
+        return kept, known, missing
+
+    def _expand(self, kept, known, fetched: Dict[str, Dict[str, Any]]) -> List[NodeWithScore]:
+        chunks: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for _, window in kept:
+            for id in window if window is not None and len(window) > 1 else ():
+                if id in known:
+                    chunks[id] = (known[id].get_content(), known[id].metadata)
+                elif id in fetched:
+                    chunks[id] = (fetched[id].get(TEXT_KEY, ""), fetched[id])
+        missing = [id for id, (text, _) in chunks.items() if not text]
+        if missing and self._texts is not None:
+            texts = self._texts(missing)
+            for id in missing:
+                chunks[id] = (texts.get(id, ""), chunks[id][1])
+
+        results = []
+        for hit, window in kept:
+            if window is None or len(window) == 1:
+                results.append(hit)
+                continue
+            window = self._fit([id for id in window if id in chunks], hit, chunks)
+            starts = [chunks[id][1].get("message_start") for id in window]
+            ends = [chunks[id][1].get("message_end") for id in window]
+            metadata = {k: v for k, v in hit.node.metadata.items() if k not in _CHUNK_KEYS}
+            if None not in starts and None not in ends and window:
+                metadata["message_start"], metadata["message_end"] = min(starts), max(ends)
+            text = merge_window([chunks[id] for id in window])
+            node = TextNode(id_=hit.node.node_id, text=text, metadata=metadata)
+            results.append(NodeWithScore(node=node, score=hit.score))
+        return results
+
+    def _fit(self, window: List[str], hit: NodeWithScore, chunks) -> List[str]:
+        """The widest run of `window` around the hit whose merged text fits `max_tokens`."""
+        channel_id, thread_id, index, _ = _chunk_position(hit.node.metadata)
+        center = chunk_id(channel_id, thread_id, index)
+        if self._max_tokens is None or center not in window:
+            return window
+        counter = token_counter()
+        start = end = window.index(center)
+        grown = True
+        while grown:
+            grown = False
+            for new_start, new_end in ((start - 1, end), (start, end + 1)):
+                if new_start < 0 or new_end >= len(window):
+                    continue
+                text = merge_window([chunks[id] for id in window[new_start : new_end + 1]])
+                if counter.count(text) <= self._max_tokens:
+                    start, end = new_start, new_end
+                    grown = True
+        return window[start : end + 1]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        kept, known, missing = self._plan(self._retriever.retrieve(query_bundle))
+        fetched = self._fetch(missing) if missing else {}
+        return self._expand(kept, known, fetched)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        kept, known, missing = self._plan(await self._retriever.aretrieve(query_bundle))
+        fetched = await self._afetch(missing) if missing else {}
+        # doc store reads and token counting would otherwise block the event loop
+        return await asyncio.to_thread(self._expand, kept, known, fetched)
@@ -0,0 +1,116 @@
+import random
+
+import numpy as np
+import pytest
+
+from retrieval import registry
+from retrieval.dedup import NearDuplicateIndex
+from retrieval.ingest import DUPLICATE_PREFIX, sync_index
+
+_rng = random.Random(0)
+_WORDS = [f"w{i}" for i in range(5000)]
+
+
+def text(words=60):
+    return " ".join(_rng.choice(_WORDS) for _ in range(words))
+
+
+def test_near_duplicate_points_at_the_first_chunk():
+    index = NearDuplicateIndex(threshold=0.8)
+    original = text()
+    edited = original.replace(original.split()[-1], "changed")
+
+    assert index.add("first", original, group="page-a") is None
+    assert index.add("copy", edited, group="page-b") == "first"
+    # duplicates are not indexed, so a third copy still maps to the canonical chunk
+    assert index.add("again", original, group="page-c") == "first"
+    assert len(index) == 1
+
+
+def test_same_group_and_short_chunks_are_never_duplicates():
+    index = NearDuplicateIndex(threshold=0.8)
+    repeated = text()
+    assert index.add("a/0", repeated, group="a") is None
+    assert index.add("a/1", repeated, group="a") is None
+    assert index.add("short-1", "thanks, that worked!") is None
+    assert index.add("short-2", "thanks, that worked!") is None
+
+
+def test_match_does_not_index():
+    index = NearDuplicateIndex(threshold=0.8)
+    chunk = text()
+    canonical, signature = index.match(chunk, group="a")
+    assert canonical is None and signature is not None
+    assert len(index) == 0
+    index.insert("a/0", signature, group="a")
+    assert index.match(chunk, group="b")[0] == "a/0"
+
+
+def embed(texts):
+    return [np.random.default_rng(len(t) + i).standard_normal(1536).astype(np.float32).tolist() for i, t in enumerate(texts)]
+
+
+@pytest.fixture
+def local_registry(tmp_path, monkeypatch):
+    for name, path in {
+        "LOCAL_INDEX_DIR": "local",
+        "LEXICAL_INDEX_DIR": "bm25",
+        "DOC_STORE_DIR": "docstore",
+        "INGEST_MANIFEST_DIR": "manifest",
+    }.items():
+        monkeypatch.setenv(name, str(tmp_path / path))
+    monkeypatch.setenv("RETRIEVAL_BACKEND", "local")
+    monkeypatch.setattr(registry, "_registry", None)
+    yield registry.get_registry()
+    registry.get_registry().clear()
+
+
+def page(url, texts):
+    return [
+        {
+            "id": f"{url}/{i}",
+            "metadata": {"text": t, "type": "docs", "url": url, "chunk_index": i, "chunk_count": len(texts)},
+        }
+        for i, t in enumerate(texts)
+    ]
+
+
+def standalone(id, t):
+    return {"id": id, "metadata": {"text": t, "type": "docs"}}
+
+
+def test_ingest_aliases_whole_duplicate_documents(local_registry):
+    shared, extra, loose = [text() for _ in range(3)], text(), text()
+
+    def corpus(with_copy=True):
+        chunks = page("a", shared)
+        if with_copy:
+            chunks += page("b", shared)
+        # shares its first chunk with "a" but is not a copy of it
+        chunks += page("c", [shared[0], extra])
+        return chunks + [standalone("s1", loose), standalone("s2", loose)]
+
+    stats = sync_index("ix", "docs", lambda: iter(corpus()), embed)
+    assert (stats.chunks, stats.duplicates, stats.written) == (10, 4, 6)
+
+    index = local_registry.vector_index("ix")
+    stored = index.fetch(["a/0", "a/2", "b/0", "c/0", "s1", "s2"])["vectors"]
+    assert sorted(stored) == ["a/0", "a/2", "c/0", "s1"]
+    assert stored["a/0"]["metadata"]["aliases"] == ["b/0"]
+    assert stored["a/0"]["metadata"]["alias_urls"] == ["b"]
+    assert stored["a/2"]["metadata"]["aliases"] == ["b/2"]
+    assert "aliases" not in stored["c/0"]["metadata"]
+    assert stored["s1"]["metadata"]["aliases"] == ["s2"]
+    # duplicates are recorded so an unchanged rerun skips them without re-embedding
+    hashes = local_registry.manifest("ix").hashes("docs")
+    assert hashes["b/1"] == DUPLICATE_PREFIX + "a/1"
+
+    rerun = sync_index("ix", "docs", lambda: iter(corpus()), embed)
+    assert (rerun.duplicates, rerun.unchanged, rerun.written, rerun.removed) == (4, 6, 0, 0)
+
+    # once the copy is gone its aliases are dropped from the canonical chunks
+    sync_index("ix", "docs", lambda: iter(corpus(with_copy=False)), embed)
+    stored = index.fetch(["a/0", "s1"])["vectors"]
+    assert "aliases" not in stored["a/0"]["metadata"]
+    assert stored["s1"]["metadata"]["aliases"] == ["s2"]
+    assert "b/0" not in local_registry.manifest("ix").hashes("docs")
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from retrieval.hybrid import HybridRetriever, reciprocal_rank_fusion, types_for_filter_key
+
+
+def test_rrf_scores_sum_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60))
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["c"] == pytest.approx(1 / 62)
+
+
+def test_rrf_ranks_agreement_above_a_single_first_place():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "a"], ["b"]])
+    scores = dict(fused)
+    assert fused[0][0] == "b"
+    assert scores["a"] == pytest.approx(scores["c"])
+
+
+def test_rrf_is_best_first_and_handles_empty_rankings():
+    fused = reciprocal_rank_fusion([["x", "y", "z"], []])
+    assert [id for id, _ in fused] == ["x", "y", "z"]
+    scores = [score for _, score in fused]
+    assert scores == sorted(scores, reverse=True)
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_types_for_filter_key():
+    all_types = ["docs", "docs2", "discord_thread"]
+    assert types_for_filter_key(("ne", ("docs",)), all_types) == ["discord_thread", "docs2"]
+    assert types_for_filter_key(("in", ("docs2", "missing")), all_types) == ["docs2"]
+
+
+class FakeVectorRetriever(BaseRetriever):
+    def __init__(self, ids):
+        super().__init__()
+        self.ids = ids
+
+    def _retrieve(self, query_bundle):
+        return [NodeWithScore(node=TextNode(id_=id, text=f"text of {id}"), score=1.0) for id in self.ids]
+
+
+class FakeLexical:
+    def __init__(self, hits, metadata):
+        self.hits = hits
+        self._metadata = metadata
+        self.types = None
+
+    def partitions(self):
+        return {"docs": 2, "discord_thread": 2}
+
+    def search(self, query, top_k, types):
+        self.types = types
+        return self.hits[:top_k]
+
+    def metadata(self, id):
+        return self._metadata.get(id)
+
+
+def hybrid(top_k=3):
+    lexical = FakeLexical([("c", 9.0), ("a", 5.0), ("gone", 1.0)], {"c": {"type": "docs"}, "a": {"type": "docs"}})
+    return HybridRetriever(FakeVectorRetriever(["a", "b"]), lexical, ("in", ("docs",)), top_k=top_k), lexical
+
+
+def test_hybrid_fuses_both_sides():
+    retriever, lexical = hybrid()
+    hits = retriever.retrieve("query")
+
+    assert [hit.node.node_id for hit in hits] == ["a", "c", "b"]
+    assert lexical.types == ["docs"]
+    # vector hits keep their text; lexical-only hits carry metadata for hydration
+    assert hits[0].node.get_content() == "text of a"
+    assert hits[1].node.get_content() == "" and hits[1].node.metadata == {"type": "docs"}
+
+
+def test_hybrid_skips_lexical_ids_without_metadata():
+    retriever, _ = hybrid(top_k=10)
+    assert [hit.node.node_id for hit in retriever.retrieve("query")] == ["a", "c", "b"]
+
+
+def test_hybrid_async_matches_sync():
+    retriever, _ = hybrid()
+    sync = [(hit.node.node_id, hit.score) for hit in retriever.retrieve("query")]
+    hits = asyncio.run(retriever.aretrieve("query"))
+    assert [(hit.node.node_id, hit.score) for hit in hits] == sync
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from retrieval.json_stream import iter_json_array, iter_jsonl, iter_records, iter_threads
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+RECORDS = [
+    {"thread_id": 1, "messages": [{"id": 10, "content": "a [nested] ,array, é"}]},
+    [1, 2.5, -3e2, None, True, "x"],
+    12345678901234567890,
+    -0.125,
+    "a string with \"quotes\" and ] brackets",
+    {},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 1 << 16])
+def test_json_array_elements_survive_any_buffer_boundary(tmp_path, chunk_size):
+    path = write(tmp_path / "dump.json", json.dumps(RECORDS, indent=2, ensure_ascii=False))
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == RECORDS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+def test_numbers_cut_by_the_buffer_are_read_whole(tmp_path, chunk_size):
+    path = write(tmp_path / "numbers.json", "[123456, 7.25e10,\n-99]")
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == [123456, 7.25e10, -99]
+
+
+def test_empty_array(tmp_path):
+    assert list(iter_json_array(write(tmp_path / "empty.json", " [ ] "))) == []
+
+
+@pytest.mark.parametrize("text", ["", "{}", "[1 2]", "[1,"])
+def test_malformed_arrays_raise(tmp_path, text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(write(tmp_path / "bad.json", text), chunk_size=2))
+
+
+def test_records_are_yielded_before_the_rest_is_read(tmp_path):
+    path = write(tmp_path / "dump.json", "[" + ",".join(['{"n": 1}'] * 1000) + ", not json]")
+    records = iter_json_array(path, chunk_size=16)
+    assert next(records) == {"n": 1}
+    with pytest.raises(ValueError):
+        list(records)
+
+
+def test_iter_records_reads_jsonl_by_extension(tmp_path):
+    path = write(tmp_path / "export.jsonl", '{"a": 1}\n\n{"a": 2}\n')
+    assert list(iter_records(path)) == list(iter_jsonl(path)) == [{"a": 1}, {"a": 2}]
+    assert list(iter_records(write(tmp_path / "dump.json", '[{"a": 1}]'))) == [{"a": 1}]
+
+
+def exporter_line(thread_id, name, ids):
+    # the key order thread_exporter.py writes
+    line = {"thread_id": thread_id, "thread_name": name, "messages": [{"id": id, "content": str(id)} for id in ids]}
+    return json.dumps(line) + "\n"
+
+
+def test_jsonl_threads_merge_lines_in_order_of_first_appearance(tmp_path):
+    path = write(
+        tmp_path / "export.jsonl",
+        exporter_line(1, "first", [100, 101])
+        + exporter_line(None, None, [5])
+        + exporter_line(2, "second", [200])
+        # a later export repeats the cursor message and appends replies
+        + exporter_line(1, None, [101, 102])
+        + json.dumps({"messages": [{"id": 201}], "thread_id": 2}) + "\n"
+        + exporter_line(None, None, [6]),
+    )
+    threads = list(iter_threads(path))
+
+    assert [(t["thread_id"], t["thread_name"]) for t in threads] == [(1, "first"), (None, None), (2, "second")]
+    assert [[m["id"] for m in t["messages"]] for t in threads] == [[100, 101, 102], [5, 6], [200, 201]]
+
+
+def test_json_array_threads_are_read_as_is(tmp_path):
+    dump = [{"thread_id": 1, "thread_name": "t", "messages": [{"id": 1}, {"id": 1}]}]
+    assert list(iter_threads(write(tmp_path / "thread_messages_1.json", json.dumps(dump)))) == dump
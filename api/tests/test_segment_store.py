@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+from retrieval import segment_store
+from retrieval.segment_store import SegmentStore
+
+DIMENSION = 8
+
+
+def item(id, seed, type="docs"):
+    values = np.random.default_rng(seed).standard_normal(DIMENSION).astype(np.float32)
+    return {"id": id, "values": values, "metadata": {"type": type, "text": id}}
+
+
+def ids(hits):
+    return [id for id, _ in hits]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SegmentStore(tmp_path / "index", dimension=DIMENSION, buffer_rows=1000, merge_factor=3)
+    yield store
+    store.close()
+
+
+def test_overwrite_tombstones_the_old_row(store):
+    store.upsert([item("a", 1), item("b", 2)])
+    store.flush()
+    replacement = item("a", 3)
+    store.upsert([replacement])
+    store.flush()
+
+    assert len(store) == 2
+    assert len(store._segments) == 2
+    # the first segment's row for "a" is dead until a merge rewrites it
+    assert store._manifest["tombstones"] == {store._segments[0].name: [0]}
+    fetched = store.fetch(["a"])["vectors"]["a"]
+    np.testing.assert_allclose(fetched["values"], replacement["values"] / np.linalg.norm(replacement["values"]), rtol=1e-5)
+    assert ids(store.search(replacement["values"], 1)[0]) == ["a"]
+
+
+def test_delete_hides_rows_from_search_and_fetch(store):
+    store.upsert([item(str(i), i) for i in range(5)])
+    store.delete(["1", "3", "missing"])
+
+    assert len(store) == 3
+    assert store.fetch(["1", "2"])["vectors"].keys() == {"2"}
+    found = ids(store.search(item("1", 1)["values"], 5)[0])
+    assert sorted(found) == ["0", "2", "4"]
+
+
+def test_buffered_upserts_are_last_write_wins(store):
+    store.upsert([item("a", 1), item("a", 2)])
+    store.upsert([item("a", 3)])
+    assert store.buffered_rows == 1
+    store.flush()
+    assert len(store) == 1
+    assert not store._manifest["tombstones"]
+
+
+def test_tiered_merge_rewrites_live_rows_and_drops_tombstones(store):
+    for batch in range(3):
+        store.upsert([item(f"{batch}-{i}", batch * 10 + i) for i in range(2)])
+        store.flush()
+        if batch == 0:
+            store.delete(["0-0"])
+
+    # three one-row-tier segments merged into one
+    assert len(store._segments) == 1
+    assert store._manifest["tombstones"] == {}
+    assert len(store) == 5
+    assert sorted(ids(store.search(item("x", 99)["values"], 10)[0])) == ["0-1", "1-0", "1-1", "2-0", "2-1"]
+
+
+def test_compact_keeps_only_live_rows(store):
+    for i in range(4):
+        store.upsert([item(str(i), i)])
+        store.flush()
+    store.delete(["2"])
+    store.compact()
+
+    assert len(store._segments) == 1
+    assert store._segments[0].rows == 3
+    assert store._manifest["tombstones"] == {}
+    assert sorted(store.fetch(["0", "1", "2", "3"])["vectors"]) == ["0", "1", "3"]
+
+
+def test_empty_segments_are_dropped(store):
+    store.upsert([item("a", 1)])
+    store.flush()
+    store.delete(["a"])
+    store.upsert([item("b", 2)])
+    store.flush()
+
+    assert [seg.rows for seg in store._segments] == [1]
+    assert len(store) == 1
+
+
+def test_merged_segments_are_deleted_after_the_grace_period(store, monkeypatch):
+    store.upsert([item("a", 1)])
+    store.flush()
+    store.upsert([item("b", 2)])
+    store.flush()
+    old = [seg.name for seg in store._segments]
+    store.compact()
+
+    # readers of the previous manifest may still open these
+    assert all((store.path / name).is_dir() for name in old)
+    assert [name for name, _ in store._manifest["garbage"]] == old
+
+    monkeypatch.setattr(segment_store, "GARBAGE_GRACE_SECONDS", 0.0)
+    store.delete(["missing"])
+    assert not any((store.path / name).exists() for name in old)
+    assert store._manifest["garbage"] == []
+
+
+def test_type_filter_searches_only_matching_partitions(store):
+    store.upsert([item("doc", 1, "docs"), item("thread", 1, "discord_thread")])
+    query = item("q", 1)["values"]
+    assert ids(store.search(query, 2, types=["discord_thread"])[0]) == ["thread"]
+    assert store.query(vector=query, top_k=2, filter={"type": {"$ne": "docs"}})["matches"][0]["id"] == "thread"
+
+
+def test_reader_picks_up_writes_and_merges(tmp_path):
+    writer = SegmentStore(tmp_path / "index", dimension=DIMENSION, merge_factor=3)
+    writer.upsert([item("a", 1)])
+    writer.flush()
+    reader = SegmentStore(tmp_path / "index", dimension=DIMENSION, readonly=True)
+    assert len(reader) == 1
+
+    writer.upsert([item("b", 2)])
+    writer.flush()
+    writer.delete(["a"])
+    writer.compact()
+    assert sorted(reader.fetch(["a", "b"])["vectors"]) == ["b"]
+    with pytest.raises(PermissionError):
+        reader.upsert([item("c", 3)])
+    writer.close()
+    reader.close()
+
+
+def test_retired_segment_closes_after_the_last_search_releases_it(store):
+    store.upsert([item("a", 1)])
+    store.flush()
+    segments, _, _ = store._acquire()
+    (segment,) = segments
+
+    store.upsert([item("b", 2)])
+    store.flush()
+    store.compact()
+    # the compaction retired the segment, but the search still reads records from it
+    assert segment not in store._segments
+    assert segment.record(0)["id"] == "a"
+
+    store._release(segments)
+    assert segment._records.closed
+
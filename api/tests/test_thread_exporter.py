@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+from fake_discord import FakeChannel, expected_threads, merged_threads
+from thread_exporter import ThreadExporter
+
+
+def sample_channel() -> FakeChannel:
+    channel = FakeChannel(latency_ms=0)
+    for t in range(5):
+        thread = channel.start_thread(f"thread {t}", "asker", f"question {t}")
+        for r in range(t):
+            channel.reply(thread, "helper", f"answer {t}.{r}")
+    channel.post("someone", "a message outside any thread")
+    return channel
+
+
+def export(channel, out, concurrency=2):
+    return asyncio.run(ThreadExporter(channel, out, concurrency=concurrency).export())
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_export_resumes_from_its_cursors(tmp_path, concurrency):
+    channel = sample_channel()
+    out = tmp_path / "thread_messages.jsonl"
+
+    first = export(channel, out, concurrency)
+    assert (first.threads, first.thread_messages, first.channel_messages) == (5, 15, 6)
+    assert merged_threads(out) == expected_threads(channel)
+
+    requests = channel.requests
+    lines = out.read_text(encoding="utf-8").count("\n")
+    nothing_new = export(channel, out, concurrency)
+    assert (nothing_new.threads, nothing_new.lines) == (0, 0)
+    assert out.read_text(encoding="utf-8").count("\n") == lines
+    # only the channel history is walked; no thread has newer messages than its cursor
+    assert channel.requests - requests == 1
+
+    old = channel.threads[1]
+    channel.reply(old, "helper", "a later reply")
+    new = channel.start_thread("new thread", "asker", "a new question")
+    channel.reply(new, "helper", "an answer")
+    resumed = export(channel, out, concurrency)
+    # the old thread's new reply, plus the new thread's starter and answer
+    assert (resumed.threads, resumed.thread_messages, resumed.channel_messages) == (2, 3, 1)
+    assert merged_threads(out) == expected_threads(channel)
+
+
+def test_cursor_file_records_the_newest_ids(tmp_path):
+    channel = sample_channel()
+    out = tmp_path / "thread_messages.jsonl"
+    export(channel, out)
+
+    cursors = json.loads(out.with_suffix(".cursor.json").read_text(encoding="utf-8"))
+    assert cursors["channel"] == max(m.id for m in channel.messages)
+    assert cursors["threads"] == {
+        str(thread.id): max([thread.id, *(m.id for m in thread.messages)]) for thread in channel.threads
+    }
+
+
+def test_interrupted_run_keeps_finished_threads(tmp_path):
+    channel = sample_channel()
+    out = tmp_path / "thread_messages.jsonl"
+    broken = channel.threads[3]
+
+    def failing_history(*args, **kwargs):
+        raise ConnectionError("network down")
+
+    broken.history = failing_history
+    with pytest.raises(ConnectionError):
+        export(channel, out, concurrency=1)
+    cursors = json.loads(out.with_suffix(".cursor.json").read_text(encoding="utf-8"))
+    # the channel cursor only moves after a whole run
+    assert cursors["channel"] is None
+    assert str(broken.id) not in cursors["threads"]
+
+    del broken.history
+    export(channel, out)
+    assert merged_threads(out) == expected_threads(channel)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""In-memory stand-in for a discord.py text channel, for thread_exporter.py.
+
+`FakeChannel.from_dump` rebuilds a channel from a `thread_messages_*.json`
+dump: one starter message per thread in the channel, the rest of each
+thread's messages in the thread. History calls take `latency_ms` each and
+count how many run at once, so exports can be checked without a bot token.
+
+Running it exports a dump's channel three times (full, nothing new, after
+new replies and a new thread), serially and concurrently, and checks the
+merged JSONL against the fake channel:
+$ python3 ./discord_json/fake_discord.py --channel-id 1253172394345107466
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from thread_exporter import ThreadExporter
+
+
+@dataclass
+class FakeAuthor:
+    name: str
+
+
+@dataclass
+class FakeReference:
+    message_id: int
+
+
+@dataclass
+class FakeMessage:
+    id: int
+    author: FakeAuthor
+    content: str
+    created_at: datetime
+    reference: Optional[FakeReference] = None
+    thread: Optional["FakeThread"] = None
+
+
+class _History:
+    """Counts history calls and how many are in flight on the owning channel."""
+
+    def __init__(self, channel: "FakeChannel", messages: List[FakeMessage], after, oldest_first: bool):
+        self.channel = channel
+        after_id = after.id if after is not None else 0
+        selected = [m for m in messages if m.id > after_id]
+        self.messages = selected if oldest_first else selected[::-1]
+
+    async def _generate(self):
+        channel = self.channel
+        channel.requests += 1
+        channel.in_flight += 1
+        channel.max_in_flight = max(channel.max_in_flight, channel.in_flight)
+        try:
+            # one page of up to 100 messages per request, as on Discord
+            for start in range(0, max(len(self.messages), 1), 100):
+                await asyncio.sleep(channel.latency_ms / 1000)
+                for message in self.messages[start : start + 100]:
+                    yield message
+        finally:
+            channel.in_flight -= 1
+
+    def __aiter__(self):
+        return self._generate()
+
+
+@dataclass
+class FakeThread:
+    id: int
+    name: str
+    channel: "FakeChannel"
+    messages: List[FakeMessage] = field(default_factory=list)
+
+    @property
+    def last_message_id(self) -> Optional[int]:
+        return self.messages[-1].id if self.messages else None
+
+    def history(self, limit=None, after=None, oldest_first=None):
+        return _History(self.channel, self.messages, after, oldest_first or after is not None)
+
+
+class FakeChannel:
+    def __init__(self, latency_ms: float = 20.0):
+        self.latency_ms = latency_ms
+        self.messages: List[FakeMessage] = []
+        self.threads: List[FakeThread] = []
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._next_id = 1_000_000
+        self._clock = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def _message(self, author: str, content: str) -> FakeMessage:
+        self._next_id += 1
+        self._clock += timedelta(minutes=1)
+        return FakeMessage(self._next_id, FakeAuthor(author), content, self._clock)
+
+    def post(self, author: str, content: str) -> FakeMessage:
+        message = self._message(author, content)
+        self.messages.append(message)
+        return message
+
+    def start_thread(self, name: str, author: str, content: str) -> FakeThread:
+        starter = self.post(author, content)
+        thread = FakeThread(starter.id, name, self)
+        starter.thread = thread
+        self.threads.append(thread)
+        return thread
+
+    def reply(self, thread: FakeThread, author: str, content: str) -> FakeMessage:
+        message = self._message(author, content)
+        thread.messages.append(message)
+        return message
+
+    def history(self, limit=None, after=None, oldest_first=None):
+        return _History(self, self.messages, after, oldest_first or after is not None)
+
+    @classmethod
+    def from_dump(cls, path: Path, latency_ms: float = 20.0) -> "FakeChannel":
+        channel = cls(latency_ms)
+        with open(path, "r", encoding="utf-8") as f:
+            for dumped in json.load(f):
+                messages = dumped["messages"]
+                if not dumped["thread_id"]:
+                    for message in messages:
+                        channel.post(message["author"], message["content"])
+                    continue
+                thread = channel.start_thread(dumped["thread_name"] or "", messages[0]["author"], messages[0]["content"])
+                for message in messages[1:]:
+                    channel.reply(thread, message["author"], message["content"])
+        return channel
+
+
+def merged_threads(path: Path) -> Dict[Optional[int], List[int]]:
+    """thread_id -> message ids, merging the exporter's lines and dropping repeats."""
+    threads: Dict[Optional[int], List[int]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            ids = threads.setdefault(record["thread_id"], [])
+            ids.extend(m["id"] for m in record["messages"] if m["id"] not in ids)
+    return threads
+
+
+def expected_threads(channel: FakeChannel) -> Dict[Optional[int], List[int]]:
+    threads: Dict[Optional[int], List[int]] = {}
+    for message in channel.messages:
+        if message.thread:
+            threads[message.thread.id] = [message.id] + [m.id for m in message.thread.messages]
+        else:
+            threads.setdefault(None, []).append(message.id)
+    return threads
+
+
+async def export(channel: FakeChannel, out: Path, concurrency: int):
+    requests = channel.requests
+    start = time.perf_counter()
+    stats = await ThreadExporter(channel, out, concurrency=concurrency).export()
+    seconds = time.perf_counter() - start
+    print(
+        f"  {stats.summary()}; {channel.requests - requests} history requests, "
+        f"max {channel.max_in_flight} in flight, {seconds:.2f}s"
+    )
+    channel.max_in_flight = 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channel-id", type=int, default=1253172394345107466)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    dump = Path(__file__).parent / f"thread_messages_{args.channel_id}.json"
+    for concurrency in args.concurrency:
+        channel = FakeChannel.from_dump(dump, args.latency_ms)
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / f"thread_messages_{args.channel_id}.jsonl"
+            print(f"concurrency {concurrency}: {len(channel.threads)} threads")
+            asyncio.run(export(channel, out, concurrency))
+            asyncio.run(export(channel, out, concurrency))
+            for thread in channel.threads[:3]:
+                channel.reply(thread, "someone", "a later reply")
+            channel.reply(channel.start_thread("new thread", "someone", "a new question"), "helper", "an answer")
+            asyncio.run(export(channel, out, concurrency))
+            assert merged_threads(out) == expected_threads(channel), "export does not match the channel"
+            print("  merged export matches the channel")
+
+
+if __name__ == "__main__":
+    main()
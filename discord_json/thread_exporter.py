@@ -0,0 +1,166 @@
+"""Incremental, concurrent export of a Discord channel's threads to JSONL.
+
+discord_threads.py used to walk the whole channel history on every run,
+fetch each thread's history one after another, re-sort everything after
+every channel message, and write one indented JSON file at the end. The
+`ThreadExporter` here keeps a cursor file next to the output with the
+highest message id exported for the channel and for each thread, and on
+each run:
+
+- walks only channel messages newer than the channel cursor;
+- fetches, up to `concurrency` at a time, the history after its cursor of
+  every thread started by one of those messages, and of every active
+  thread whose last message is newer than its cursor;
+- appends one JSON line per thread (and one for channel messages outside
+  threads) as soon as its new messages are in, oldest first:
+  `{"thread_id", "thread_name", "messages": [{"id", "author", "timestamp",
+  "content", "parent_id"}, ...]}`.
+
+A thread's messages can span several lines, across runs; readers merge
+lines by `thread_id`, in file order, and drop repeated message ids. Thread
+cursors are saved after their line is written and the channel cursor only
+after the whole run, so an interrupted run loses nothing and the next one
+at most repeats a few messages. discord.py's HTTP client waits out
+Discord's rate limits (429 with retry-after, per-route buckets);
+`concurrency` caps how many thread histories are requested at once.
+
+The exporter only uses the channel, thread and message attributes it
+reads, so fake_discord.py can stand in for a logged-in client.
+"""
+
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CONCURRENCY = 4
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Anything with an `id` works as discord.py's `after=`."""
+
+    id: int
+
+
+@dataclass
+class ExportStats:
+    channel_messages: int = 0
+    threads: int = 0
+    thread_messages: int = 0
+    lines: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.channel_messages} new channel messages, {self.thread_messages} new messages "
+            f"in {self.threads} threads, {self.lines} lines appended"
+        )
+
+
+def message_record(message) -> Dict[str, Any]:
+    return {
+        "id": message.id,
+        "author": message.author.name,
+        "timestamp": str(message.created_at),
+        "content": message.content,
+        # set when the message is a reply
+        "parent_id": message.reference.message_id if message.reference else None,
+    }
+
+
+class ThreadExporter:
+    def __init__(
+        self,
+        channel,
+        out_path: os.PathLike | str,
+        cursor_path: Optional[os.PathLike | str] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ):
+        self.channel = channel
+        self.out_path = Path(out_path)
+        self.cursor_path = Path(cursor_path) if cursor_path else self.out_path.with_suffix(".cursor.json")
+        self.concurrency = concurrency
+        self.stats = ExportStats()
+        self._cursors = self._load_cursors()
+        self._out = None
+
+    def _load_cursors(self) -> Dict[str, Any]:
+        try:
+            with open(self.cursor_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"channel": None, "threads": {}}
+
+    def _save_cursors(self):
+        tmp = self.cursor_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._cursors, f)
+        os.replace(tmp, self.cursor_path)
+
+    def _append(self, thread_id: Optional[int], thread_name: Optional[str], messages: List[Dict[str, Any]]):
+        line = {"thread_id": thread_id, "thread_name": thread_name, "messages": messages}
+        self._out.write(json.dumps(line, ensure_ascii=False) + "\n")
+        # on disk before the cursor moves past these messages
+        self._out.flush()
+        os.fsync(self._out.fileno())
+        self.stats.lines += 1
+
+    async def _export_thread(self, thread, starter: Optional[Dict[str, Any]], semaphore: asyncio.Semaphore):
+        after = self._cursors["threads"].get(str(thread.id))
+        messages = [starter] if starter else []
+        async with semaphore:
+            async for message in thread.history(
+                limit=None, after=Cursor(after) if after else None, oldest_first=True
+            ):
+                messages.append(message_record(message))
+        if not messages:
+            return
+        self._append(thread.id, thread.name, messages)
+        self.stats.threads += 1
+        self.stats.thread_messages += len(messages)
+        self._cursors["threads"][str(thread.id)] = max([after or 0, *(m["id"] for m in messages)])
+        self._save_cursors()
+
+    async def export(self) -> ExportStats:
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks: Dict[int, asyncio.Task] = {}
+        loose: List[Dict[str, Any]] = []
+        channel_cursor = self._cursors["channel"]
+        newest = channel_cursor
+
+        with open(self.out_path, "a", encoding="utf-8") as self._out:
+            try:
+                async for message in self.channel.history(
+                    limit=None, after=Cursor(channel_cursor) if channel_cursor else None, oldest_first=True
+                ):
+                    self.stats.channel_messages += 1
+                    newest = max(newest or 0, message.id)
+                    if message.thread and message.thread.id not in tasks:
+                        # the thread's starter message leads its first line
+                        tasks[message.thread.id] = asyncio.create_task(
+                            self._export_thread(message.thread, message_record(message), semaphore)
+                        )
+                    elif not message.thread:
+                        loose.append(message_record(message))
+
+                # replies in threads started before the channel cursor
+                for thread in self.channel.threads:
+                    cursor = self._cursors["threads"].get(str(thread.id))
+                    if thread.id not in tasks and (cursor is None or (thread.last_message_id or 0) > cursor):
+                        tasks[thread.id] = asyncio.create_task(self._export_thread(thread, None, semaphore))
+
+                await asyncio.gather(*tasks.values())
+            except BaseException:
+                for task in tasks.values():
+                    task.cancel()
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+                raise
+            if loose:
+                self._append(None, None, loose)
+
+        self._cursors["channel"] = newest
+        self._save_cursors()
+        return self.stats
@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import { DBRecord, useFirebaseListener } from "@/hooks/firebaseListener";
+import { DBRecord, useFirebaseListener, useRecordActions } from "@/hooks/firebaseListener";
 import QuestionList from './QuestionsList';
 import QuestionDetails from './QuestionViewer';
 
@@ -16,7 +16,7 @@ export default function AgentDashboard({ agentId }: AgentDashboardProps) {
     ? pages.filter((page) => page.id === agentId)
     : pages;
 
-  const currentRecord = selectedRecord ?? records.at(-1);
+  const currentRecord = useRecordActions("agentstate", selectedRecord ?? records.at(-1));
 
   return (
     <div className="flex h-[600px] space-x-4">
@@ -1,6 +1,6 @@
 // hooks/useFirebaseListener.js
-import { useEffect, useState } from "react"
-import { collection, onSnapshot, query } from "firebase/firestore"
+import { useEffect, useMemo, useState } from "react"
+import { collection, limit, onSnapshot, orderBy, query } from "firebase/firestore"
 
 import { db } from "../firebase"
 
@@ -30,6 +30,7 @@ export interface Action {
   type: string
   content: string | RagResult
   create_time_ms: number
+  seq?: number
 }
 
 export interface AgentState {
@@ -38,6 +39,7 @@ export interface AgentState {
   state: StateName
   initial_state: InitialState
   actions: Action[]
+  action_count?: number
   final_state: FinalState
 }
 
@@ -46,8 +48,14 @@ export type DBRecord = {
   data: AgentState
 }
 
+// Each agent state document is a header; its actions are documents in its
+// "actions" subcollection (older documents keep them in an `actions` array).
+// Only the opened record's subcollection is listened to, never every
+// client's actions at once (see firestore.rules, which caps the query).
+export const MAX_ACTIONS = 1000
+
 export function useFirebaseListener(collectionName: string) {
-  const [data, setData] = useState<DBRecord[]>([])
+  const [headers, setHeaders] = useState<DBRecord[]>([])
 
   useEffect(() => {
     const q = query(collection(db, collectionName))
@@ -57,6 +65,7 @@ export function useFirebaseListener(collectionName: string) {
         const docData = doc.data() as AgentState
         const agentState: AgentState = {
           ...docData,
+          actions: docData.actions ?? [],
           create_time_ms: new Date(docData.create_time_ms),
           update_time_ms: new Date(docData.update_time_ms),
         }
@@ -68,11 +77,31 @@ export function useFirebaseListener(collectionName: string) {
         return a.data.create_time_ms.getTime() - b.data.create_time_ms.getTime()
       })
 
-      setData(items)
+      setHeaders(items)
     })
 
     return () => unsubscribe()
   }, [collectionName])
 
-  return data
+  return headers
+}
+
+// `record` with the actions of its subcollection appended, kept live while it is shown.
+export function useRecordActions(collectionName: string, record: DBRecord | undefined) {
+  const [actions, setActions] = useState<{ id: string; list: Action[] } | null>(null)
+  const id = record?.id
+
+  useEffect(() => {
+    if (!id) return
+    const q = query(collection(db, collectionName, id, "actions"), orderBy("seq"), limit(MAX_ACTIONS))
+    return onSnapshot(q, (querySnapshot) => {
+      setActions({ id, list: querySnapshot.docs.map((doc) => doc.data() as Action) })
+    })
+  }, [collectionName, id])
+
+  return useMemo(() => {
+    if (!record) return undefined
+    const appended = actions?.id === record.id ? actions.list : []
+    return { ...record, data: { ...record.data, actions: [...record.data.actions, ...appended] } }
+  }, [record, actions])
 }